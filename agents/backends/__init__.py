@@ -0,0 +1,81 @@
+import functools
+import importlib
+
+from importlib.metadata import entry_points
+
+from agents.backends.base import Completion, LLMBackend
+from utils.common import logger
+
+# Gruppo degli entry point con cui i pacchetti esterni registrano nuovi backend:
+#   [project.entry-points."pycopilot.backends"]
+#   vllm = "my_package.backends:VLLMBackend"
+# Il nome dell'entry point è il blocco della sezione YAML che seleziona il backend.
+ENTRY_POINT_GROUP = "pycopilot.backends"
+
+# Backend inclusi, per blocco della sezione YAML, nell'ordine in cui vengono cercati:
+# il modulo viene importato solo quando il backend è selezionato.
+BUILTIN_BACKENDS = {
+    "openai": "agents.backends.openai_backend:OpenAIBackend",
+    "anthropic_bedrock": "agents.backends.anthropic_bedrock_backend:AnthropicBedrockBackend",
+    "aws_bedrock": "agents.backends.bedrock_backend:BedrockBackend",
+    "mock": "agents.backends.mock_backend:MockBackend",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _registered_entry_points() -> dict:
+    """
+    Entry point del gruppo "pycopilot.backends" installati, per nome (letti una sola volta).
+    """
+    try:
+        installed = entry_points()
+        # Python 3.10+ restituisce EntryPoints (select); 3.8/3.9 un dizionario per gruppo.
+        if hasattr(installed, "select"):
+            group = installed.select(group=ENTRY_POINT_GROUP)
+        else:
+            group = installed.get(ENTRY_POINT_GROUP, [])
+        return {entry_point.name: entry_point for entry_point in group}
+    except Exception as exc:
+        logger.error(f"[Backends] Errore nella lettura degli entry point '{ENTRY_POINT_GROUP}': {exc}")
+        return {}
+
+
+def available_backends() -> list:
+    """
+    Blocchi YAML dei backend disponibili: quelli inclusi seguiti da quelli registrati.
+    """
+    return list(BUILTIN_BACKENDS) + [name for name in _registered_entry_points() if name not in BUILTIN_BACKENDS]
+
+
+@functools.lru_cache(maxsize=None)
+def load_backend(config_key: str) -> type:
+    """
+    Importa e restituisce la classe del backend selezionato dal blocco config_key.
+    Un entry point con lo stesso nome di un backend incluso lo sostituisce.
+    """
+    entry_point = _registered_entry_points().get(config_key)
+    if entry_point is not None:
+        backend_class = entry_point.load()
+    elif config_key in BUILTIN_BACKENDS:
+        module_name, class_name = BUILTIN_BACKENDS[config_key].split(":")
+        backend_class = getattr(importlib.import_module(module_name), class_name)
+    else:
+        raise ValueError(f"[Backends] Nessun backend registrato per '{config_key}'.")
+
+    if not (isinstance(backend_class, type) and issubclass(backend_class, LLMBackend)):
+        raise TypeError(f"[Backends] '{config_key}' non è una sottoclasse di LLMBackend: {backend_class!r}")
+    return backend_class
+
+
+def select_backend(section_config: dict) -> tuple:
+    """
+    Restituisce (classe_backend, blocco_YAML) del primo backend il cui blocco è presente
+    nella sezione di configurazione.
+    """
+    for config_key in available_backends():
+        if config_key in section_config:
+            return load_backend(config_key), config_key
+    raise ValueError(
+        "Configurazione non valida: Nessuna sezione "
+        + ", ".join(f"'{config_key}'" for config_key in available_backends()) + " trovata.")
+
@@ -0,0 +1,208 @@
+import json
+import uuid
+
+from agents.backends.base import Completion, LLMBackend
+from agents.client_registry import DEFAULT_POOL_CONFIG, get_boto3_client, httpx_options
+from utils.common import logger
+
+DEFAULT_MAX_TOKENS = 12000
+# Versione della messages API nei record dei job di batch inference di Bedrock.
+BEDROCK_ANTHROPIC_VERSION = "bedrock-2023-05-31"
+# Bedrock accetta job di batch inference solo con almeno 100 record: i lotti più piccoli
+# vengono eseguiti con chiamate singole.
+BEDROCK_BATCH_MIN_RECORDS = 100
+BEDROCK_BATCH_TERMINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+
+def _split_s3_uri(uri: str) -> tuple:
+    """
+    Divide "s3://bucket/prefisso" in (bucket, prefisso).
+    """
+    if not uri.startswith("s3://"):
+        raise ValueError(f"URI S3 non valido: '{uri}'")
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+class AnthropicBedrockBackend(LLMBackend):
+    """
+    Modelli Claude tramite AnthropicBedrock (messages API), con client sincrono e asincrono.
+
+        anthropic_bedrock:
+          api_key:    "YOUR_AWS_ACCESS_KEY"
+          api_secret: "YOUR_AWS_SECRET_KEY"
+          region:     "eu-west-1"
+          model_name: "eu.anthropic.claude-3-7-sonnet-20250219-v1:0"
+          max_tokens: 12000   # opzionale, default 12000
+
+    In modalità batch le richieste diventano un job di batch inference di Bedrock: il file
+    JSONL viene caricato su S3 e i risultati letti dalla cartella di output del job.
+
+        batch:
+          input_s3_uri:  "s3://bucket/pycopilot/batch-input"
+          output_s3_uri: "s3://bucket/pycopilot/batch-output"
+          role_arn:      "arn:aws:iam::123456789012:role/BedrockBatchRole"
+    """
+    name = "anthropic-bedrock"
+    display_name = "AnthropicBedrock"
+    connection_keys = ("api_key", "api_secret", "region")
+    default_concurrency = 4
+    supports_async = True
+    supports_batch = True
+    # Record per job di batch inference di Bedrock.
+    max_batch_size = 50000
+
+    def __init__(self, provider_config: dict, section_config: dict = None):
+        super().__init__(provider_config, section_config)
+        # Cache dei prompt del provider: il system prompt (prefisso stabile) viene inviato per
+        # primo e marcato con cache_control. Disattivabile per i modelli che non la supportano:
+        #   prompt_caching:
+        #     enabled: true
+        prompt_caching_config = self.section_config.get("prompt_caching") or {}
+        self.prompt_caching = bool(prompt_caching_config.get("enabled", True))
+
+    @classmethod
+    def create_client(cls, provider_config: dict, pool: dict):
+        from anthropic import AnthropicBedrock, DefaultHttpxClient
+        return AnthropicBedrock(
+            aws_access_key=provider_config["api_key"],
+            aws_secret_key=provider_config["api_secret"],
+            aws_region=provider_config["region"],
+            http_client=DefaultHttpxClient(**httpx_options(pool))
+        )
+
+    @classmethod
+    def create_async_client(cls, provider_config: dict, pool: dict):
+        from anthropic import AsyncAnthropicBedrock, DefaultAsyncHttpxClient
+        return AsyncAnthropicBedrock(
+            aws_access_key=provider_config["api_key"],
+            aws_secret_key=provider_config["api_secret"],
+            aws_region=provider_config["region"],
+            http_client=DefaultAsyncHttpxClient(**httpx_options(pool))
+        )
+
+    def build_request(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> dict:
+        """
+        Costruisce gli argomenti della chiamata messages di AnthropicBedrock, usati anche
+        come modelInput dei record di batch. Il system prompt, uguale per tutti i chunk e i repository, viene inviato come
+        parametro system (prima dei messaggi) e, con prompt_caching attivo, marcato come
+        prefisso da mettere in cache.
+        """
+        request = {
+            "model": model_name,
+            "max_tokens": self.provider_config.get("max_tokens", DEFAULT_MAX_TOKENS),
+            "messages": [{"role": "user", "content": user_prompt}],
+            "temperature": temperature
+        }
+        if system_prompt:
+            if self.prompt_caching:
+                request["system"] = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            else:
+                request["system"] = system_prompt
+        return request
+
+    @staticmethod
+    def _completion(message) -> Completion:
+        usage = getattr(message, "usage", None)
+        text = message.content
+        if isinstance(text, list):
+            text = " ".join(block.text for block in text)
+        return Completion(text,
+                          cache_read_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+                          cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0)
+
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> Completion:
+        try:
+            request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+            return self._completion(self.client.messages.create(**request))
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata AnthropicBedrock: {exc}") from exc
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model_name: str,
+                        temperature: float) -> Completion:
+        try:
+            request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+            return self._completion(await self.get_async_client().messages.create(**request))
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata AnthropicBedrock: {exc}") from exc
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float):
+        request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+        with self.client.messages.stream(**request) as stream:
+            yield from stream.text_stream
+
+    def _aws_client(self, service: str):
+        return get_boto3_client(self.provider_config, {**DEFAULT_POOL_CONFIG, **(self.pool_config or {})}, service)
+
+    def complete_batch(self, requests: list) -> list:
+        """
+        Esegue le richieste con un job di batch inference di Bedrock: carica su S3 un record
+        per richiesta (identificato da recordId), crea il job, ne attende il completamento e
+        associa ogni riga del file di output alla richiesta corrispondente.
+        """
+        if len(requests) < BEDROCK_BATCH_MIN_RECORDS:
+            logger.info(f"[AnthropicBedrockBackend] {len(requests)} richieste, sotto il minimo di "
+                        f"{BEDROCK_BATCH_MIN_RECORDS} record di un job batch: eseguite singolarmente")
+            return super().complete_batch(requests)
+
+        try:
+            job_name = f"pycopilot-{uuid.uuid4().hex[:16]}"
+            input_bucket, input_prefix = _split_s3_uri(self.batch_config["input_s3_uri"])
+            input_key = f"{input_prefix}/{job_name}.jsonl".lstrip("/")
+            records = []
+            for index, request in enumerate(requests):
+                # Il modello è quello del job: nel corpo va invece la versione dell'API Anthropic
+                model_input = self.build_request(request["system_prompt"], request["user_prompt"],
+                                                 request["model_name"], request["temperature"])
+                del model_input["model"]
+                model_input["anthropic_version"] = BEDROCK_ANTHROPIC_VERSION
+                records.append(json.dumps({"recordId": f"{index:011d}", "modelInput": model_input},
+                                          ensure_ascii=False))
+
+            s3 = self._aws_client("s3")
+            bedrock = self._aws_client("bedrock")
+            s3.put_object(Bucket=input_bucket, Key=input_key, Body="\n".join(records).encode("utf-8"))
+            job_arn = bedrock.create_model_invocation_job(
+                jobName=job_name,
+                roleArn=self.batch_config["role_arn"],
+                modelId=requests[0]["model_name"],
+                inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{input_bucket}/{input_key}"}},
+                outputDataConfig={"s3OutputDataConfig": {"s3Uri": self.batch_config["output_s3_uri"]}}
+            )["jobArn"]
+            logger.info(f"[AnthropicBedrockBackend] Job batch {job_name} creato con {len(requests)} richieste")
+            try:
+                job = self.wait_for_batch(lambda: bedrock.get_model_invocation_job(jobIdentifier=job_arn),
+                                          lambda current: current["status"], BEDROCK_BATCH_TERMINAL_STATUSES)
+            except TimeoutError:
+                bedrock.stop_model_invocation_job(jobIdentifier=job_arn)
+                raise
+            if job["status"] not in ("Completed", "PartiallyCompleted"):
+                raise RuntimeError(f"job {job_name} terminato in stato '{job['status']}': {job.get('message')}")
+
+            # I risultati sono in <output_s3_uri>/<id del job>/<nome del file di input>.out
+            output_bucket, output_prefix = _split_s3_uri(self.batch_config["output_s3_uri"])
+            output_key = f"{output_prefix}/{job_arn.rsplit('/', 1)[-1]}/{job_name}.jsonl.out".lstrip("/")
+            output = s3.get_object(Bucket=output_bucket, Key=output_key)["Body"].read().decode("utf-8")
+
+            results = [RuntimeError("[BaseAgent] Nessun risultato per la richiesta nel batch Bedrock.")
+                       for _ in requests]
+            for line in output.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    results[int(record["recordId"])] = self._batch_result(record)
+            return results
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante il batch AnthropicBedrock: {exc}") from exc
+
+    @staticmethod
+    def _batch_result(record: dict):
+        """
+        Converte un record del file di output del job in Completion o eccezione.
+        """
+        if record.get("error") or not record.get("modelOutput"):
+            return RuntimeError(f"[BaseAgent] Richiesta fallita nel batch Bedrock: {record.get('error')}")
+        output = record["modelOutput"]
+        usage = output.get("usage") or {}
+        return Completion(" ".join(block.get("text", "") for block in output.get("content") or []),
+                          cache_read_tokens=usage.get("cache_read_input_tokens") or 0,
+                          cache_write_tokens=usage.get("cache_creation_input_tokens") or 0)
@@ -0,0 +1,175 @@
+import time
+
+from abc import ABC, abstractmethod
+
+from agents import client_registry
+from utils.common import logger
+
+# Intervallo tra due interrogazioni dello stato di un job batch e durata massima dell'attesa
+# (sovrascrivibili nel blocco `batch` della sezione YAML).
+DEFAULT_BATCH_POLL_INTERVAL = 30.0
+DEFAULT_BATCH_TIMEOUT = 24 * 3600.0
+
+
+class Completion:
+    """
+    Risposta di un backend: il testo e i token del prompt letti/scritti nella cache dei
+    prompt del provider, se li riporta (usati dal TokenManager per il costo).
+    """
+    __slots__ = ("text", "cache_read_tokens", "cache_write_tokens")
+
+    def __init__(self, text: str, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
+        self.text = text
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+
+
+class LLMBackend(ABC):
+    """
+    Interfaccia dei provider LLM usati da BaseAgent: chiamata sincrona (complete),
+    asincrona (acomplete), in streaming (stream) e a lotti (complete_batch).
+
+    Ogni backend dichiara le proprie capacità con gli attributi di classe: BaseAgent le usa
+    per dimensionare il thread pool del provider (default_concurrency), per scegliere tra
+    client asincrono nativo e thread pool (supports_async) e per inviare i lotti di
+    richieste all'API batch del provider (supports_batch, max_batch_size).
+    I backend di terze parti si registrano con un entry point nel gruppo
+    "pycopilot.backends", il cui nome è il blocco della sezione YAML che li seleziona.
+    """
+    # Nome del provider (chiave di scheduler, thread pool, cache delle risposte e tracing).
+    name = None
+    # Nome leggibile usato nei messaggi di errore.
+    display_name = None
+    # Chiavi della configurazione che identificano credenziali ed endpoint: due agent con
+    # gli stessi valori condividono lo stesso client (vedi client_registry).
+    connection_keys = ()
+    default_concurrency = 4
+    supports_async = False
+    supports_batch = False
+    max_batch_size = None
+    # False se il client è legato a un modello e ignora il model_name della richiesta
+    # (necessario per l'instradamento tra modelli, vedi ModelRouter).
+    supports_model_override = True
+    # System prompt inviato quando il chiamante non ne specifica uno.
+    default_system_prompt = None
+
+    def __init__(self, provider_config: dict, section_config: dict = None):
+        self.provider_config = provider_config or {}
+        self.section_config = section_config or {}
+        self.pool_config = self.section_config.get("http_pool")
+        self.batch_config = self.section_config.get("batch") or {}
+        self.client = self.connect()
+
+    @property
+    def model_name(self) -> str:
+        try:
+            return self.provider_config["model_name"]
+        except KeyError as key_exc:
+            raise KeyError(
+                f"[BaseAgent] Chiave 'model_name' mancante nella configurazione {self.display_name}: {key_exc}"
+            ) from key_exc
+
+    @property
+    def connection_id(self) -> str:
+        """
+        Identità della connessione (endpoint e credenziali, vedi client_registry.connection_key):
+        chiave delle risorse condivise che dipendono dalla quota del provider.
+        """
+        return client_registry.connection_key(type(self), self.provider_config)
+
+    def connect(self):
+        """
+        Restituisce il client del provider dal registry di processo: agent con le stesse
+        credenziali condividono client e pool di connessioni keep-alive.
+        """
+        try:
+            return client_registry.get_client(type(self), self.provider_config, self.pool_config)
+        except KeyError as key_exc:
+            raise KeyError(f"[BaseAgent] Chiave mancante nella configurazione {self.display_name}: {key_exc}") from key_exc
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore creazione client {self.display_name}: {exc}") from exc
+
+    def get_async_client(self):
+        """
+        Restituisce il client asincrono condiviso (nello stesso event loop) per i backend
+        con supports_async.
+        """
+        try:
+            return client_registry.get_async_client(type(self), self.provider_config, self.pool_config)
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore creazione client asincrono {self.name}: {exc}") from exc
+
+    @classmethod
+    def client_key_extra(cls, provider_config: dict) -> tuple:
+        """
+        Valori aggiuntivi della chiave del client condiviso (es. il modello, se il client ne dipende).
+        """
+        return ()
+
+    @classmethod
+    def create_client(cls, provider_config: dict, pool: dict):
+        """
+        Crea il client sincrono del provider con le opzioni del pool di connessioni.
+        """
+        raise NotImplementedError(f"[{cls.__name__}] Client non disponibile.")
+
+    @classmethod
+    def create_async_client(cls, provider_config: dict, pool: dict):
+        """
+        Crea il client asincrono del provider con le opzioni del pool di connessioni.
+        """
+        raise NotImplementedError(f"[{cls.__name__}] Client asincrono non disponibile.")
+
+    @abstractmethod
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> Completion:
+        pass
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model_name: str,
+                        temperature: float) -> Completion:
+        raise NotImplementedError(f"[{type(self).__name__}] Chiamata asincrona non supportata.")
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float):
+        """
+        Produce i frammenti della risposta man mano che arrivano; di default l'intera
+        risposta in un solo frammento.
+        """
+        yield self.complete(system_prompt, user_prompt, model_name, temperature).text
+
+    def complete_batch(self, requests: list) -> list:
+        """
+        Esegue un lotto di richieste (dizionari con system_prompt, user_prompt, model_name e
+        temperature) e restituisce, nello stesso ordine, una Completion o l'eccezione della
+        richiesta. Di default le richieste vengono eseguite una alla volta; i backend con
+        supports_batch le inviano come un unico job all'API batch del provider.
+        Un errore dell'intero job viene sollevato.
+        """
+        results = []
+        for request in requests:
+            try:
+                results.append(self.complete(request["system_prompt"], request["user_prompt"],
+                                             request["model_name"], request["temperature"]))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def wait_for_batch(self, retrieve, status_of, terminal_statuses: tuple):
+        """
+        Interroga lo stato del job batch (retrieve()) ogni poll_interval secondi finché
+        status_of(job) non è uno degli stati finali, e restituisce il job.
+        Solleva TimeoutError se il job non termina entro timeout secondi.
+        """
+        poll_interval = float(self.batch_config.get("poll_interval", DEFAULT_BATCH_POLL_INTERVAL))
+        deadline = time.monotonic() + float(self.batch_config.get("timeout", DEFAULT_BATCH_TIMEOUT))
+        last_status = None
+        while True:
+            job = retrieve()
+            status = status_of(job)
+            if status != last_status:
+                logger.info(f"[{type(self).__name__}] Job batch in stato '{status}'")
+                last_status = status
+            if status in terminal_statuses:
+                return job
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"[{type(self).__name__}] Job batch non completato entro il timeout "
+                                   f"(ultimo stato '{status}').")
+            time.sleep(poll_interval)
@@ -0,0 +1,61 @@
+from agents.backends.base import Completion, LLMBackend
+from agents.client_registry import get_boto3_client
+
+
+class BedrockBackend(LLMBackend):
+    """
+    Modelli AWS Bedrock tramite ChatBedrock di LangChain (solo client sincrono: le
+    chiamate asincrone vengono eseguite nel thread pool del provider).
+
+        aws_bedrock:
+          model_name: "nome_modello"
+          api_key:    "aws_api_key"
+          api_secret: "aws_api_secret"
+          region:     "aws_region"
+    """
+    name = "bedrock"
+    display_name = "AWS Bedrock"
+    connection_keys = ("api_key", "api_secret", "region")
+    default_concurrency = 4
+    supports_model_override = False
+
+    @classmethod
+    def client_key_extra(cls, provider_config: dict) -> tuple:
+        # ChatBedrock è legato al modello: il client boto3 sottostante è comunque condiviso.
+        return (provider_config.get("model_name"),)
+
+    @classmethod
+    def create_client(cls, provider_config: dict, pool: dict):
+        from langchain_aws import ChatBedrock
+        # Le credenziali vengono passate al client boto3 senza modificare os.environ.
+        return ChatBedrock(
+            model_id=provider_config["model_name"],
+            client=get_boto3_client(provider_config, pool)
+        )
+
+    def _chain(self, system_prompt: str, user_prompt: str) -> tuple:
+        """
+        Costruisce la chain LangChain per Bedrock e il relativo input.
+        """
+        final_input = f"{system_prompt}\n{user_prompt}" if system_prompt else user_prompt
+
+        prompt_template_str = "Domanda: {input}\nRisposta:"
+        from langchain_core.prompts import PromptTemplate
+        prompt_template = PromptTemplate.from_template(prompt_template_str)
+
+        return prompt_template | self.client, {"input": final_input}
+
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> Completion:
+        try:
+            chain, chain_input = self._chain(system_prompt, user_prompt)
+            extraction = chain.invoke(chain_input)
+            if hasattr(extraction, "content"):
+                extraction = extraction.content.strip()
+            return Completion(extraction)
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata Bedrock: {exc}") from exc
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float):
+        chain, chain_input = self._chain(system_prompt, user_prompt)
+        for chunk in chain.stream(chain_input):
+            yield chunk.content if hasattr(chunk, "content") else chunk
@@ -0,0 +1,45 @@
+from agents.backends.base import Completion, LLMBackend
+from agents.mock_provider import DEFAULT_MOCK_CONFIG, MockLLMClient
+
+
+class MockBackend(LLMBackend):
+    """
+    Provider simulato per benchmark e prove offline (vedi MockLLMClient). Gli errori
+    simulati non vengono incapsulati, così lo scheduler ne legge status code e Retry-After.
+
+        mock:
+          model_name:        "gpt-4o-mini"
+          latency:           0.05
+          tokens_per_second: 0
+          completion_tokens: 64
+          error_rate:        0.0
+          throttle_rate:     0.0
+          batch_latency:     0.5   # durata simulata di un job batch
+    """
+    name = "mock"
+    display_name = "Mock"
+    default_concurrency = 8
+    supports_async = True
+    supports_batch = True
+
+    @property
+    def model_name(self) -> str:
+        return self.provider_config.get("model_name", DEFAULT_MOCK_CONFIG["model_name"])
+
+    def connect(self):
+        # Nessuna connessione da condividere: ogni agent ha il proprio client simulato.
+        return MockLLMClient(self.provider_config)
+
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> Completion:
+        return Completion(self.client.complete(system_prompt, user_prompt, model_name))
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model_name: str,
+                        temperature: float) -> Completion:
+        return Completion(await self.client.acomplete(system_prompt, user_prompt, model_name))
+
+    def complete_batch(self, requests: list) -> list:
+        return [result if isinstance(result, Exception) else Completion(result)
+                for result in self.client.complete_batch(requests)]
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float):
+        return self.client.stream(system_prompt, user_prompt, model_name)
@@ -0,0 +1,176 @@
+import json
+
+from agents.backends.base import Completion, LLMBackend
+from agents.client_registry import httpx_options
+from utils.common import logger
+
+# System prompt usato da OpenAI quando il chiamante non ne specifica uno.
+DEFAULT_OPENAI_SYSTEM_PROMPT = (
+    "You are a specialized assistant that extracts specific information "
+    "from a document. Provide concise and accurate answers."
+)
+
+# I modelli di reasoning non accettano il parametro temperature.
+REASONING_MODELS = ("o1", "o1-mini", "o3-mini")
+
+# Stati finali di un job della Batch API.
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Azure OpenAI (chat completions), con client sincrono e asincrono e Batch API.
+
+        openai:
+          model_name:  "nome_modello"
+          api_key:     "chiave_api"
+          api_version: "versione_api"
+          base_url:    "endpoint_azure"
+
+    In modalità batch le richieste vengono caricate come file JSONL e completate da un job
+    della Batch API; il deployment "Global Batch" da usare va indicato nel blocco batch:
+
+        batch:
+          deployment:        "gpt-4o-mini-batch"  # default: il modello della richiesta
+          completion_window: "24h"
+    """
+    name = "openai"
+    display_name = "OpenAI"
+    connection_keys = ("api_key", "api_version", "base_url")
+    default_concurrency = 8
+    supports_async = True
+    supports_batch = True
+    # Richieste per file di input della Batch API di Azure OpenAI.
+    max_batch_size = 100000
+    default_system_prompt = DEFAULT_OPENAI_SYSTEM_PROMPT
+
+    @classmethod
+    def create_client(cls, provider_config: dict, pool: dict):
+        from openai import AzureOpenAI, DefaultHttpxClient
+        return AzureOpenAI(
+            api_key=provider_config["api_key"],
+            api_version=provider_config["api_version"],
+            azure_endpoint=provider_config["base_url"],
+            http_client=DefaultHttpxClient(**httpx_options(pool))
+        )
+
+    @classmethod
+    def create_async_client(cls, provider_config: dict, pool: dict):
+        from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+        return AsyncAzureOpenAI(
+            api_key=provider_config["api_key"],
+            api_version=provider_config["api_version"],
+            azure_endpoint=provider_config["base_url"],
+            http_client=DefaultAsyncHttpxClient(**httpx_options(pool))
+        )
+
+    @staticmethod
+    def build_request(system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> dict:
+        """
+        Costruisce gli argomenti della chiamata chat completions di OpenAI.
+        Il system prompt precede il messaggio utente, così il prefisso comune alle
+        richieste viene riusato dalla cache automatica dei prompt di OpenAI.
+        """
+        if system_prompt is None:
+            system_prompt = DEFAULT_OPENAI_SYSTEM_PROMPT
+        request = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        }
+        if model_name not in REASONING_MODELS:
+            request["temperature"] = temperature
+        return request
+
+    @staticmethod
+    def _completion(response) -> Completion:
+        # Token del prefisso serviti dalla cache automatica dei prompt di OpenAI
+        details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+        return Completion(response.choices[0].message.content.strip(),
+                          cache_read_tokens=getattr(details, "cached_tokens", None) or 0)
+
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> Completion:
+        request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+        try:
+            return self._completion(self.client.chat.completions.create(**request))
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata OpenAI: {exc}") from exc
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model_name: str,
+                        temperature: float) -> Completion:
+        request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+        try:
+            return self._completion(await self.get_async_client().chat.completions.create(**request))
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata OpenAI: {exc}") from exc
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float):
+        request = self.build_request(system_prompt, user_prompt, model_name, temperature)
+        for chunk in self.client.chat.completions.create(**request, stream=True):
+            # Azure può inviare chunk senza choices (es. risultati del content filter).
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def complete_batch(self, requests: list) -> list:
+        """
+        Esegue le richieste con un job della Batch API: carica il file JSONL (una riga per
+        richiesta, identificata da custom_id), crea il job, ne attende il completamento e
+        associa ogni riga dei file di output e di errore alla richiesta corrispondente.
+        """
+        deployment = self.batch_config.get("deployment")
+        lines = []
+        for index, request in enumerate(requests):
+            body = self.build_request(request["system_prompt"], request["user_prompt"],
+                                      request["model_name"], request["temperature"])
+            if deployment:
+                body["model"] = deployment
+            lines.append(json.dumps({"custom_id": str(index), "method": "POST",
+                                     "url": "/chat/completions", "body": body}, ensure_ascii=False))
+
+        try:
+            input_file = self.client.files.create(
+                file=("pycopilot-batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+            job = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/chat/completions",
+                completion_window=self.batch_config.get("completion_window", "24h")
+            )
+            logger.info(f"[OpenAIBackend] Job batch {job.id} creato con {len(requests)} richieste")
+            try:
+                job = self.wait_for_batch(lambda: self.client.batches.retrieve(job.id),
+                                          lambda current: current.status, BATCH_TERMINAL_STATUSES)
+            except TimeoutError:
+                self.client.batches.cancel(job.id)
+                raise
+            if job.status != "completed":
+                raise RuntimeError(f"job {job.id} terminato in stato '{job.status}': {job.errors}")
+
+            results = [RuntimeError("[BaseAgent] Nessun risultato per la richiesta nel batch OpenAI.")
+                       for _ in requests]
+            for file_id in (job.output_file_id, job.error_file_id):
+                if not file_id:
+                    continue
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        results[int(record["custom_id"])] = self._batch_result(record)
+            return results
+        except Exception as exc:
+            raise RuntimeError(f"[BaseAgent] Errore durante il batch OpenAI: {exc}") from exc
+
+    @staticmethod
+    def _batch_result(record: dict):
+        """
+        Converte una riga del file di output (o di errore) del job in Completion o eccezione.
+        """
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or body.get("error")
+            return RuntimeError(f"[BaseAgent] Richiesta fallita nel batch OpenAI "
+                                f"({response.get('status_code')}): {error}")
+        details = (body.get("usage") or {}).get("prompt_tokens_details") or {}
+        return Completion(body["choices"][0]["message"]["content"].strip(),
+                          cache_read_tokens=details.get("cached_tokens") or 0)
@@ -1,16 +1,89 @@
-import os
-
-from openai import AzureOpenAI, api_key
+import asyncio
+import functools
+import contextvars
+import json
+import threading
+import time
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 
-from utils.common import load_yaml_config, logger
+from agents.backends import Completion, select_backend
+from utils.batch_collector import get_batch_collector
+from utils.common import load_yaml_config_cached, write_text_stream_to_file, logger
+from utils.model_router import ModelRouter
+from utils.response_cache import ResponseCache
+from utils.prompt_packer import PromptPacker
+from utils.python_chunker import PythonChunker
+from utils.request_scheduler import get_scheduler
 from utils.token_manager.token_manager import TokenManager
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.tracing import annotate, get_tracer, span
 
 # ~2000 caratteri corrispondono circa a 500 token ovvero dimensione ottimale superato il quale il LLM va in Lost-in-the-middle
 DEFAULT_CHUNK_SIZE = 2000
 
+# Map-reduce: numero di risultati parziali fusi in ciascuna chiamata di reduce
+# e numero massimo di chunk analizzati contemporaneamente nella fase di map.
+DEFAULT_MAP_REDUCE_FAN_OUT = 8
+DEFAULT_MAP_REDUCE_MAX_IN_FLIGHT = 4
+
+# TokenManager usato solo per stimare i token quando l'agent non ne ha uno.
+_ESTIMATOR = TokenManager()
+
+
+class _ProviderLimit:
+    """
+    Limite di concorrenza di un provider, condiviso da tutti gli agent del processo: il
+    thread pool delle chiamate sincrone e, per ogni event loop, il semaforo delle chiamate
+    asincrone hanno entrambi max_concurrency posti.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        # I semafori asyncio sono legati all'event loop in cui vengono usati.
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                    thread_name_prefix=f"pycopilot-{self.provider}")
+            return self._executor
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return semaphore
+
+
+# Limiti di concorrenza condivisi tra tutti gli agent dello stesso provider: il limite
+# vale per l'intero processo e non per il singolo agent.
+_PROVIDER_LIMITS = {}
+_PROVIDER_LIMITS_LOCK = threading.Lock()
+
+
+def _provider_limit(provider: str, max_concurrency: int) -> _ProviderLimit:
+    """
+    Restituisce il limite di concorrenza del provider, creandolo con max_concurrency al primo
+    agent; un agent successivo con un valore diverso riceve il limite già in uso (segnalato
+    con un warning, perché il thread pool non può essere ridimensionato).
+    """
+    with _PROVIDER_LIMITS_LOCK:
+        limit = _PROVIDER_LIMITS.get(provider)
+        if limit is None:
+            limit = _PROVIDER_LIMITS[provider] = _ProviderLimit(provider, max_concurrency)
+        elif limit.max_concurrency != max_concurrency:
+            logger.warning(f"[BaseAgent] max_concurrency={max_concurrency} ignorato: il provider '{provider}' "
+                           f"usa già il limite condiviso di {limit.max_concurrency} richieste contemporanee.")
+        return limit
+
 class BaseAgent(ABC):
     def __init__(
             self,
@@ -44,238 +117,784 @@ class BaseAgent(ABC):
               api_secret:  "aws_api_secret"
               region:      "aws_region"
 
-        Il provider viene scelto in automatico in base alle chiavi presenti.
+        • Per il provider simulato (benchmark e prove offline, vedi MockLLMClient):
+            mock:
+              model_name:        "gpt-4o-mini"
+              latency:           0.05
+              tokens_per_second: 0
+              completion_tokens: 64
+              error_rate:        0.0
+              throttle_rate:     0.0
+
+        Il provider viene scelto in automatico in base alle chiavi presenti: ogni blocco
+        corrisponde a un backend (vedi agents.backends), e altri backend possono essere
+        registrati con un entry point nel gruppo "pycopilot.backends".
         """
 
         self.config_section = config_section
-        self._full_config = load_yaml_config(config_path)
+        self._full_config = load_yaml_config_cached(config_path)
         self.config = self._full_config.get(self.config_section, {})
 
-        # Determinazione del provider in base alle chiavi esistenti:
-        if "openai" in self.config:
-            self.provider = "openai"
-        elif "anthropic_bedrock" in self.config:
-            self.provider = "anthropic-bedrock"
-        elif "aws_bedrock" in self.config:
-            self.provider = "bedrock"
-        else:
-            raise ValueError(
-                "Configurazione non valida: Nessuna sezione 'openai', 'anthropic_bedrock' o 'aws_bedrock' trovata.")
+        # Determinazione del backend in base al blocco presente nella sezione: viene
+        # importato solo il modulo del backend selezionato.
+        backend_class, config_key = select_backend(self.config)
+        self.backend = backend_class(self.config[config_key], self.config)
+        self.provider = self.backend.name
+        self.client = self.backend.client
+        self.model_name = self.backend.model_name
 
-            # Crea il client in base al provider determinato
-        self.client = self._create_client()
+        self.token_manager = external_token_manager
 
-        # Imposta il nome del modello in base al provider
-        if self.provider == "openai":
-            try:
-                self.model_name = self.config["openai"]["model_name"]
-            except KeyError as key_exc:
-                raise KeyError(
-                    f"[BaseAgent] Chiave 'model_name' mancante nella configurazione OpenAI: {key_exc}") from key_exc
-        elif self.provider == "anthropic-bedrock":
-            try:
-                self.model_name = self.config["anthropic_bedrock"]["model_name"]
-            except KeyError as key_exc:
-                raise KeyError(
-                    f"[BaseAgent] Chiave 'model_name' mancante nella configurazione AnthropicBedrock: {key_exc}") from key_exc
-        elif self.provider == "bedrock":
-            try:
-                self.model_name = self.config["aws_bedrock"]["model_name"]
-            except KeyError as key_exc:
-                raise KeyError(
-                    f"[BaseAgent] Chiave 'model_name' mancante nella configurazione AWS Bedrock: {key_exc}") from key_exc
+        # Concorrenza delle chiamate batch (chat_completion_many / achat_completion_many).
+        self.max_concurrency = int(
+            self.config.get("max_concurrency", self.backend.default_concurrency))
+        if self.max_concurrency < 1:
+            raise ValueError("[BaseAgent] max_concurrency deve essere almeno 1.")
+        self._concurrency = _provider_limit(self.provider, self.max_concurrency)
+
+        # Cache persistente delle risposte (opzionale):
+        #   response_cache:
+        #     enabled:     true
+        #     path:        ".pycopilot_cache/responses.sqlite3"
+        #     ttl_seconds: 604800
+        #     max_size_mb: 256
+        cache_config = self.config.get("response_cache") or {}
+        self.response_cache = ResponseCache.from_config(cache_config) if cache_config.get("enabled") else None
+
+        # Scheduler delle richieste (retry con backoff e limiti di frequenza), condiviso
+        # da tutti gli agent che usano lo stesso provider, endpoint e modello; le chiamate
+        # ad altri modelli (model_name esplicito o routing) usano lo scheduler di quel modello
+        # (vedi _scheduler_for):
+        #   rate_limit:
+        #     requests_per_minute: 60
+        #     tokens_per_minute:   150000
+        #     max_retries:         5
+        #     base_delay:          1.0
+        #     max_delay:           60.0
+        self.rate_limit_config = self.config.get("rate_limit")
+        self.scheduler = get_scheduler((self.provider, self.backend.connection_id, self.model_name),
+                                       self.rate_limit_config)
+
+        # Modalità batch (opzionale), per le analisi offline in cui conta il costo e non la
+        # latenza: le richieste chat_completion in attesa (anche di agent e thread diversi)
+        # vengono raccolte ed eseguite come job dell'API batch del provider, ai prezzi batch:
+        #   batch:
+        #     enabled:        true
+        #     max_wait:       30     # secondi di attesa di altre richieste prima di inviare il job
+        #     max_batch_size: 1000   # richieste per job (al massimo il limite del provider)
+        #     poll_interval:  30     # secondi tra due controlli dello stato del job
+        #     timeout:        86400  # attesa massima del job, poi viene annullato
+        # più le chiavi specifiche del backend (deployment per OpenAI, bucket S3 e ruolo per Bedrock).
+        batch_config = self.config.get("batch") or {}
+        self.batch_collector = None
+        if batch_config.get("enabled"):
+            if not self.backend.supports_batch:
+                raise ValueError(f"[BaseAgent] Il provider '{self.provider}' non supporta la modalità batch.")
+            # Un collector per connessione (endpoint e credenziali), modello e configurazione
+            # batch (deployment, bucket S3, ruolo): le richieste accodate vengono inviate con il
+            # backend dell'agent che lo ha creato, equivalente a quello degli altri agent.
+            batch_key = (self.provider, self.backend.connection_id, self.model_name,
+                         json.dumps(batch_config, sort_keys=True, default=str))
+            self.batch_collector = get_batch_collector(
+                batch_key, self._run_batch, batch_config, self.backend.max_batch_size)
+
+        # Instradamento tra modelli (opzionale): le richieste senza model_name vanno al primo
+        # modello della lista (dal più economico) i cui limiti coprono i token del prompt e la
+        # complessità del codice Python che contiene; con cascade, una risposta che non supera
+        # il validatore viene ripetuta sul modello successivo. Limiti e prezzi dei modelli
+        # vengono da costs.cost_map; i modelli devono essere serviti dallo stesso provider:
+        #   routing:
+        #     enabled: true
+        #     cascade: true
+        #     min_answer_chars: 20  # validatore predefinito (sostituibile con router.validator)
+        #     models:
+        #       - model_name:     "gpt-4o-mini"
+        #         max_tokens:     4000  # token del prompt
+        #         max_complexity: 15    # complessità ciclomatica totale del codice Python
+        #         max_nesting:    4     # annidamento massimo dei blocchi
+        #         rate_limit:     {requests_per_minute: 600}  # default: il rate_limit della sezione
+        #       - model_name:     "o3-mini"  # l'ultimo modello riceve tutto il resto
+        routing_config = self.config.get("routing") or {}
+        self.router = None
+        if routing_config.get("enabled"):
+            if not self.backend.supports_model_override:
+                raise ValueError(f"[BaseAgent] Il provider '{self.provider}' non permette di scegliere "
+                                 f"il modello per richiesta: routing non disponibile.")
+            self.router = ModelRouter.from_config(routing_config, self._count_prompt_tokens,
+                                                  self.token_manager or _ESTIMATOR)
+
+        # Lo splitter (e con esso langchain) viene caricato solo al primo utilizzo.
+        self._splitter = None
+
+        # Modalità map-reduce (opzionale), configurabile nella sezione YAML:
+        #   map_reduce:
+        #     enabled:       true
+        #     fan_out:       8   # risultati parziali fusi per ogni chiamata di reduce
+        #     max_in_flight: 4   # chunk analizzati in parallelo nella fase di map
+        #     strategy:      "split"  # "split" (chunk di chunk_size caratteri) o "pack"
+        #                             # (file raggruppati entro il budget di token del modello)
+        #     max_completion_tokens: 8000  # token riservati alla risposta con strategy "pack"
+        #     chunk_size:    2000  # caratteri per chunk con strategy "split"
+        #     python_chunking: true  # con strategy "split" i file .py sono divisi ai confini
+        #                            # di classi e funzioni (vedi PythonChunker)
+        map_reduce_config = self.config.get("map_reduce") or {}
+        self.map_reduce_enabled = bool(map_reduce_config.get("enabled", False))
+        self.map_reduce_strategy = map_reduce_config.get("strategy", "split")
+        self.chunk_size = int(map_reduce_config.get("chunk_size", DEFAULT_CHUNK_SIZE))
+        self.python_chunking = bool(map_reduce_config.get("python_chunking", True))
+        self.map_reduce_max_completion_tokens = map_reduce_config.get("max_completion_tokens")
+        if self.map_reduce_strategy not in ("split", "pack"):
+            raise ValueError("[BaseAgent] map_reduce.strategy deve essere 'split' o 'pack'.")
+        self.map_reduce_fan_out = int(map_reduce_config.get("fan_out", DEFAULT_MAP_REDUCE_FAN_OUT))
+        self.map_reduce_max_in_flight = int(
+            map_reduce_config.get("max_in_flight", DEFAULT_MAP_REDUCE_MAX_IN_FLIGHT))
+        if self.map_reduce_fan_out < 2:
+            raise ValueError("[BaseAgent] map_reduce.fan_out deve essere almeno 2.")
+        if self.map_reduce_max_in_flight < 1:
+            raise ValueError("[BaseAgent] map_reduce.max_in_flight deve essere almeno 1.")
+
+    @property
+    def splitter(self):
+        """
+        RecursiveCharacterTextSplitter creato al primo accesso: l'import di langchain
+        pesa sull'avvio e serve solo alla modalità map-reduce.
+        """
+        if self._splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,  # DEFAULT_CHUNK_SIZE se non configurato
+                chunk_overlap=10,  # Se vuoi sovrapposizione, imposta un valore > 0
+                separators=["\n## ", "\n### ", "\n\n", "\n", " ", ""]
+            )
+        return self._splitter
 
-        self.token_manager = external_token_manager
+    def chat_completion(
+            self,
+            system_prompt: str = None,
+            user_prompt: str = None,
+            model_name: str = None,
+            temperature: float = 0.0,
+            use_cache: bool = True
+    ) -> str:
+        """
+        Esegue la chiamata al modello LLM e delega la logica specifica del provider
+        alle funzioni helper dedicate.
+        Se la cache delle risposte è attiva, una richiesta identica già eseguita viene
+        servita dalla cache; use_cache=False forza la chiamata al provider.
+        In modalità batch la chiamata attende il completamento del job batch che la contiene.
+        Con il routing attivo e model_name non indicato il modello viene scelto dal router.
+        """
+        if self.router is not None and model_name is None:
+            return self._routed_completion(system_prompt, user_prompt, temperature, use_cache)
+
+        if self.batch_collector is not None:
+            return self._batch_enqueue(system_prompt, user_prompt, model_name, temperature, use_cache)()
+
+        model_name = self._validate_request(user_prompt, model_name)
+
+        cache_key, cached = self._cache_lookup(system_prompt, user_prompt, model_name, temperature, use_cache)
+        if cached is not None:
+            return cached
 
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=DEFAULT_CHUNK_SIZE,  # Valore migliore per il chunking
-            chunk_overlap=10,  # Se vuoi sovrapposizione, imposta un valore > 0
-            separators=["\n## ", "\n### ", "\n\n", "\n", " ", ""]
+        # Lo scheduler applica i limiti RPM/TPM e ripete le chiamate rifiutate per throttling.
+        extraction = self._scheduler_for(model_name).execute(
+            lambda: self._complete(system_prompt, user_prompt, model_name, temperature),
+            self._estimate_tokens(system_prompt, user_prompt, model_name)
         )
 
-    def _create_client(self):
-        if self.provider == "openai":
-            try:
-                openai_config = self.config["openai"]
-                api_key_val = openai_config["api_key"]
-                api_version = openai_config["api_version"]
-                azure_endpoint = openai_config["base_url"]
-                return AzureOpenAI(
-                    api_key=api_key_val,
-                    api_version=api_version,
-                    azure_endpoint=azure_endpoint
-                )
-            except KeyError as key_exc:
-                raise KeyError(f"[BaseAgent] Chiave mancante nella configurazione OpenAI: {key_exc}") from key_exc
-            except Exception as exc:
-                raise RuntimeError(f"[BaseAgent] Errore creazione client OpenAI: {exc}") from exc
+        if cache_key is not None:
+            self.response_cache.put(cache_key, extraction)
+        return extraction
+
+    async def achat_completion(
+            self,
+            system_prompt: str = None,
+            user_prompt: str = None,
+            model_name: str = None,
+            temperature: float = 0.0,
+            use_cache: bool = True
+    ) -> str:
+        """
+        Variante asincrona di chat_completion: usa il client asincrono del backend
+        se disponibile (supports_async), altrimenti esegue la chiamata sincrona nel
+        thread pool condiviso del provider.
+        """
+        if self.router is not None and model_name is None:
+            return await self._aroute_completion(system_prompt, user_prompt, temperature, use_cache)
+
+        if self.batch_collector is not None:
+            wait_result = self._batch_enqueue(system_prompt, user_prompt, model_name, temperature, use_cache)
+            return await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(contextvars.copy_context().run, wait_result))
+
+        model_name = self._validate_request(user_prompt, model_name)
+
+        if not self.backend.supports_async:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(),
+                functools.partial(contextvars.copy_context().run, self.chat_completion, system_prompt,
+                                  user_prompt, model_name, temperature, use_cache)
+            )
+
+        cache_key, cached = self._cache_lookup(system_prompt, user_prompt, model_name, temperature, use_cache)
+        if cached is not None:
+            return cached
+
+        # Il semaforo del provider limita le chiamate asincrone di tutti gli agent.
+        async with self._concurrency.semaphore():
+            extraction = await self._scheduler_for(model_name).aexecute(
+                lambda: self._acomplete(system_prompt, user_prompt, model_name, temperature),
+                self._estimate_tokens(system_prompt, user_prompt, model_name))
 
-        elif self.provider == "bedrock":
+        if cache_key is not None:
+            self.response_cache.put(cache_key, extraction)
+        return extraction
+
+    def chat_completion_many(self, requests: list, max_in_flight: int = None, return_exceptions: bool = True) -> list:
+        """
+        Esegue più chiamate chat_completion in parallelo sul thread pool del provider.
+
+        Ogni richiesta è un dizionario con gli stessi argomenti di chat_completion
+        (system_prompt, user_prompt, model_name, temperature). I risultati mantengono
+        l'ordine delle richieste; con return_exceptions=True l'errore di una richiesta
+        viene restituito al suo posto senza interrompere le altre.
+        In modalità batch le richieste vengono inviate insieme in un job batch (max_in_flight
+        non si applica).
+        """
+        if self.router is not None and any(request.get("model_name") is None for request in requests):
+            return self._chat_completion_many_routed(requests, max_in_flight, return_exceptions)
+
+        if self.batch_collector is not None:
+            return self._chat_completion_many_batch(requests, return_exceptions)
+
+        executor = self._get_executor()
+        limiter = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+        futures = []
+        for request in requests:
+            if limiter:
+                limiter.acquire()
+            # Il contesto (es. usage_labels) segue la richiesta nel thread del pool.
+            future = executor.submit(contextvars.copy_context().run, self.chat_completion, **request)
+            if limiter:
+                future.add_done_callback(lambda _future: limiter.release())
+            futures.append(future)
+
+        results = []
+        for future in futures:
             try:
-                from langchain_aws import ChatBedrock
-                aws_config = self.config["aws_bedrock"]
-                api_key_val = aws_config["api_key"]
-                api_secret = aws_config["api_secret"]
-                region = aws_config["region"]
-
-                os.environ["AWS_ACCESS_KEY_ID"] = api_key_val
-                os.environ["AWS_SECRET_ACCESS_KEY"] = api_secret
-                os.environ["AWS_DEFAULT_REGION"] = region
-
-                model_id = aws_config["model_name"]
-                return ChatBedrock(model_id=model_id)
-            except KeyError as key_exc:
-                raise KeyError(f"[BaseAgent] Chiave mancante nella configurazione AWS Bedrock: {key_exc}") from key_exc
+                results.append(future.result())
             except Exception as exc:
-                raise RuntimeError(f"[BaseAgent] Errore creazione client Bedrock: {exc}") from exc
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
+
+    async def achat_completion_many(self, requests: list, max_in_flight: int = None,
+                                    return_exceptions: bool = True) -> list:
+        """
+        Variante asincrona di chat_completion_many: le richieste in corso sono al massimo
+        max_in_flight per questa chiamata e, in ogni caso, entro il limite di concorrenza
+        condiviso del provider.
+        """
+        if self.batch_collector is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(contextvars.copy_context().run, self._chat_completion_many_batch,
+                                        requests, return_exceptions))
+
+        semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+
+        async def _run_one(request):
+            if semaphore is None:
+                return await self.achat_completion(**request)
+            async with semaphore:
+                return await self.achat_completion(**request)
 
-        elif self.provider == "anthropic-bedrock":
+        return await asyncio.gather(*(_run_one(request) for request in requests),
+                                    return_exceptions=return_exceptions)
+
+    def chat_completion_stream(
+            self,
+            system_prompt: str = None,
+            user_prompt: str = None,
+            model_name: str = None,
+            temperature: float = 0.0,
+            use_cache: bool = True
+    ):
+        """
+        Variante in streaming di chat_completion: restituisce un generatore che produce
+        i frammenti di testo man mano che arrivano dal provider. Al termine registra nel
+        TokenManager anche il time-to-first-token e i token/secondo della chiamata.
+        Le chiamate in streaming non passano dalla modalità batch; con il routing attivo il
+        modello viene scelto dal router, senza cascade (la risposta è già stata prodotta).
+        """
+        if self.router is not None and model_name is None and user_prompt is not None:
+            model_name = self.router.model_name(self.router.route(system_prompt, user_prompt))
+        model_name = self._validate_request(user_prompt, model_name)
+        if system_prompt is None:
+            system_prompt = self.backend.default_system_prompt
+
+        cache_key, cached = self._cache_lookup(system_prompt, user_prompt, model_name, temperature, use_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        scheduler = self._scheduler_for(model_name)
+        estimated_tokens = self._estimate_tokens(system_prompt, user_prompt, model_name)
+        attempt = 0
+        while True:
+            delay = scheduler.admission_delay(estimated_tokens)
+            if delay > 0:
+                time.sleep(delay)
+
+            deltas = self.backend.stream(system_prompt, user_prompt, model_name, temperature)
+
+            start = time.perf_counter()
+            first_token_at = None
+            parts = []
             try:
-                from anthropic import AnthropicBedrock
-                anthropic_config = self.config["anthropic_bedrock"]
-                aws_access_key = anthropic_config["api_key"]
-                aws_secret_key = anthropic_config["api_secret"]
-                aws_region = anthropic_config["region"]
-
-                return AnthropicBedrock(
-                    aws_access_key=aws_access_key,
-                    aws_secret_key=aws_secret_key,
-                    aws_region=aws_region
-                )
-            except KeyError as key_exc:
-                raise KeyError(
-                    f"[BaseAgent] Chiave mancante nella configurazione AnthropicBedrock: {key_exc}") from key_exc
+                for delta in deltas:
+                    if not delta:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+                break
             except Exception as exc:
-                raise RuntimeError(f"[BaseAgent] Errore creazione client AnthropicBedrock: {exc}") from exc
-
-    def chat_completion(
+                # Una chiamata può essere ripetuta solo se non ha ancora prodotto testo.
+                delay = None if parts else scheduler.retry_delay(exc, attempt)
+                if delay is None:
+                    raise RuntimeError(f"[BaseAgent] Errore durante lo streaming {self.provider}: {exc}") from exc
+                attempt += 1
+                logger.warning(f"[BaseAgent] Streaming rifiutato, nuovo tentativo {attempt} tra {delay:.1f}s: {exc}")
+                time.sleep(delay)
+        end = time.perf_counter()
+
+        extraction = "".join(parts)
+        completion_tokens = 0
+        if self.token_manager:
+            first_token_at = first_token_at or end
+            _, _, completion_tokens = self.token_manager.calculate_and_apply_cost(
+                model_name,
+                system_prompt or "",
+                user_prompt,
+                extraction,
+                time_to_first_token=first_token_at - start,
+                generation_time=end - first_token_at,
+                agent=type(self).__name__
+            )
+        # Il generatore non può restare dentro uno span tra un frammento e l'altro:
+        # la durata della chiamata viene registrata al termine.
+        get_tracer().record(f"llm.{self.provider}.stream", end - start, num_bytes=len(extraction),
+                            tokens=max(completion_tokens, 0))
+        if cache_key is not None:
+            self.response_cache.put(cache_key, extraction)
+
+    def stream_to_file(
             self,
+            output_path: str,
             system_prompt: str = None,
             user_prompt: str = None,
             model_name: str = None,
             temperature: float = 0.0
     ) -> str:
         """
-        Esegue la chiamata al modello LLM e delega la logica specifica del provider
-        alle funzioni helper dedicate.
+        Esegue chat_completion_stream scrivendo ogni frammento su output_path appena
+        arriva, e restituisce il testo completo.
         """
-        if self.client is None:
-            raise ValueError("[BaseAgent] Errore: Client LLM non configurato correttamente.")
+        parts = []
 
-        if user_prompt is None:
-            raise ValueError("[BaseAgent] user_prompt è vuoto!")
+        def _collect():
+            for delta in self.chat_completion_stream(system_prompt, user_prompt, model_name, temperature):
+                parts.append(delta)
+                yield delta
 
-        if model_name is None:
-            model_name = self.model_name
+        write_text_stream_to_file(output_path, _collect())
+        return "".join(parts)
 
-        if self.provider == "openai":
-            return self._chat_completion_openai(system_prompt, user_prompt, model_name, temperature)
-        elif self.provider == "bedrock":
-            return self._chat_completion_bedrock(system_prompt, user_prompt, model_name)
-        elif self.provider == "anthropic-bedrock":
-            return self._chat_completion_anthropic_bedrock(system_prompt, user_prompt, model_name)
-        else:
-            raise NotImplementedError(f"[BaseAgent] Provider '{self.provider}' non supportato.")
+    def _routed_completion(self, system_prompt: str, user_prompt: str, temperature: float, use_cache: bool) -> str:
+        """
+        Esegue chat_completion con il modello scelto dal router; con cascade la richiesta
+        viene ripetuta sul modello successivo finché la risposta non supera il validatore.
+        """
+        self._validate_request(user_prompt, None)
+        tier = self.router.route(system_prompt, user_prompt)
+        while True:
+            try:
+                answer = self.chat_completion(system_prompt, user_prompt, self.router.model_name(tier),
+                                              temperature, use_cache)
+            except Exception as exc:
+                answer = exc
+            tier = self._next_tier(tier, answer)
+            if tier is None:
+                if isinstance(answer, Exception):
+                    raise answer
+                return answer
+
+    async def _aroute_completion(self, system_prompt: str, user_prompt: str, temperature: float,
+                                 use_cache: bool) -> str:
+        """
+        Variante asincrona di _routed_completion.
+        """
+        self._validate_request(user_prompt, None)
+        tier = self.router.route(system_prompt, user_prompt)
+        while True:
+            try:
+                answer = await self.achat_completion(system_prompt, user_prompt, self.router.model_name(tier),
+                                                     temperature, use_cache)
+            except Exception as exc:
+                answer = exc
+            tier = self._next_tier(tier, answer)
+            if tier is None:
+                if isinstance(answer, Exception):
+                    raise answer
+                return answer
+
+    def _next_tier(self, tier: int, answer):
+        """
+        Restituisce il livello del router su cui ripetere la richiesta, o None se la
+        risposta (testo o eccezione) è accettata o non ci sono modelli più grandi.
+        """
+        next_tier = self.router.escalate(tier, answer)
+        if next_tier is not None:
+            logger.info(f"[BaseAgent] Risposta di {self.router.model_name(tier)} non valida: "
+                        f"nuovo tentativo con {self.router.model_name(next_tier)}")
+        return next_tier
 
-    def _chat_completion_openai(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> str:
+    def _chat_completion_many_routed(self, requests: list, max_in_flight: int, return_exceptions: bool) -> list:
         """
-        Gestisce la chiamata a OpenAI utilizzando il metodo chat completions.
+        chat_completion_many con il routing attivo: le richieste senza model_name vengono
+        assegnate ai modelli dal router; con cascade, quelle la cui risposta non supera il
+        validatore vengono ripetute insieme sul modello successivo.
         """
-        if system_prompt is None:
-            system_prompt = (
-                "You are a specialized assistant that extracts specific information "
-                "from a document. Provide concise and accurate answers."
+        tiers = [self.router.route(request.get("system_prompt"), request.get("user_prompt") or "")
+                 if request.get("model_name") is None else None for request in requests]
+        results = [None] * len(requests)
+        pending = list(range(len(requests)))
+        while pending:
+            outcomes = self.chat_completion_many(
+                [dict(requests[index], model_name=self.router.model_name(tiers[index]))
+                 if tiers[index] is not None else requests[index] for index in pending],
+                max_in_flight=max_in_flight,
+                return_exceptions=True
             )
-        try:
-            if model_name in ["o1", "o1-mini", "o3-mini"]:
-                response = self.client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ]
-                )
-            else:
-                response = self.client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=temperature
-                )
-            extraction = response.choices[0].message.content.strip()
-            if self.token_manager:
-                self.token_manager.calculate_and_apply_cost(
-                    model_name,
-                    system_prompt,
-                    user_prompt,
-                    extraction
-                )
+            escalated = []
+            for index, outcome in zip(pending, outcomes):
+                results[index] = outcome
+                next_tier = self._next_tier(tiers[index], outcome) if tiers[index] is not None else None
+                if next_tier is not None:
+                    tiers[index] = next_tier
+                    escalated.append(index)
+            pending = escalated
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def _batch_enqueue(self, system_prompt: str = None, user_prompt: str = None, model_name: str = None,
+                       temperature: float = 0.0, use_cache: bool = True):
+        """
+        Accoda la richiesta al BatchCollector e restituisce una funzione che ne attende il
+        risultato, lo registra nel TokenManager ai prezzi batch e lo salva nella cache delle
+        risposte. Le richieste servite dalla cache non vengono accodate.
+        """
+        model_name = self._validate_request(user_prompt, model_name)
+        cache_key, cached = self._cache_lookup(system_prompt, user_prompt, model_name, temperature, use_cache)
+        if cached is not None:
+            return lambda: cached
+
+        if system_prompt is None:
+            system_prompt = self.backend.default_system_prompt
+        future = self.batch_collector.submit({"system_prompt": system_prompt, "user_prompt": user_prompt,
+                                              "model_name": model_name, "temperature": temperature})
+
+        def wait_result() -> str:
+            extraction = self._finalize(future.result(), system_prompt, user_prompt, model_name, batch=True)
+            if cache_key is not None:
+                self.response_cache.put(cache_key, extraction)
             return extraction
 
-        except Exception as exc:
-            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata OpenAI: {exc}") from exc
+        return wait_result
 
-    def _chat_completion_bedrock(self, system_prompt: str, user_prompt: str, model_name: str) -> str:
+    def _chat_completion_many_batch(self, requests: list, return_exceptions: bool) -> list:
         """
-        Gestisce la chiamata al client Bedrock (AWS).
+        chat_completion_many in modalità batch: le richieste vengono accodate tutte e il job
+        inviato subito, senza attendere max_wait.
         """
-        try:
-            final_input = f"{system_prompt}\n{user_prompt}" if system_prompt else user_prompt
-
-            prompt_template_str = "Domanda: {input}\nRisposta:"
-            from langchain_core.prompts import PromptTemplate
-            prompt_template = PromptTemplate.from_template(prompt_template_str)
-
-            chain = prompt_template | self.client
-            extraction = chain.invoke({"input": final_input})
-            if hasattr(extraction, "content"):
-                extraction = extraction.content.strip()
-
-            if self.token_manager:
-                self.token_manager.calculate_and_apply_cost(
-                    model_name,
-                    system_prompt or "",
-                    user_prompt,
-                    extraction
-                )
-            return extraction
+        pending = []
+        for request in requests:
+            try:
+                pending.append(self._batch_enqueue(**request))
+            except Exception as exc:
+                pending.append(exc)
+        self.batch_collector.flush()
 
-        except Exception as exc:
-            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata Bedrock: {exc}") from exc
+        results = []
+        for wait_result in pending:
+            try:
+                if isinstance(wait_result, Exception):
+                    raise wait_result
+                results.append(wait_result())
+            except Exception as exc:
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
 
-    def _chat_completion_anthropic_bedrock(self, system_prompt: str, user_prompt: str, model_name: str) -> str:
+    def _run_batch(self, requests: list) -> list:
         """
-        Gestisce la chiamata a AnthropicBedrock.
+        Esegue le richieste raccolte dal BatchCollector con l'API batch del backend (un job
+        per modello) e restituisce, nello stesso ordine, le Completion o le eccezioni.
         """
-        try:
-            final_prompt = f"{system_prompt}\n{user_prompt}" if system_prompt else user_prompt
-            messages = [{"role": "user", "content": final_prompt}]
+        results = [None] * len(requests)
+        indexes_by_model = {}
+        for index, request in enumerate(requests):
+            indexes_by_model.setdefault(request["model_name"], []).append(index)
 
-            # Ottiene il max_tokens dalla configurazione (default 12000)
-            max_tokens = self.config["anthropic_bedrock"].get("max_tokens", 12000)
+        for indexes in indexes_by_model.values():
+            try:
+                with span(f"llm.{self.provider}.batch") as current:
+                    completions = self.backend.complete_batch([requests[index] for index in indexes])
+                    current.set(num_bytes=sum(len(completion.text) for completion in completions
+                                          if isinstance(completion, Completion)))
+            except Exception as exc:
+                completions = [exc] * len(indexes)
+            for index, completion in zip(indexes, completions):
+                results[index] = completion
+        return results
+
+    def _complete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> str:
+        """
+        Esegue una singola chiamata sincrona tramite il backend del provider.
+        """
+        if system_prompt is None:
+            system_prompt = self.backend.default_system_prompt
+        with span(f"llm.{self.provider}"):
+            completion = self.backend.complete(system_prompt, user_prompt, model_name, temperature)
+            return self._finalize(completion, system_prompt, user_prompt, model_name)
+
+    async def _acomplete(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float) -> str:
+        """
+        Esegue una singola chiamata con il client asincrono del backend.
+        """
+        if system_prompt is None:
+            system_prompt = self.backend.default_system_prompt
+        with span(f"llm.{self.provider}"):
+            completion = await self.backend.acomplete(system_prompt, user_prompt, model_name, temperature)
+            return self._finalize(completion, system_prompt, user_prompt, model_name)
 
-            extraction = self.client.messages.create(
-                model=model_name,
-                max_tokens=max_tokens,
-                messages=messages
+    def _finalize(self, completion: Completion, system_prompt: str, user_prompt: str, model_name: str,
+                  batch: bool = False) -> str:
+        """
+        Registra la chiamata nel TokenManager (compresi i token della cache dei prompt
+        riportati dal provider, e ai prezzi batch se eseguita da un job batch) e nello
+        span corrente, e restituisce il testo.
+        """
+        completion_tokens = 0
+        if self.token_manager:
+            _, _, completion_tokens = self.token_manager.calculate_and_apply_cost(
+                model_name,
+                system_prompt or "",
+                user_prompt,
+                completion.text,
+                cache_read_tokens=completion.cache_read_tokens,
+                cache_write_tokens=completion.cache_write_tokens,
+                batch=batch,
+                agent=type(self).__name__
             )
+        # Token della risposta, per i token/secondo dello span della chiamata.
+        annotate(num_bytes=len(completion.text), tokens=max(completion_tokens, 0))
+        return completion.text
 
-            if isinstance(extraction.content, list):
-                extraction = " ".join(tb.text for tb in extraction.content)
+    def _scheduler_for(self, model_name: str):
+        """
+        Restituisce lo scheduler del modello della chiamata: i limiti RPM/TPM valgono per
+        deployment, quindi i modelli del routing (o un model_name esplicito) non consumano
+        quelli del modello predefinito. Il rate_limit è quello del modello nel blocco routing,
+        altrimenti quello della sezione.
+        """
+        if model_name == self.model_name:
+            return self.scheduler
+        rate_limit_config = self.rate_limit_config
+        if self.router is not None:
+            rate_limit_config = self.router.rate_limit(model_name) or rate_limit_config
+        return get_scheduler((self.provider, self.backend.connection_id, model_name), rate_limit_config)
+
+    def _estimate_tokens(self, system_prompt: str, user_prompt: str, model_name: str) -> int:
+        """
+        Stima i token del prompt per il limite tokens-per-minute dello scheduler
+        (0 se il limite non è configurato).
+        """
+        if not self._scheduler_for(model_name).limits_tokens:
+            return 0
+        return self._count_prompt_tokens(model_name, (system_prompt or "") + user_prompt)
 
-            if self.token_manager:
-                self.token_manager.calculate_and_apply_cost(
-                    model_name,
-                    system_prompt or "",
-                    user_prompt,
-                    extraction
-                )
-            return extraction
+    def _count_prompt_tokens(self, model_name: str, prompt_text: str) -> int:
+        """
+        Conta i token del prompt con il TokenManager (stima di ~4 caratteri per token se
+        l'encoding del modello non è disponibile).
+        """
+        try:
+            return (self.token_manager or _ESTIMATOR).count_tokens(model_name, prompt_text)
+        except Exception:
+            return len(prompt_text) // 4
+
+    def _validate_request(self, user_prompt: str, model_name: str) -> str:
+        """
+        Verifica che la richiesta sia eseguibile e restituisce il modello da usare.
+        """
+        if self.client is None:
+            raise ValueError("[BaseAgent] Errore: Client LLM non configurato correttamente.")
+
+        if user_prompt is None:
+            raise ValueError("[BaseAgent] user_prompt è vuoto!")
+
+        return model_name or self.model_name
+
+    def _cache_lookup(self, system_prompt: str, user_prompt: str, model_name: str, temperature: float,
+                      use_cache: bool) -> tuple:
+        """
+        Restituisce (chiave, risposta_in_cache). La chiave è None se la cache è
+        disattivata o bypassata; la risposta è None in caso di miss.
+        Un hit viene registrato nel TokenManager come operazione a costo zero.
+        """
+        if self.response_cache is None or not use_cache:
+            return None, None
+
+        # Stessa chiave con o senza system prompt esplicito, su tutti i percorsi
+        # (sincrono, asincrono, streaming e batch): il provider riceve quello predefinito.
+        if system_prompt is None:
+            system_prompt = self.backend.default_system_prompt
+        cache_key = ResponseCache.make_key(self.provider, model_name, system_prompt, user_prompt, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None and self.token_manager:
+            self.token_manager.record_cache_hit(model_name, agent=type(self).__name__)
+        return cache_key, cached
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Restituisce il thread pool condiviso del provider, creandolo alla prima richiesta.
+        Il numero di worker è il limite di concorrenza per provider.
+        """
+        return self._concurrency.executor()
 
-        except Exception as exc:
-            raise RuntimeError(f"[BaseAgent] Errore durante la chiamata AnthropicBedrock: {exc}") from exc
+    def split_text(self, code) -> list:
+        """
+        Suddivide il contenuto aggregato (stringa o lista di file) in chunk.
+        Con python_chunking attivo i file .py di una lista vengono divisi ai confini di
+        modulo, classe e funzione, con gli import e la firma della classe necessari
+        (vedi PythonChunker); gli altri file passano dallo splitter configurato.
+        """
+        with span("agent.split_text") as current:
+            if self.python_chunking and isinstance(code, (list, tuple)):
+                chunker = PythonChunker(self.chunk_size, lambda text: self.splitter.split_text(text))
+                chunks = chunker.split(code)
+            else:
+                text = "\n".join(code) if isinstance(code, (list, tuple)) else code
+                chunks = self.splitter.split_text(text)
+            current.set(num_bytes=sum(map(len, chunks)))
+        return chunks
+
+    def pack_prompts(self, code, system_prompt: str = None, prompt_overhead: str = "") -> list:
+        """
+        Raggruppa i file del contenuto aggregato nel minor numero di prompt che rispettano
+        il budget di token del modello (vedi PromptPacker), riservando spazio per il
+        system prompt, la parte fissa dello user prompt e la risposta.
+        """
+        if isinstance(code, str):
+            code = [code]
+        packer = PromptPacker(
+            self.token_manager or TokenManager(),
+            self.model_name,
+            system_prompt=system_prompt or "",
+            prompt_overhead=prompt_overhead,
+            max_completion_tokens=self.map_reduce_max_completion_tokens
+        )
+        with span("agent.pack_prompts") as current:
+            prompts = ["\n".join(files) for files in packer.pack(code)]
+            current.set(num_bytes=sum(map(len, prompts)))
+        return prompts
+
+    def map_reduce(
+            self,
+            code,
+            system_prompt: str = None,
+            map_prompt: str = "",
+            reduce_prompt: str = "",
+            fan_out: int = None,
+            max_in_flight: int = None,
+            output_path: str = None
+    ) -> str:
+        """
+        Esegue l'analisi in modalità map-reduce:
+        - map: ogni chunk prodotto da split_text (o da pack_prompts con
+          strategy "pack") viene analizzato con una chiamata
+          indipendente (al massimo max_in_flight chiamate contemporanee);
+        - reduce: i risultati parziali vengono fusi a gruppi di fan_out, livello
+          dopo livello, finché non resta un unico risultato.
+        Se output_path è indicato, l'ultima chiamata (quella che produce il risultato
+        finale) viene eseguita in streaming e scritta progressivamente su file.
+        """
+        fan_out = fan_out or self.map_reduce_fan_out
+        max_in_flight = max_in_flight or self.map_reduce_max_in_flight
+        if fan_out < 2:
+            raise ValueError("[BaseAgent] fan_out deve essere almeno 2.")
+
+        if self.map_reduce_strategy == "pack":
+            chunks = self.pack_prompts(code, system_prompt=system_prompt, prompt_overhead=map_prompt)
+        else:
+            chunks = self.split_text(code)
+        if not chunks:
+            raise ValueError("[BaseAgent] Nessun contenuto da analizzare.")
+        # Chunk identici (file duplicati, header di licenza...) vengono analizzati una volta sola
+        unique_chunks = list(dict.fromkeys(chunks))
+        if len(unique_chunks) < len(chunks):
+            logger.info(f"[BaseAgent] Map-reduce: {len(chunks) - len(unique_chunks)} chunk duplicati ignorati.")
+            chunks = unique_chunks
+
+        total = len(chunks)
+        logger.info(f"[BaseAgent] Map-reduce: {total} chunk, fan_out={fan_out}, max_in_flight={max_in_flight}")
+        # Nessun numero di chunk nel prompt: lo stesso chunk produce lo stesso prompt in ogni
+        # esecuzione (cache delle risposte) e il prefisso resta comune a tutti (cache dei prompt).
+        map_prompts = [f"{map_prompt}\n\n{chunk}" for chunk in chunks]
+        if total == 1 and output_path:
+            return self.stream_to_file(output_path, system_prompt=system_prompt, user_prompt=map_prompts[0])
+        partials = self._run_prompts(system_prompt, map_prompts, max_in_flight)
+
+        while len(partials) > 1:
+            groups = [partials[i:i + fan_out] for i in range(0, len(partials), fan_out)]
+            reduce_prompts = [
+                f"{reduce_prompt}\n\n" + "\n\n".join(
+                    f"### Partial result {i}\n{partial}" for i, partial in enumerate(group, 1)
+                )
+                if len(group) > 1 else None
+                for group in groups
+            ]
+            if len(groups) == 1 and output_path:
+                return self.stream_to_file(output_path, system_prompt=system_prompt, user_prompt=reduce_prompts[0])
+            # I gruppi composti da un solo risultato passano al livello successivo senza chiamate.
+            pending = [prompt for prompt in reduce_prompts if prompt is not None]
+            merged = iter(self._run_prompts(system_prompt, pending, max_in_flight))
+            partials = [
+                next(merged) if prompt is not None else group[0]
+                for prompt, group in zip(reduce_prompts, groups)
+            ]
+        return partials[0]
+
+    def _run_prompts(self, system_prompt: str, user_prompts: list, max_in_flight: int) -> list:
+        """
+        Esegue chat_completion su ciascun user_prompt con al massimo max_in_flight
+        chiamate contemporanee, restituendo i risultati nello stesso ordine.
+        """
+        return self.chat_completion_many(
+            [{"system_prompt": system_prompt, "user_prompt": prompt} for prompt in user_prompts],
+            max_in_flight=max_in_flight,
+            return_exceptions=False
+        )
 
     def count_tokens(self, text_to_count):
         if self.token_manager:
@@ -285,8 +904,10 @@ class BaseAgent(ABC):
             return None
 
     @abstractmethod
-    def run(self, text: str, custom_prompt: str = None) -> str:
+    def run(self, text: str, custom_prompt: str = None, output_path: str = None) -> str:
         """
         Metodo astratto che ogni classe derivata deve implementare.
+        Se output_path è indicato, la risposta va scritta in streaming su file
+        (vedi stream_to_file) oltre che restituita.
         """
         pass
\ No newline at end of file
@@ -0,0 +1,175 @@
+import json
+import atexit
+import hashlib
+import asyncio
+import inspect
+import threading
+import weakref
+
+from utils.common import logger
+
+# Dimensioni e timeout predefiniti dei pool di connessioni HTTP condivisi
+# (sovrascrivibili con il blocco `http_pool` della sezione YAML).
+DEFAULT_POOL_CONFIG = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "timeout": 600.0,
+    "connect_timeout": 10.0,
+}
+
+_CLIENTS = {}
+_BOTO3_CLIENTS = {}
+# I client asincroni sono legati all'event loop in cui vengono usati:
+# loop -> ({chiave: client}, generatore che li chiude alla fine del loop).
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+# Acquisito anche da get_boto3_client chiamato con _LOCK (sempre nell'ordine _LOCK, _BOTO3_LOCK).
+_BOTO3_LOCK = threading.Lock()
+
+
+def _client_key(provider: str, connection_keys: tuple, provider_config: dict, pool_config: dict, *extra) -> str:
+    connection = {key: provider_config.get(key) for key in connection_keys}
+    payload = json.dumps([provider, connection, sorted(pool_config.items()), *extra], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def connection_key(backend_class, provider_config: dict) -> str:
+    """
+    Identità della connessione di un backend (provider, valori di connection_keys e chiave
+    aggiuntiva del client), come impronta che non espone le credenziali.
+    """
+    return _client_key(backend_class.name, backend_class.connection_keys, provider_config, {},
+                       *backend_class.client_key_extra(provider_config))[:16]
+
+
+def _pool_config(pool_config: dict = None) -> dict:
+    return {**DEFAULT_POOL_CONFIG, **(pool_config or {})}
+
+
+def get_client(backend_class, provider_config: dict, pool_config: dict = None):
+    """
+    Restituisce il client sincrono del backend (vedi agents.backends.LLMBackend), condiviso
+    nel processo tra tutti gli agent (e thread) con le stesse credenziali: il pool di
+    connessioni keep-alive viene creato una sola volta.
+    """
+    pool = _pool_config(pool_config)
+    key = _client_key(backend_class.name, backend_class.connection_keys, provider_config, pool,
+                      *backend_class.client_key_extra(provider_config))
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = backend_class.create_client(provider_config, pool)
+            _CLIENTS[key] = client
+            logger.info(f"[ClientRegistry] Nuovo client '{backend_class.name}' creato")
+        return client
+
+
+def get_async_client(backend_class, provider_config: dict, pool_config: dict = None):
+    """
+    Restituisce il client asincrono del backend, condiviso tra gli agent con le
+    stesse credenziali all'interno dello stesso event loop.
+    """
+    pool = _pool_config(pool_config)
+    key = _client_key(backend_class.name, backend_class.connection_keys, provider_config, pool)
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        entry = _ASYNC_CLIENTS.get(loop)
+        if entry is None:
+            # Il generatore tiene in vita il suo loop: le voci dei loop chiusi senza
+            # shutdown_asyncgens vengono rimosse qui.
+            for closed_loop in [other for other in _ASYNC_CLIENTS if other.is_closed()]:
+                del _ASYNC_CLIENTS[closed_loop]
+            clients = {}
+            closer = _close_at_loop_end(clients)
+            entry = _ASYNC_CLIENTS[loop] = (clients, closer)
+            # Avvia il generatore fino allo yield: da qui il loop lo chiude (e con lui i client)
+            # in shutdown_asyncgens, che asyncio.run esegue prima di chiudere il loop.
+            asyncio.ensure_future(closer.__anext__())
+        clients = entry[0]
+        client = clients.get(key)
+        if client is None:
+            client = backend_class.create_async_client(provider_config, pool)
+            clients[key] = client
+        return client
+
+
+async def _close_at_loop_end(clients: dict):
+    """
+    Generatore asincrono che resta sospeso per tutta la vita del loop: quando il loop lo
+    finalizza chiude i client asincroni creati nel loop, rilasciandone i pool di connessioni.
+    """
+    try:
+        yield
+    finally:
+        for client in list(clients.values()):
+            try:
+                closed = client.close()
+                if inspect.isawaitable(closed):
+                    await closed
+            except Exception as exc:
+                logger.error(f"[ClientRegistry] Errore chiusura client asincrono: {exc}")
+        clients.clear()
+        with _LOCK:
+            _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+
+
+def _close(client):
+    close = getattr(client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception as exc:
+            logger.error(f"[ClientRegistry] Errore chiusura client: {exc}")
+
+
+@atexit.register
+def clear_clients():
+    """Chiude e rimuove tutti i client sincroni e boto3 registrati (anche all'uscita del processo)."""
+    with _LOCK:
+        for client in _CLIENTS.values():
+            _close(client)
+        _CLIENTS.clear()
+        with _BOTO3_LOCK:
+            for client in _BOTO3_CLIENTS.values():
+                _close(client)
+            _BOTO3_CLIENTS.clear()
+
+
+def httpx_options(pool: dict) -> dict:
+    """Opzioni (limiti e timeout) dei client httpx dei provider."""
+    import httpx
+    return {
+        "limits": httpx.Limits(
+            max_connections=pool["max_connections"],
+            max_keepalive_connections=pool["max_keepalive_connections"],
+            keepalive_expiry=pool["keepalive_expiry"],
+        ),
+        "timeout": httpx.Timeout(pool["timeout"], connect=pool["connect_timeout"]),
+    }
+
+
+def get_boto3_client(provider_config: dict, pool: dict, service: str = "bedrock-runtime"):
+    """Client boto3 del servizio AWS (bedrock-runtime per le chiamate, bedrock e s3 per i job batch)
+    condiviso tra i modelli con le stesse credenziali."""
+    key = _client_key(service, ("api_key", "api_secret", "region"), provider_config, pool)
+    with _BOTO3_LOCK:
+        client = _BOTO3_CLIENTS.get(key)
+        if client is not None:
+            return client
+        import boto3
+        from botocore.config import Config
+        client = boto3.client(
+            service,
+            aws_access_key_id=provider_config["api_key"],
+            aws_secret_access_key=provider_config["api_secret"],
+            region_name=provider_config["region"],
+            config=Config(
+                max_pool_connections=pool["max_connections"],
+                connect_timeout=pool["connect_timeout"],
+                read_timeout=pool["timeout"],
+                tcp_keepalive=True
+            )
+        )
+        _BOTO3_CLIENTS[key] = client
+    return client
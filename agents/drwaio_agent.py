@@ -1,15 +1,26 @@
 from agents.base_agent import BaseAgent  # Adjust the import as needed
-from agents.drwaio_prompt import user_prompt, system_prompt
+from agents.drwaio_prompt import user_prompt, system_prompt, reduce_prompt
 
 
 class DrawioCodeAgent(BaseAgent):
-    def run(self, code: str, custom_prompt: str = None) -> str:
+    def run(self, code: str, custom_prompt: str = None, output_path: str = None) -> str:
+
+        if self.map_reduce_enabled:
+            # Each chunk produces a partial diagram, then the partial diagrams are merged.
+            return self.map_reduce(code,
+                                   system_prompt=system_prompt,
+                                   map_prompt=(custom_prompt or user_prompt) + "Here is a portion of the code to analyze:",
+                                   reduce_prompt=reduce_prompt,
+                                   output_path=output_path)
 
         if custom_prompt:
             prompt = custom_prompt + "Here is the code to analyze:\n" + "\n".join(code)
         else:
             prompt = user_prompt + "Here is the code to analyze:\n" + "\n".join(code)
 
+        if output_path:
+            # Stream the diagram to the output file as it is generated.
+            return self.stream_to_file(output_path, system_prompt=system_prompt, user_prompt=prompt)
+
         # A slightly elevated temperature (e.g., 0.2) may allow for more creative analysis.
         return self.chat_completion(system_prompt=system_prompt, user_prompt=prompt)
-
@@ -40,4 +40,13 @@ system_prompt = (
     "Output:\n"
     "------\n"
     "Produce the final XML as a single self-contained response.\n"
-)
\ No newline at end of file
+)
+
+# Define the prompt used to merge the partial diagrams produced in map-reduce mode
+reduce_prompt = (
+    "The following are partial Draw.io XML diagrams, each produced from a different portion of the same Python code.\n"
+    "Merge them into a single valid Draw.io XML diagram that follows all the previous guidelines:\n"
+    "- Keep each AWS service and component only once, merging duplicates.\n"
+    "- Preserve every data flow and connection found in the partial diagrams.\n"
+    "- Ensure the output is valid XML that can be imported directly into Draw.io.\n"
+)
@@ -0,0 +1,133 @@
+import time
+import random
+import asyncio
+import threading
+
+# Impostazioni predefinite del provider simulato (sovrascrivibili nel blocco `mock` della sezione YAML).
+DEFAULT_MOCK_CONFIG = {
+    "model_name": "gpt-4o-mini",  # modello usato per conteggio token e costi
+    "latency": 0.05,              # secondi prima del primo token
+    "latency_jitter": 0.0,        # variazione casuale (+/-) della latenza, in secondi
+    "tokens_per_second": 0,       # velocità di generazione della risposta (0 = istantanea)
+    "completion_tokens": 64,      # parole della risposta simulata
+    "error_rate": 0.0,            # probabilità di un errore transitorio (HTTP 500)
+    "throttle_rate": 0.0,         # probabilità di un rifiuto per rate limit (HTTP 429)
+    "retry_after": None,          # Retry-After (secondi) inviato con i 429
+    "batch_latency": 0.5,         # secondi di attesa di un job batch (complete_batch)
+    "seed": None,                 # seme per rendere ripetibili latenze ed errori
+}
+
+# Parole usate per comporre le risposte simulate.
+_VOCABULARY = (
+    "the", "function", "class", "refactor", "memory", "loop", "cache", "import", "performance",
+    "variable", "should", "use", "avoid", "list", "dictionary", "generator", "complexity", "call",
+)
+
+
+class MockResponse:
+    """
+    Risposta HTTP minimale allegata agli errori simulati, letta dallo scheduler
+    delle richieste (status_code e intestazione Retry-After).
+    """
+    __slots__ = ("status_code", "headers")
+
+    def __init__(self, status_code: int, headers: dict):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class MockProviderError(Exception):
+    """
+    Errore simulato del provider: 429 (throttling) o 500 (errore transitorio), entrambi
+    riconosciuti come ripetibili dallo scheduler.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = MockResponse(status_code, headers)
+
+
+class MockLLMClient:
+    """
+    Client LLM simulato, senza rete: ogni chiamata attende la latenza configurata più il
+    tempo di generazione (completion_tokens / tokens_per_second) e restituisce un testo di
+    completion_tokens parole; con probabilità error_rate e throttle_rate fallisce invece
+    con un errore 500 o 429. Serve ai benchmark e alle prove offline degli agent.
+    """
+
+    def __init__(self, config: dict = None):
+        settings = {**DEFAULT_MOCK_CONFIG, **(config or {})}
+        self.model_name = settings["model_name"]
+        self.latency = float(settings["latency"])
+        self.latency_jitter = float(settings["latency_jitter"])
+        self.tokens_per_second = float(settings["tokens_per_second"] or 0)
+        self.completion_tokens = int(settings["completion_tokens"])
+        self.error_rate = float(settings["error_rate"])
+        self.throttle_rate = float(settings["throttle_rate"])
+        self.retry_after = settings["retry_after"]
+        self.batch_latency = float(settings["batch_latency"])
+        self._random = random.Random(settings["seed"])
+        self._lock = threading.Lock()
+        # Chiamate ricevute, compresi i tentativi falliti, e job batch eseguiti.
+        self.calls = 0
+        self.batches = 0
+
+    def _plan(self, user_prompt: str) -> tuple:
+        """
+        Decide l'esito della chiamata: solleva l'errore simulato oppure restituisce
+        (latenza, parole della risposta).
+        """
+        with self._lock:
+            self.calls += 1
+            outcome = self._random.random()
+            jitter = self._random.uniform(-self.latency_jitter, self.latency_jitter) if self.latency_jitter else 0.0
+            words = [self._random.choice(_VOCABULARY) for _ in range(self.completion_tokens)]
+        if outcome < self.throttle_rate:
+            raise MockProviderError("[MockLLMClient] Rate limit simulato", 429, self.retry_after)
+        if outcome < self.throttle_rate + self.error_rate:
+            raise MockProviderError("[MockLLMClient] Errore transitorio simulato", 500)
+        return max(0.0, self.latency + jitter), words
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def complete(self, system_prompt: str, user_prompt: str, model_name: str = None) -> str:
+        latency, words = self._plan(user_prompt)
+        time.sleep(latency + self._token_delay() * len(words))
+        return " ".join(words)
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, model_name: str = None) -> str:
+        latency, words = self._plan(user_prompt)
+        await asyncio.sleep(latency + self._token_delay() * len(words))
+        return " ".join(words)
+
+    def stream(self, system_prompt: str, user_prompt: str, model_name: str = None):
+        """
+        Produce la risposta una parola alla volta, al ritmo di tokens_per_second.
+        """
+        latency, words = self._plan(user_prompt)
+        time.sleep(latency)
+        token_delay = self._token_delay()
+        for index, word in enumerate(words):
+            if token_delay:
+                time.sleep(token_delay)
+            yield word if index == 0 else " " + word
+
+    def complete_batch(self, requests: list) -> list:
+        """
+        Simula un job batch: attende batch_latency una sola volta per l'intero lotto e
+        restituisce, per ogni richiesta, il testo o l'errore simulato.
+        """
+        with self._lock:
+            self.batches += 1
+        results = []
+        for request in requests:
+            try:
+                _, words = self._plan(request["user_prompt"])
+                results.append(" ".join(words))
+            except MockProviderError as exc:
+                results.append(exc)
+        time.sleep(self.batch_latency)
+        return results
@@ -2,7 +2,7 @@ from agents.base_agent import BaseAgent  # Adjust the import as needed
 from utils.common import logger
 
 class PythonCodeAgent(BaseAgent):
-    def run(self, code: str, custom_prompt: str = None) -> str:
+    def run(self, code: str, custom_prompt: str = None, output_path: str = None) -> str:
         # Define a system prompt tailored for analyzing Python code.
         system_prompt = (
             "You are a Python code optimization expert. Your task is to review the Python code provided, "
@@ -12,10 +12,28 @@ class PythonCodeAgent(BaseAgent):
             #"Ensure that all code, comments, prompts, and method names are written in English."
         )
 
+        if self.map_reduce_enabled:
+            # Each chunk is reviewed on its own, then the partial reviews are merged.
+            logger.info("PythonCodeAgent is running in map-reduce mode... please wait!")
+            reduce_prompt = (
+                "The following are partial reviews of different portions of the same Python project. "
+                "Merge them into a single, coherent review without duplicated findings, "
+                f"answering the original request: {custom_prompt}"
+            )
+            return self.map_reduce(code,
+                                   system_prompt=system_prompt,
+                                   map_prompt=f"{custom_prompt} within this portion of the code:",
+                                   reduce_prompt=reduce_prompt,
+                                   output_path=output_path)
 
         user_prompt = f"{custom_prompt} within this code:\n\n" + "\n".join(code)
 
         # A slightly elevated temperature (e.g., 0.2) may allow for more creative analysis.
         logger.info("PythonCodeAgent is running... please wait!")
+        if output_path:
+            # Stream the answer to the output file as it is generated.
+            return self.stream_to_file(output_path,
+                                       system_prompt=system_prompt,
+                                       user_prompt=user_prompt)
         return self.chat_completion(system_prompt=system_prompt,
                                     user_prompt=user_prompt)
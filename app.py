@@ -1,14 +1,47 @@
-from utils.common import load_config, write_text_to_file
+import os
+import atexit
+
+from datetime import datetime
+
+from batch_runner import BatchRunner
+from utils.common import load_config, write_text_to_file, append_text_to_file
 from utils.repo_content_aggregator import RepositoryContentAggregator
+from utils.file_classifier import DEFAULT_MAX_FILE_SIZE
+from utils.deduplicator import ContentDeduplicator
+from utils.tracing import get_tracer
+from utils.token_manager.token_manager import TokenManager
 from agents.pythoncode_agent import PythonCodeAgent
 from agents.drwaio_agent import DrawioCodeAgent
 
 
-def select_agent(agent_name, config_section, agent_config_path):
+def select_agent(agent_name, config_section, agent_config_path, token_manager=None):
     """Selects and returns the agent based on the agent_name parameter."""
     if agent_name.lower() == "drawiocode":
-        return DrawioCodeAgent(config_section=config_section, config_path=agent_config_path)
-    return PythonCodeAgent(config_section=config_section, config_path=agent_config_path)
+        return DrawioCodeAgent(config_section=config_section, config_path=agent_config_path,
+                               external_token_manager=token_manager)
+    return PythonCodeAgent(config_section=config_section, config_path=agent_config_path,
+                           external_token_manager=token_manager)
+
+
+def incremental_output_path(output_path):
+    """Returns the path of an incremental analysis: output_path with the run's timestamp
+    (output.txt -> output.incremental-20250101-120000.txt)."""
+    root, extension = os.path.splitext(output_path)
+    return f"{root}.incremental-{datetime.now().strftime('%Y%m%d-%H%M%S')}{extension}"
+
+
+def format_changes(changes):
+    """Lists the files added, modified and deleted since the previous incremental run."""
+    lines = ["## Changes analyzed"]
+    for change in ("added", "modified", "deleted"):
+        lines.append(f"{change.capitalize()} ({len(changes[change])}): " + (", ".join(changes[change]) or "-"))
+    return "\n".join(lines) + "\n"
+
+
+def save_token_report(token_manager, report_path):
+    """Writes the token and cost report, then closes the full-text log."""
+    token_manager.save_report_to_file(report_path)
+    token_manager.close()
 
 
 def main():
@@ -25,20 +58,74 @@ def main():
     config_section = config.get("config_section", "test_agent")
     agent_config_path = config.get("agent_config_path", "/Users/sab/PycharmProjects/pycopilot/config.yaml")
 
-    # Aggregate the content of the repository
-    aggregator = RepositoryContentAggregator(repo_path, excluded_dirs, excluded_files)
-    aggregated_content = aggregator.aggregate()
+    # Export the latencies and throughput of the traced spans when the process exits, also after a failure
+    tracing = config.get("tracing")
+    if tracing:
+        tracing = tracing if isinstance(tracing, dict) else {}
+        atexit.register(get_tracer().export, tracing.get("output_path", "tracing.json"), tracing.get("format"))
+
+    # Token and cost accounting shared by every agent, reported when the process exits
+    token_manager = None
+    token_report = config.get("token_report")
+    if token_report:
+        token_report = token_report if isinstance(token_report, dict) else {}
+        token_manager = TokenManager.from_config(token_report)
+        atexit.register(save_token_report, token_manager, token_report.get("report_path", "token_report.md"))
+
+    # Batch mode: analyze every repository listed in the "batch" block within this process
+    if "batch" in config:
+        runner = BatchRunner.from_config(
+            config, lambda name: select_agent(name, config_section, agent_config_path, token_manager))
+        summary = runner.run()
+        print(f"completed! {len(summary['completed'])} completed, {len(summary['failed'])} failed, "
+              f"{len(summary['skipped'])} skipped")
+        return
+
+    stream = config.get("stream", False)
+    incremental = config.get("incremental", False)
+    manifest_path = config.get("manifest_path", ".pycopilot_manifest.json")
+    max_file_size = config.get("max_file_size", DEFAULT_MAX_FILE_SIZE)
+    deduplicator = ContentDeduplicator.from_config(config["deduplicate"]) if config.get("deduplicate") else None
+
+    # Aggregate the content of the repository (only the changed files in incremental mode)
+    aggregator = RepositoryContentAggregator(repo_path, excluded_dirs, excluded_files,
+                                             manifest_path=manifest_path if incremental else None,
+                                             max_file_size=max_file_size,
+                                             deduplicator=deduplicator)
+    aggregated_content = aggregator.aggregate(incremental=incremental)
+    if incremental and not aggregated_content:
+        aggregator.save_manifest()
+        print(f"no changes since the previous run (deleted: {len(aggregator.changes['deleted'])})")
+        return
+
+    # An incremental run only analyzes the changed files: once a previous analysis exists, the
+    # result goes to its own file and the previous one is kept
+    if incremental and os.path.exists(output_path):
+        output_path = incremental_output_path(output_path)
 
     # Select and configure the agent based on the configuration
-    agent = select_agent(agent_name, config_section, agent_config_path)
+    agent = select_agent(agent_name, config_section, agent_config_path, token_manager)
 
     # Run the agent on the aggregated content with the custom prompt
-    results = agent.run(code=aggregated_content, custom_prompt=agent_prompt)
+    if stream:
+        # The agent writes the result to the output file while it is generated
+        agent.run(code=aggregated_content, custom_prompt=agent_prompt, output_path=output_path)
+    else:
+        results = agent.run(code=aggregated_content, custom_prompt=agent_prompt)
+
+        # Write the result to the output file
+        write_text_to_file(output_path, results)
+
+    # The analysis of each unique file applies to its duplicates: list them after the result
+    if deduplicator is not None and deduplicator.groups:
+        append_text_to_file(output_path, "\n\n" + deduplicator.format_groups())
 
-    # Write the result to the output file
-    write_text_to_file(output_path, results)
+    # The manifest is saved only after a successful analysis of the changed files
+    if incremental:
+        append_text_to_file(output_path, "\n\n" + format_changes(aggregator.changes))
+        aggregator.save_manifest()
 
-    print("completed!")
+    print(f"completed! ({output_path})" if incremental else "completed!")
 
 
 if __name__ == '__main__':
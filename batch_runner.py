@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.common import load_config, write_json_file, write_text_to_file, logger
+from utils.deduplicator import ContentDeduplicator
+from utils.file_classifier import DEFAULT_MAX_FILE_SIZE
+from utils.repo_content_aggregator import RepositoryContentAggregator
+from utils.token_manager.token_manager import usage_labels
+
+DEFAULT_CHECKPOINT_PATH = ".pycopilot_batch_checkpoint.json"
+DEFAULT_BATCH_WORKERS = 4
+
+
+class BatchRunner:
+    """Runs aggregation and agent analysis over many repositories in a single process.
+
+    Jobs share one worker pool and one agent (with its LLM clients) per agent name. Each
+    completed job is recorded in a checkpoint file, so an interrupted batch resumes from
+    the jobs that are still pending."""
+
+    def __init__(self, jobs, agent_factory, checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+                 max_workers=DEFAULT_BATCH_WORKERS, deduplicator=None):
+        self.jobs = jobs
+        self.agent_factory = agent_factory
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        # Shared by every job: a file already seen in another repository is sent as a reference
+        self.deduplicator = deduplicator
+        self._agents = {}
+        self._agents_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, agent_factory):
+        """Builds the runner from the `batch` block of config.json. Jobs are listed inline in
+        `jobs` or in the JSON file referenced by `manifest`; missing job settings default to the
+        top-level ones (excluded_dirs, excluded_files, agent_name, agent_prompt)."""
+        batch_config = config["batch"]
+        jobs = list(batch_config.get("jobs", []))
+        if batch_config.get("manifest"):
+            jobs.extend(load_config(batch_config["manifest"]))
+        if not jobs:
+            raise ValueError("Batch mode requires at least one job in 'jobs' or 'manifest'")
+
+        output_dir = batch_config.get("output_dir", "outputs")
+        defaults = {
+            "excluded_dirs": config.get("excluded_dirs", []),
+            "excluded_files": config.get("excluded_files", []),
+            "agent_name": config.get("agent_name", "PythonCode"),
+            "agent_prompt": config.get("agent_prompt", ""),
+            "max_file_size": config.get("max_file_size", DEFAULT_MAX_FILE_SIZE),
+        }
+        normalized = []
+        output_owners = {}
+        for job in jobs:
+            if isinstance(job, str):
+                job = {"repo_path": job}
+            job = {**defaults, **job}
+            if "output_path" not in job:
+                # Repositories with the same name in different directories (org1/api, org2/api)
+                # get different files: the name carries a digest of the absolute path.
+                repo_path = os.path.abspath(job["repo_path"])
+                path_digest = hashlib.sha256(repo_path.encode("utf-8")).hexdigest()[:8]
+                job["output_path"] = os.path.join(
+                    output_dir, f"{os.path.basename(repo_path)}-{path_digest}-{job['agent_name']}.txt")
+            output_path = os.path.abspath(job["output_path"])
+            if output_path in output_owners:
+                raise ValueError(f"Batch jobs for '{output_owners[output_path]}' and '{job['repo_path']}' "
+                                 f"both write to '{job['output_path']}'")
+            output_owners[output_path] = job["repo_path"]
+            normalized.append(job)
+
+        return cls(
+            normalized,
+            agent_factory,
+            checkpoint_path=batch_config.get("checkpoint_path", DEFAULT_CHECKPOINT_PATH),
+            max_workers=batch_config.get("max_workers", DEFAULT_BATCH_WORKERS),
+            deduplicator=ContentDeduplicator.from_config(config["deduplicate"]) if config.get("deduplicate") else None,
+        )
+
+    @staticmethod
+    def job_id(job):
+        """Identifies a job by repository, agent, prompt and output path."""
+        payload = json.dumps([os.path.abspath(job["repo_path"]), job["agent_name"], job["agent_prompt"],
+                              job["output_path"]])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def load_checkpoint(self):
+        """Returns the ids of the jobs completed by previous runs."""
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return set(json.load(f).get("completed", []))
+
+    def _mark_completed(self, completed, job_id):
+        with self._checkpoint_lock:
+            completed.add(job_id)
+            # Written to a temporary file and renamed, so an interruption never corrupts it
+            tmp_path = self.checkpoint_path + ".tmp"
+            write_json_file(tmp_path, {"completed": sorted(completed)})
+            os.replace(tmp_path, self.checkpoint_path)
+
+    def _get_agent(self, agent_name):
+        with self._agents_lock:
+            agent = self._agents.get(agent_name)
+            if agent is None:
+                agent = self.agent_factory(agent_name)
+                self._agents[agent_name] = agent
+            return agent
+
+    def _run_job(self, job):
+        namespace = os.path.abspath(job["repo_path"])
+        aggregator = RepositoryContentAggregator(job["repo_path"], job["excluded_dirs"], job["excluded_files"],
+                                                 max_file_size=job["max_file_size"],
+                                                 deduplicator=self.deduplicator, namespace=namespace)
+        aggregated_content = aggregator.aggregate()
+        agent = self._get_agent(job["agent_name"])
+        # Token and costs of the job are broken down by repository in the shared TokenManager
+        with usage_labels(repo=job["repo_path"]):
+            results = agent.run(code=aggregated_content, custom_prompt=job["agent_prompt"])
+        if self.deduplicator is not None:
+            # Groups known when the job ends: files of later jobs are listed in their own reports
+            duplicates = self.deduplicator.format_groups(namespace)
+            if duplicates:
+                results += "\n\n" + duplicates
+        write_text_to_file(job["output_path"], results)
+
+    def run(self):
+        """Runs every pending job and returns the lists of completed, failed and skipped repositories.
+        A failed job is not checkpointed, so it runs again on the next invocation."""
+        completed = self.load_checkpoint()
+        summary = {"completed": [], "failed": [], "skipped": []}
+        pending = []
+        for job in self.jobs:
+            if self.job_id(job) in completed:
+                summary["skipped"].append(job["repo_path"])
+            else:
+                pending.append(job)
+        logger.info(f"Batch: {len(pending)} jobs to run, {len(summary['skipped'])} already completed")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._run_job, job): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Batch job failed for '{job['repo_path']}' ({job['agent_name']}): {e}")
+                    summary["failed"].append(job["repo_path"])
+                    continue
+                self._mark_completed(completed, self.job_id(job))
+                summary["completed"].append(job["repo_path"])
+                logger.info(f"Batch job completed: {job['repo_path']} -> {job['output_path']}")
+        return summary
@@ -0,0 +1,105 @@
+"""
+Peak-RSS and throughput benchmark of the repository readers.
+
+Compares the list-based reader (`gather_files_content` + `write_combined_content_to_file`)
+with the memory-mapped zero-copy reader (`aggregate_to_file`). Each reader runs in a fresh
+interpreter, so the peak RSS (ru_maxrss) of one does not hide the other. Without --repo a
+synthetic repository is generated in a temporary directory.
+
+Usage:
+  python benchmarks/aggregator_memory.py [--repo PATH] [--files 2000] [--file-kb 64] [--runs 3]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READERS = ("gather", "mmap")
+
+
+def generate_repo(path, files, file_kb):
+    """Writes files Python-like files of about file_kb KiB each, with some blank lines,
+    spread over nested directories."""
+    rng = random.Random(0)
+    line = "    value = compute(alpha, beta, gamma)  # some comment to make the line longer\n"
+    for index in range(files):
+        directory = os.path.join(path, f"pkg{index % 20}", f"mod{index % 7}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{index}.py"), "w", encoding="utf-8") as f:
+            written = 0
+            while written < file_kb * 1024:
+                chunk = line if rng.random() > 0.2 else "\n"
+                f.write(chunk)
+                written += len(chunk)
+
+
+def run_reader(reader, repo_path):
+    """Runs one reader in this process and returns its metrics."""
+    sys.path.insert(0, REPO_ROOT)
+    from utils.repo_content_aggregator import RepositoryContentAggregator
+
+    aggregator = RepositoryContentAggregator(repo_path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "aggregated.txt")
+        start = time.perf_counter()
+        if reader == "gather":
+            aggregator.write_combined_content_to_file(output_path, aggregator.gather_files_content())
+        else:
+            aggregator.aggregate_to_file(output_path)
+        elapsed = time.perf_counter() - start
+        output_bytes = os.path.getsize(output_path)
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    return {"seconds": elapsed, "output_mb": output_bytes / (1024 * 1024), "peak_rss_mb": peak_rss_mb}
+
+
+def measure(reader, repo_path):
+    """Runs reader in a fresh interpreter and returns its metrics."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", reader, "--repo", repo_path],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", default=None, help="repository to read (default: a generated one)")
+    parser.add_argument("--files", type=int, default=2000, help="files in the generated repository")
+    parser.add_argument("--file-kb", type=int, default=64, help="size of each generated file in KiB")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per reader")
+    parser.add_argument("--child", choices=READERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_reader(args.child, args.repo)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo_path = args.repo
+        if repo_path is None:
+            repo_path = os.path.join(tmp_dir, "repo")
+            generate_repo(repo_path, args.files, args.file_kb)
+
+        for reader in READERS:
+            runs = [measure(reader, repo_path) for _ in range(args.runs)]
+            seconds = statistics.median(run["seconds"] for run in runs)
+            output_mb = runs[-1]["output_mb"]
+            peak_rss_mb = statistics.median(run["peak_rss_mb"] for run in runs)
+            print(f"{reader:>6}: {output_mb:8.1f} MB in {seconds:6.2f} s ({output_mb / seconds:7.1f} MB/s), "
+                  f"peak RSS {peak_rss_mb:7.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
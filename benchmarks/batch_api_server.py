@@ -0,0 +1,165 @@
+"""
+Local stand-in for the Azure OpenAI files and batches endpoints, to run batch mode offline.
+
+Implements the requests issued by OpenAIBackend.complete_batch: upload of the JSONL input
+file, creation, retrieval and cancellation of the batch job, and download of the output and
+error files. A job completes after --polls retrievals; each request is answered with
+"answer <custom_id> <model>", requests whose last message contains --fail-marker end up in
+the error file, and the output lines are written in reverse order (as the real API, which
+does not keep the input order). Point the `base_url` of an `openai` block at it.
+
+Usage:
+  python benchmarks/batch_api_server.py [--port 8767] [--polls 3] [--fail-marker FAIL]
+"""
+import re
+import json
+import argparse
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_MULTIPART_FILE_RE = re.compile(rb'filename="[^"]*"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.S)
+
+
+class BatchAPIServer(ThreadingHTTPServer):
+    """HTTP server keeping the uploaded files and the batch jobs in memory. polls is the
+    number of retrievals after which a job completes (None: never), cancelled the ids of
+    the cancelled jobs."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, polls=3, fail_marker="FAIL"):
+        super().__init__(("127.0.0.1", port), _BatchAPIHandler)
+        self.polls = polls
+        self.fail_marker = fail_marker
+        self.files = {}
+        self.batches = {}
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """Serves requests on a daemon thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def add_file(self, content):
+        with self._lock:
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = content
+        return file_id
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        outputs, errors = [], []
+        for line in self.files[input_file_id].splitlines():
+            request = json.loads(line)
+            if self.fail_marker in request["body"]["messages"][-1]["content"]:
+                errors.append({"id": f"response-{request['custom_id']}", "custom_id": request["custom_id"],
+                               "error": None, "response": {"status_code": 400, "body": {
+                                   "error": {"code": "invalid_request", "message": "rejected by the stand-in"}}}})
+            else:
+                answer = f"answer {request['custom_id']} {request['body']['model']}"
+                outputs.append({"id": f"response-{request['custom_id']}", "custom_id": request["custom_id"],
+                                "error": None, "response": {"status_code": 200, "body": {
+                                    "choices": [{"index": 0, "finish_reason": "stop",
+                                                 "message": {"role": "assistant", "content": answer}}],
+                                    "usage": {"prompt_tokens": 10, "completion_tokens": 3,
+                                              "prompt_tokens_details": {"cached_tokens": 4}}}}})
+        with self._lock:
+            batch_id = f"batch-{len(self.batches)}"
+            self.files[f"{batch_id}-output"] = "\n".join(json.dumps(record) for record in reversed(outputs))
+            if errors:
+                self.files[f"{batch_id}-errors"] = "\n".join(json.dumps(record) for record in errors)
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": endpoint, "input_file_id": input_file_id,
+                "completion_window": completion_window, "status": "validating", "created_at": 0,
+                "output_file_id": f"{batch_id}-output", "error_file_id": f"{batch_id}-errors" if errors else None,
+                "request_counts": {"total": len(outputs) + len(errors), "completed": len(outputs),
+                                   "failed": len(errors)}, "retrievals": 0}
+        return self.batch(batch_id)
+
+    def retrieve_batch(self, batch_id):
+        with self._lock:
+            batch = self.batches[batch_id]
+            batch["retrievals"] += 1
+            if batch["status"] not in ("cancelled", "completed"):
+                done = self.polls is not None and batch["retrievals"] >= self.polls
+                batch["status"] = "completed" if done else "in_progress"
+        return self.batch(batch_id)
+
+    def cancel_batch(self, batch_id):
+        with self._lock:
+            self.batches[batch_id]["status"] = "cancelled"
+            self.cancelled.append(batch_id)
+        return self.batch(batch_id)
+
+    def batch(self, batch_id):
+        return {key: value for key, value in self.batches[batch_id].items() if key != "retrievals"}
+
+
+class _BatchAPIHandler(BaseHTTPRequestHandler):
+    # Paths under the Azure prefix (/openai/...), query string (api-version) removed.
+    def _path(self):
+        return self.path.split("?", 1)[0].split("/openai", 1)[-1].strip("/").split("/")
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._send(404, {"error": {"code": "not_found", "message": f"{self.command} {self.path}"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self._path()
+        if path == ["files"]:
+            match = _MULTIPART_FILE_RE.search(body)
+            if match is None:
+                return self._send(400, {"error": {"code": "invalid_file", "message": "no file in the upload"}})
+            content = match.group(1)
+            file_id = self.server.add_file(content.decode("utf-8"))
+            return self._send(200, {"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                                    "filename": "input.jsonl", "purpose": "batch", "status": "processed"})
+        if path == ["batches"]:
+            request = json.loads(body)
+            return self._send(200, self.server.create_batch(request["input_file_id"], request["endpoint"],
+                                                            request["completion_window"]))
+        if len(path) == 3 and path[0] == "batches" and path[2] == "cancel" and path[1] in self.server.batches:
+            return self._send(200, self.server.cancel_batch(path[1]))
+        self._not_found()
+
+    def do_GET(self):
+        path = self._path()
+        if len(path) == 2 and path[0] == "batches" and path[1] in self.server.batches:
+            return self._send(200, self.server.retrieve_batch(path[1]))
+        if len(path) == 3 and path[0] == "files" and path[2] == "content" and path[1] in self.server.files:
+            return self._send(200, self.server.files[path[1]].encode("utf-8"), "application/octet-stream")
+        self._not_found()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--polls", type=int, default=3, help="retrievals before a job completes")
+    parser.add_argument("--fail-marker", default="FAIL", help="prompts containing it fail")
+    args = parser.parse_args()
+    server = BatchAPIServer(args.port, args.polls, args.fail_marker)
+    print(f"Batch API stand-in listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
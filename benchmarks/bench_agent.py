@@ -0,0 +1,55 @@
+"""End-to-end agent runs against the mock provider (no network access)."""
+import asyncio
+
+from agents.pythoncode_agent import PythonCodeAgent
+from utils.repo_content_aggregator import RepositoryContentAggregator
+
+PROMPT = "Review the performance of this project"
+
+
+def test_single_call(benchmark, mock_config, synthetic_repos):
+    content = RepositoryContentAggregator(synthetic_repos(100)).aggregate()
+    agent = PythonCodeAgent("bench", mock_config(latency=0.01))
+    assert benchmark(agent.run, code=content, custom_prompt=PROMPT)
+
+
+def test_map_reduce(benchmark, mock_config, synthetic_repo):
+    content = RepositoryContentAggregator(synthetic_repo).aggregate()
+    agent = PythonCodeAgent("bench", mock_config(latency=0.005, map_reduce=True))
+    assert benchmark.pedantic(agent.run, kwargs={"code": content, "custom_prompt": PROMPT}, rounds=1)
+
+
+def test_map_reduce_batch(benchmark, mock_config, synthetic_repo):
+    # Each map-reduce level is sent as one batch job instead of one call per chunk
+    content = RepositoryContentAggregator(synthetic_repo).aggregate()
+    agent = PythonCodeAgent("bench", mock_config(map_reduce=True, batch=True))
+    assert benchmark.pedantic(agent.run, kwargs={"code": content, "custom_prompt": PROMPT}, rounds=1)
+
+
+def test_map_reduce_with_throttling(benchmark, mock_config, synthetic_repos):
+    content = RepositoryContentAggregator(synthetic_repos(100)).aggregate()
+    agent = PythonCodeAgent("bench", mock_config(latency=0.005, error_rate=0.05, throttle_rate=0.1,
+                                                 map_reduce=True))
+    assert benchmark.pedantic(agent.run, kwargs={"code": content, "custom_prompt": PROMPT}, rounds=1)
+
+
+def test_chat_completion_many_with_accounting(benchmark, mock_config, token_manager_factory):
+    agent = PythonCodeAgent("bench", mock_config(latency=0.01), token_manager_factory())
+    requests = [{"system_prompt": "You are a reviewer.", "user_prompt": f"Review snippet {index}",
+                 "use_cache": False} for index in range(64)]
+    results = benchmark(agent.chat_completion_many, requests, return_exceptions=False)
+    assert len(results) == len(requests)
+
+
+def test_achat_completion_many(benchmark, mock_config):
+    agent = PythonCodeAgent("bench", mock_config(latency=0.01, tokens_per_second=2000))
+    requests = [{"system_prompt": "You are a reviewer.", "user_prompt": f"Review snippet {index}",
+                 "use_cache": False} for index in range(64)]
+    results = benchmark(lambda: asyncio.run(agent.achat_completion_many(requests, return_exceptions=False)))
+    assert len(results) == len(requests)
+
+
+def test_stream(benchmark, mock_config):
+    agent = PythonCodeAgent("bench", mock_config(latency=0.01, tokens_per_second=5000))
+    text = benchmark(lambda: "".join(agent.chat_completion_stream(user_prompt=PROMPT, use_cache=False)))
+    assert text
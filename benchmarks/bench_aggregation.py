@@ -0,0 +1,36 @@
+"""Repository aggregation over synthetic repositories (see --bench-repo-sizes)."""
+import os
+
+from utils.repo_content_aggregator import RepositoryContentAggregator
+from utils.deduplicator import ContentDeduplicator
+
+
+def test_gather_files_content(benchmark, synthetic_repo, repo_size):
+    content = benchmark(RepositoryContentAggregator(synthetic_repo).aggregate)
+    assert len(content) == repo_size
+
+
+def test_aggregate_to_file(benchmark, synthetic_repo, repo_size, tmp_path):
+    output_path = str(tmp_path / "aggregated.txt")
+    files_written = benchmark(RepositoryContentAggregator(synthetic_repo).aggregate_to_file, output_path)
+    assert files_written == repo_size
+
+
+def test_incremental_unchanged(benchmark, synthetic_repo, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    first = RepositoryContentAggregator(synthetic_repo, manifest_path=manifest_path)
+    first.aggregate(incremental=True)
+    first.save_manifest()
+
+    def rerun():
+        return RepositoryContentAggregator(synthetic_repo, manifest_path=manifest_path).aggregate(incremental=True)
+
+    assert benchmark(rerun) == []
+
+
+def test_deduplicate(benchmark, synthetic_repo, repo_size):
+    content = RepositoryContentAggregator(synthetic_repo).aggregate()
+    # Every file appears twice, as in a repository with a vendored copy of itself
+    duplicated = content + [record.replace("/* ", f"/* vendor{os.sep}", 1) for record in content]
+    result = benchmark(lambda: ContentDeduplicator().dedupe(duplicated))
+    assert len(result) == 2 * repo_size
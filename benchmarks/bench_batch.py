@@ -0,0 +1,81 @@
+"""Batch mode through the real OpenAI client, against the local files/batches stand-in."""
+import json
+
+import pytest
+
+from batch_api_server import BatchAPIServer
+
+pytest.importorskip("openai")
+
+from agents.backends.openai_backend import OpenAIBackend  # noqa: E402
+from agents.pythoncode_agent import PythonCodeAgent  # noqa: E402
+
+BATCH_CONFIG_TEMPLATE = """\
+bench:
+  openai:
+    model_name: "gpt-4o-mini"
+    api_key: "stand-in"
+    api_version: "2024-10-21"
+    base_url: "{base_url}"
+  batch:
+    enabled: true
+    deployment: "gpt-4o-mini-batch"
+    max_wait: 0.05
+    poll_interval: 0.01
+    timeout: 5
+"""
+
+
+@pytest.fixture
+def batch_server():
+    server = BatchAPIServer(polls=3).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def openai_backend(server, **batch_config):
+    provider_config = {"model_name": "gpt-4o-mini", "api_key": "stand-in", "api_version": "2024-10-21",
+                       "base_url": server.base_url}
+    return OpenAIBackend(provider_config, {"batch": dict({"poll_interval": 0.01, "timeout": 5}, **batch_config)})
+
+
+def batch_request(user_prompt):
+    return {"system_prompt": "You are a reviewer.", "user_prompt": user_prompt, "model_name": "gpt-4o-mini",
+            "temperature": 0.0}
+
+
+def test_agent_batch_job(benchmark, tmp_path, batch_server):
+    config_path = tmp_path / "batch-config.yaml"
+    config_path.write_text(BATCH_CONFIG_TEMPLATE.format(base_url=batch_server.base_url), encoding="utf-8")
+    agent = PythonCodeAgent("bench", str(config_path))
+    requests = [{"user_prompt": f"Review snippet {index}", "use_cache": False} for index in range(32)]
+    requests[7]["user_prompt"] = "FAIL snippet 7"
+
+    results = benchmark.pedantic(agent.chat_completion_many, args=(requests,), rounds=1)
+
+    # One job per call, results in request order although the output file is reversed
+    assert len(batch_server.batches) == 1
+    assert isinstance(results[7], RuntimeError)
+    assert [result for index, result in enumerate(results) if index != 7] == [
+        f"answer {index} gpt-4o-mini-batch" for index in range(32) if index != 7]
+
+
+def test_batch_results_by_custom_id(batch_server):
+    backend = openai_backend(batch_server)
+    results = backend.complete_batch([batch_request("first"), batch_request("FAIL second"), batch_request("third")])
+
+    assert [result.text for result in (results[0], results[2])] == ["answer 0 gpt-4o-mini", "answer 2 gpt-4o-mini"]
+    assert results[0].cache_read_tokens == 4
+    assert isinstance(results[1], RuntimeError) and "400" in str(results[1])
+    input_file = batch_server.files[batch_server.batches["batch-0"]["input_file_id"]]
+    assert [line["custom_id"] for line in map(json.loads, input_file.splitlines())] == ["0", "1", "2"]
+
+
+def test_batch_timeout_cancels_job(batch_server):
+    batch_server.polls = None
+    backend = openai_backend(batch_server, timeout=0.05)
+
+    with pytest.raises(RuntimeError, match="timeout"):
+        backend.complete_batch([batch_request("never answered")])
+    assert batch_server.cancelled == ["batch-0"]
@@ -0,0 +1,128 @@
+"""Splitting the aggregated content into chunks, and where the chunks are cut."""
+import ast
+
+from utils.python_chunker import PythonChunker
+from utils.repo_content_aggregator import RepositoryContentAggregator
+
+CHUNK_SIZE = 2000
+
+
+def _character_split(text):
+    return [text[start:start + CHUNK_SIZE] for start in range(0, len(text), CHUNK_SIZE)]
+
+
+def test_python_chunker(benchmark, synthetic_repo):
+    content = RepositoryContentAggregator(synthetic_repo).aggregate()
+    chunker = PythonChunker(CHUNK_SIZE, _character_split)
+    chunks = benchmark(chunker.split, content)
+    assert chunks and all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+
+
+def test_character_split(benchmark, synthetic_repo):
+    content = RepositoryContentAggregator(synthetic_repo).aggregate()
+    chunks = benchmark(lambda: _character_split("\n".join(content)))
+    assert chunks
+
+
+def _function(name, statements, uses_json=False):
+    body = "".join(f"    value_{index} = {'json.dumps' if uses_json else 'str'}(items[{index}])\n"
+                   for index in range(statements))
+    return f"def {name}(items):\n    \"\"\"Converts the items.\"\"\"\n{body}    return value_0\n\n\n"
+
+
+def _sources(chunks, header):
+    """The chunks without the header, checking that each one starts with it and parses."""
+    sources = []
+    for chunk in chunks:
+        assert chunk.startswith(header) and len(chunk) <= CHUNK_SIZE
+        source = chunk[len(header):]
+        ast.parse(source)
+        sources.append(source)
+    return sources
+
+
+def test_small_file_is_one_chunk():
+    source = "import os\n\n\n" + _function("small", 2)
+    assert PythonChunker(CHUNK_SIZE, _character_split).split_python("pkg/small.py", source) == [
+        "/* pkg/small.py */\n" + source]
+
+
+def test_chunks_cut_at_function_boundaries():
+    functions = [_function(f"function_{index}", 20, uses_json=index % 2 == 0) for index in range(12)]
+    source = "import os\nimport json\n\nLIMIT = 10\n\n\n" + "".join(functions)
+    header = "/* pkg/module.py */\n"
+    chunks = PythonChunker(CHUNK_SIZE, _character_split).split_python("pkg/module.py", source)
+
+    sources = _sources(chunks, header)
+    assert len(chunks) > 1
+    # Every function is whole in exactly one chunk, in order
+    for function in functions:
+        assert sum(function.rstrip() in chunk for chunk in sources) == 1
+    assert "".join(sources).index("def function_0") < "".join(sources).index("def function_11")
+    # Each chunk repeats only the imports it uses
+    for chunk in sources:
+        assert ("import json\n" in chunk) == ("json.dumps" in chunk)
+        assert "import os\n" not in chunk
+
+
+def test_large_class_chunks_carry_the_signature():
+    methods = "".join("    " + line + "\n" if line else "\n"
+                      for index in range(10) for line in _function(f"method_{index}", 15).splitlines())
+    source = ("import abc\nimport functools\n\n\n# The service\n@functools.total_ordering\nclass Service(abc.ABC):\n"
+              "    \"\"\"A large service.\"\"\"\n\n"
+              + methods.replace("(items)", "(self, items)"))
+    chunks = PythonChunker(CHUNK_SIZE, _character_split).split_python("service.py", source)
+
+    sources = _sources(chunks, "/* service.py */\n")
+    assert len(chunks) > 1
+    # The comment before the class stays at module level; the methods carry the imports the
+    # signature uses and the signature itself
+    assert sources[0] == "\n\n# The service\n"
+    for chunk in sources[1:]:
+        assert chunk.startswith("import abc\nimport functools\n@functools.total_ordering\nclass Service(abc.ABC):\n")
+    assert sum(chunk.count("def method_") for chunk in sources) == 10
+
+
+def test_no_blank_chunk_before_a_large_class():
+    methods = "".join("    " + line + "\n" if line else "\n"
+                      for index in range(10) for line in _function(f"method_{index}", 15).splitlines())
+    source = "import os\n\n\nclass Service:\n" + methods.replace("(items)", "(self, items)")
+    chunks = PythonChunker(CHUNK_SIZE, _character_split).split_python("service.py", source)
+
+    assert all(chunk.startswith("/* service.py */\nclass Service:\n") for chunk in chunks)
+
+
+def test_oversized_function_is_cut_between_statements():
+    function = _function("huge", 200)
+    chunks = PythonChunker(CHUNK_SIZE, _character_split).split_python("huge.py", function)
+    header = "/* huge.py */\n"
+
+    assert len(chunks) > 1 and all(chunk.startswith(header) and len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    pieces = [chunk[len(header):] for chunk in chunks]
+    assert "".join(pieces) == function
+    # Every piece after the first starts at the beginning of a statement
+    assert all(piece.startswith("    value_") or piece.startswith("    return") for piece in pieces[1:])
+
+
+def test_fallback_for_other_files_and_syntax_errors():
+    calls = []
+
+    def fallback(text):
+        calls.append(text)
+        return _character_split(text)
+
+    records = ["/* README.md */\n# Title\n", "/* broken.py */\n" + "def broken(:\n" * 200,
+               # ast.parse fails with MemoryError rather than SyntaxError on this one
+               "/* prose.py */\nx\n" + "word " * 2000,
+               "/* ok.py */\nprint('ok')\n"]
+    chunks = PythonChunker(CHUNK_SIZE, fallback).split(records)
+
+    # Consecutive non-Python (or unparsable) records go to the fallback together, in order
+    assert calls == ["\n".join(records[:3])]
+    assert chunks[-1].endswith("/* ok.py */\nprint('ok')\n")
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+
+
+def test_small_chunks_are_merged():
+    records = [f"/* small_{index}.py */\nVALUE = {index}\n" for index in range(5)]
+    assert PythonChunker(CHUNK_SIZE, _character_split).split(records) == ["\n".join(records)]
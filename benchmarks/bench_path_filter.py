@@ -0,0 +1,104 @@
+"""Correctness of the gitignore-style exclusions: negations, anchored patterns and nested .gitignore files."""
+import pytest
+
+from utils.path_filter import GitignoreRules, PathFilter
+
+
+def _excluded(path_filter, relative_path, is_dir=False, rules=None):
+    name = relative_path.rsplit("/", 1)[-1]
+    return path_filter.is_excluded(relative_path, name, is_dir, rules or path_filter.initial_rules())
+
+
+@pytest.mark.parametrize("relative_path, excluded", [
+    ("debug.log", True),
+    ("keep.log", False),
+    ("src/keep.log", False),
+    ("src/trace.log", True),
+    ("notes.txt", False),
+])
+def test_negation_reincludes(relative_path, excluded):
+    path_filter = PathFilter(["*.log", "!keep.log"])
+    assert _excluded(path_filter, relative_path) is excluded
+
+
+def test_last_matching_rule_wins():
+    path_filter = PathFilter(["!keep.log", "*.log"])
+    assert _excluded(path_filter, "keep.log")
+
+
+@pytest.mark.parametrize("relative_path, is_dir, excluded", [
+    ("build", True, True),
+    ("src/build", True, False),
+    ("docs/index.md", False, True),
+    ("docs/api/index.md", False, False),
+    ("site/docs/index.md", False, False),
+    ("README.md", False, False),
+])
+def test_anchored_patterns(relative_path, is_dir, excluded):
+    # A leading or inner slash anchors the pattern to the directory of its .gitignore
+    path_filter = PathFilter(["/build", "docs/*.md"])
+    assert _excluded(path_filter, relative_path, is_dir) is excluded
+
+
+@pytest.mark.parametrize("relative_path, is_dir, excluded", [
+    ("cache", True, True),
+    ("a/b/cache", True, True),
+    ("logs", True, True),
+    ("logs", False, False),
+    ("src/gen/x/y.py", False, True),
+    ("src/y.py", False, False),
+])
+def test_double_star_and_directory_patterns(relative_path, is_dir, excluded):
+    path_filter = PathFilter(["**/cache", "logs/", "src/**/y.py", "!src/y.py"])
+    assert _excluded(path_filter, relative_path, is_dir) is excluded
+
+
+def test_negation_inside_excluded_directory_is_pruned():
+    # As in git, a file cannot be re-included if one of its parent directories is excluded:
+    # the directory itself is excluded, so the walk never reaches the file
+    path_filter = PathFilter(["vendor/", "!vendor/keep.py"])
+    assert _excluded(path_filter, "vendor", is_dir=True)
+
+
+def test_nested_gitignore(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.json\n/out\n", encoding="utf-8")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / ".gitignore").write_text("!settings.json\n/local.py\n", encoding="utf-8")
+    path_filter = PathFilter()
+    root_rules = path_filter.rules_for_directory(str(tmp_path), "", path_filter.initial_rules(), True)
+    pkg_rules = path_filter.rules_for_directory(str(tmp_path / "pkg"), "pkg", root_rules, True)
+
+    assert _excluded(path_filter, "data.json", rules=root_rules)
+    assert _excluded(path_filter, "out", is_dir=True, rules=root_rules)
+    # The deepest .gitignore with a matching rule decides
+    assert not _excluded(path_filter, "pkg/settings.json", rules=pkg_rules)
+    assert _excluded(path_filter, "pkg/other.json", rules=pkg_rules)
+    # Anchored to pkg/, not to the repository root
+    assert _excluded(path_filter, "pkg/local.py", rules=pkg_rules)
+    assert not _excluded(path_filter, "local.py", rules=root_rules)
+    assert not _excluded(path_filter, "pkg/out", is_dir=True, rules=pkg_rules)
+
+
+def test_fast_path_matches_ordered_evaluation():
+    # Without negations the rules are matched through sets and a combined regex: same answers
+    patterns = ["*.pyc", "node_modules/", "/dist", "docs/**/*.tmp", "Thumbs.db"]
+    fast = GitignoreRules(patterns)
+    ordered = GitignoreRules(patterns + ["!never-matches"])
+    assert not fast.has_negations and ordered.has_negations
+    for relative_path, is_dir in [("a.pyc", False), ("x/a.pyc", False), ("node_modules", True),
+                                  ("node_modules", False), ("dist", True), ("x/dist", True),
+                                  ("docs/a/b/c.tmp", False), ("docs/c.tmp", False), ("x/Thumbs.db", False),
+                                  ("main.py", False)]:
+        name = relative_path.rsplit("/", 1)[-1]
+        assert fast.match(relative_path, name, is_dir) == ordered.match(relative_path, name, is_dir)
+
+
+def test_from_exclusions():
+    path_filter = PathFilter.from_exclusions(excluded_dirs=["venv"], excluded_files=[".json", "!package.json"],
+                                             excluded_extensions=[".pyc"])
+    assert _excluded(path_filter, "lib/venv", is_dir=True)
+    assert _excluded(path_filter, "config.json")
+    assert _excluded(path_filter, ".json")
+    assert not _excluded(path_filter, "web/package.json")
+    assert _excluded(path_filter, "a/b.pyc")
+    assert not _excluded(path_filter, "a/b.py")
@@ -0,0 +1,156 @@
+"""Correctness of the rate limiting and retries: Retry-After handling and token-bucket refill."""
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils import request_scheduler
+from utils.request_scheduler import RequestScheduler, TokenBucket, get_retry_after, is_retryable
+
+
+class FakeClock:
+    """Replaces the time module of utils.request_scheduler: monotonic() returns now, sleep()
+    advances it and records the delay."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class HTTPError(Exception):
+    """Shaped like the openai/anthropic SDK errors: status_code and an httpx response with headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = _Response(headers or {})
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError: the response is a dict."""
+
+    def __init__(self, code, status_code, headers=None):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code},
+                         "ResponseMetadata": {"HTTPStatusCode": status_code, "HTTPHeaders": headers or {}}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(request_scheduler, "time", fake)
+    return fake
+
+
+def test_retry_after_seconds_and_milliseconds():
+    assert get_retry_after(HTTPError(429, {"retry-after": "7"})) == 7.0
+    # retry-after-ms (OpenAI) is more precise and takes precedence
+    assert get_retry_after(HTTPError(429, {"retry-after": "7", "retry-after-ms": "1500"})) == 1.5
+    assert get_retry_after(HTTPError(429, {"retry-after": "-3"})) == 0.0
+    assert get_retry_after(HTTPError(429, {"retry-after": "soon"})) is None
+    assert get_retry_after(HTTPError(429)) is None
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = get_retry_after(HTTPError(503, {"retry-after": format_datetime(when, usegmt=True)}))
+    assert 25 <= delay <= 31
+
+
+def test_retry_after_through_wrapped_and_aws_errors():
+    # The backends raise RuntimeError(...) from the SDK error
+    try:
+        try:
+            raise ClientError("ThrottlingException", 400, {"retry-after": "2"})
+        except ClientError as exc:
+            raise RuntimeError("[BaseAgent] Errore durante la chiamata") from exc
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+        assert get_retry_after(wrapped) == 2.0
+
+
+def test_retry_delay():
+    scheduler = RequestScheduler(max_retries=6, base_delay=1.0, max_delay=10.0)
+    assert scheduler.retry_delay(HTTPError(429, {"retry-after": "4"}), 0) == 4.0
+    # Capped at max_delay
+    assert scheduler.retry_delay(HTTPError(429, {"retry-after": "120"}), 0) == 10.0
+    # Full jitter within base_delay * 2 ** attempt, capped at max_delay
+    assert all(0 <= scheduler.retry_delay(HTTPError(503), 2) <= 4.0 for _ in range(50))
+    assert all(0 <= scheduler.retry_delay(HTTPError(503), 5) <= 10.0 for _ in range(50))
+    # Not retryable, or retries exhausted
+    assert scheduler.retry_delay(HTTPError(400, {"retry-after": "1"}), 0) is None
+    assert scheduler.retry_delay(HTTPError(429, {"retry-after": "1"}), 6) is None
+
+
+def test_execute_honors_retry_after(clock):
+    scheduler = RequestScheduler(max_retries=5, max_delay=30.0)
+    failures = [HTTPError(429, {"retry-after": "3"}), HTTPError(503, {"retry-after-ms": "250"})]
+
+    def call():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert scheduler.execute(call) == "ok"
+    assert clock.sleeps == [3.0, 0.25]
+
+
+def test_execute_gives_up_after_max_retries(clock):
+    scheduler = RequestScheduler(max_retries=2)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise HTTPError(429, {"retry-after": "1"})
+
+    with pytest.raises(HTTPError):
+        scheduler.execute(call)
+    assert len(calls) == 3 and clock.sleeps == [1.0, 1.0]
+
+
+def test_token_bucket_refill(clock):
+    bucket = TokenBucket(60)  # one unit per second
+    assert bucket.reserve(60) == 0.0
+    # Empty: the next unit is available after one second, the one after that after two
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+    # Refilled continuously: five seconds later the debt of two units is repaid, three are left
+    clock.now += 5
+    assert bucket.reserve(3) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_token_bucket_capacity(clock):
+    bucket = TokenBucket(60)
+    # Idle time never accumulates more than the capacity
+    clock.now += 3600
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    # Requests larger than the capacity are clamped to it: they wait for a full bucket
+    clock.now += 3600
+    assert bucket.reserve(600) == 0.0
+    assert bucket.available == 0.0
+
+
+def test_admission_delay(clock):
+    scheduler = RequestScheduler(requests_per_minute=120, tokens_per_minute=6000)
+    assert scheduler.admission_delay(6000) == 0.0
+    # The tokens-per-minute budget is exhausted: 100 tokens per second refill
+    assert scheduler.admission_delay(300) == pytest.approx(3.0)
+    clock.now += 3
+    assert scheduler.admission_delay(100) == pytest.approx(1.0)
@@ -0,0 +1,130 @@
+"""Correctness of the response cache: TTL expiry, LRU eviction and the running size."""
+import pytest
+
+from utils import response_cache
+from utils.response_cache import ResponseCache
+
+
+class FakeClock:
+    """Replaces the time module of utils.response_cache: time() returns now."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(response_cache, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+    caches = []
+
+    def open_(**kwargs):
+        cache = ResponseCache(str(tmp_path / "cache" / "responses.sqlite3"), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield open_
+    for cache in caches:
+        cache.close()
+
+
+def _keys(cache):
+    with cache._lock:
+        return {row[0] for row in cache._conn.execute("SELECT key FROM responses")}
+
+
+def _assert_size_consistent(cache):
+    assert cache._total_size == cache.get_stats()["size_bytes"]
+
+
+def test_ttl_expiry(clock, open_cache):
+    cache = open_cache(ttl_seconds=10)
+    cache.put("a", "answer")
+    clock.now += 10
+    assert cache.get("a") == "answer"
+    # Reads do not extend the TTL, which runs from the write
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.get_stats() == {"hits": 1, "misses": 1, "entries": 0, "size_bytes": 0}
+    _assert_size_consistent(cache)
+
+
+def test_rewrite_restarts_ttl(clock, open_cache):
+    cache = open_cache(ttl_seconds=10)
+    cache.put("a", "first")
+    clock.now += 8
+    cache.put("a", "second")
+    clock.now += 8
+    assert cache.get("a") == "second"
+    assert cache.get_stats()["size_bytes"] == len("second")
+
+
+def test_no_ttl(clock, open_cache):
+    cache = open_cache(ttl_seconds=0)
+    cache.put("a", "answer")
+    clock.now += 10 ** 9
+    assert cache.get("a") == "answer"
+
+
+def test_lru_eviction(clock, open_cache):
+    cache = open_cache(max_size_bytes=30)
+    for key in "abc":
+        clock.now += 1
+        cache.put(key, key * 10)
+    # Reading "a" makes "b" the least recently used entry
+    clock.now += 1
+    assert cache.get("a") == "a" * 10
+    clock.now += 1
+    cache.put("d", "d" * 10)
+    assert _keys(cache) == {"a", "c", "d"}
+    _assert_size_consistent(cache)
+    # A larger entry evicts as many of the oldest entries as needed, and nothing more
+    clock.now += 1
+    cache.put("e", "e" * 20)
+    assert _keys(cache) == {"d", "e"}
+    _assert_size_consistent(cache)
+
+
+def test_entry_larger_than_budget(clock, open_cache):
+    cache = open_cache(max_size_bytes=10)
+    cache.put("a", "a" * 5)
+    clock.now += 1
+    cache.put("b", "b" * 50)
+    assert _keys(cache) == set()
+    _assert_size_consistent(cache)
+
+
+def test_size_across_replace_and_reopen(clock, open_cache):
+    cache = open_cache(max_size_bytes=100)
+    cache.put("a", "a" * 40)
+    cache.put("a", "a" * 60)
+    clock.now += 1
+    cache.put("b", "é" * 20)  # sizes are counted in UTF-8 bytes
+    assert cache.get_stats()["size_bytes"] == 100
+    _assert_size_consistent(cache)
+    cache.close()
+
+    reopened = open_cache(max_size_bytes=100)
+    assert reopened._total_size == 100
+    clock.now += 1
+    reopened.put("c", "c")
+    assert _keys(reopened) == {"b", "c"}
+    _assert_size_consistent(reopened)
+    reopened.clear()
+    assert reopened.get_stats() == {"hits": 0, "misses": 0, "entries": 0, "size_bytes": 0}
+    _assert_size_consistent(reopened)
+
+
+def test_make_key():
+    key = ResponseCache.make_key("openai", "gpt-4o-mini", None, "prompt", 0.0)
+    assert key == ResponseCache.make_key("openai", "gpt-4o-mini", "", "prompt", 0.0)
+    assert key != ResponseCache.make_key("openai", "gpt-4o-mini", "", "prompt", 0.5)
+    assert key != ResponseCache.make_key("openai", "gpt-4o", "", "prompt", 0.0)
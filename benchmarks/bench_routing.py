@@ -0,0 +1,190 @@
+"""Correctness of the model router: tier selection, the cascade and its use by the agents."""
+import pytest
+
+from agents.mock_provider import MockProviderError
+from agents.pythoncode_agent import PythonCodeAgent
+from utils.model_router import ModelRouter, ModelTier, chunk_complexity, python_complexity
+
+ROUTING_CONFIG_TEMPLATE = """\
+bench:
+  mock:
+    model_name: "gpt-4o-mini"
+    latency: 0
+    completion_tokens: 8
+    error_rate: {error_rate}
+    seed: 0
+  # As in conftest: the schedulers of the mock sections are shared by the whole process
+  rate_limit:
+    max_retries: 10
+    base_delay: 0.001
+    max_delay: 0.01
+  routing:
+    enabled: true
+    min_answer_chars: {min_answer_chars}
+    models:
+      - model_name: "gpt-4o-mini"
+        max_tokens: 200
+      - model_name: "gpt-4o"
+"""
+
+SIMPLE_CODE = "/* simple.py */\ndef add(a, b):\n    return a + b\n"
+MEDIUM_CODE = ("/* medium.py */\ndef walk(items):\n    for item in items:\n        if item and item > 0:\n"
+               "            item -= 1\n    return items\n")
+COMPLEX_CODE = ("/* complex.py */\ndef walk(items):\n    for item in items:\n        if item and item > 0:\n"
+                "            while item:\n                item -= 1\n    return items\n")
+
+
+def _count_words(model_name, text):
+    return len(text.split())
+
+
+def _router(cascade=True, validator=None):
+    tiers = [ModelTier("small", max_tokens=100, max_complexity=3),
+             ModelTier("medium", max_tokens=1000, max_nesting=3),
+             ModelTier("large", max_tokens=10)]
+    return ModelRouter(tiers, _count_words, cascade=cascade, validator=validator)
+
+
+def test_complexity_metrics():
+    # One function, a for, an if with a two-operand and, a while: 1 + 1 + 1 + 1 + 1
+    assert python_complexity(COMPLEX_CODE.split("\n", 1)[1]) == (5, 4)
+    assert python_complexity("x = 1\n") == (0, 0)
+    # Sources that do not parse (a chunk cut mid-function) count decision keywords
+    assert python_complexity("    if a and b:\n        for x in y:\n") == (3, 0)
+    # Only the Python sections of a chunk are measured
+    assert chunk_complexity("/* notes.md */\nif and or while\n" + COMPLEX_CODE) == (5, 4)
+    assert chunk_complexity("no headers: if and or while") == (0, 0)
+    # ast.parse fails with MemoryError rather than SyntaxError on this one
+    assert python_complexity("x\n" + "word " * 2000 + "if a and b") == (2, 0)
+
+
+@pytest.mark.parametrize("user_prompt, tier", [
+    (SIMPLE_CODE, 0),
+    # Too complex for the first tier, shallow enough for the second
+    (MEDIUM_CODE, 1),
+    # Too large for the second tier: the last one takes everything else, whatever its limits
+    (SIMPLE_CODE + "word " * 2000, 2),
+    (COMPLEX_CODE, 2),
+])
+def test_route(user_prompt, tier):
+    router = _router()
+    assert router.route("Review.", user_prompt) == tier
+    assert router.stats() == {"routed": {name: int(index == tier) for index, name in
+                                         enumerate(("small", "medium", "large"))}, "escalations": 0}
+
+
+def test_route_counts_system_prompt_tokens():
+    router = _router()
+    assert router.route(None, SIMPLE_CODE) == 0
+    assert router.route("word " * 200, SIMPLE_CODE) == 1
+
+
+def test_escalate():
+    router = _router()
+    valid = "A detailed enough answer to pass the validator."
+    assert router.escalate(0, valid) is None
+    assert router.escalate(0, "too short") == 1
+    assert router.escalate(1, RuntimeError("call failed")) == 2
+    # Nothing above the last tier
+    assert router.escalate(2, "too short") is None
+    assert router.stats() == {"routed": {"small": 0, "medium": 1, "large": 1}, "escalations": 2}
+
+
+def test_escalate_without_cascade_or_with_custom_validator():
+    assert _router(cascade=False).escalate(0, "too short") is None
+    router = _router(validator=lambda answer: "LGTM" not in answer)
+    assert router.escalate(0, "LGTM") == 1
+    assert router.escalate(0, "too short, but fine") is None
+
+
+def test_from_config():
+    router = ModelRouter.from_config({"cascade": False, "min_answer_chars": 3, "models": [
+        {"model_name": "small", "max_tokens": 10, "max_complexity": 2, "max_nesting": 1,
+         "rate_limit": {"requests_per_minute": 60}},
+        {"model_name": "large"}]}, _count_words)
+    assert [tier.model_name for tier in router.tiers] == ["small", "large"]
+    assert (router.tiers[0].max_tokens, router.tiers[0].max_complexity, router.tiers[0].max_nesting) == (10, 2, 1)
+    assert router.rate_limit("small") == {"requests_per_minute": 60}
+    assert router.rate_limit("large") is None
+    assert not router.cascade
+    assert router.validator("abc") and not router.validator(" ab ")
+    with pytest.raises(ValueError):
+        ModelRouter.from_config({"models": []}, _count_words)
+
+
+def test_tier_limits_capped_by_cost_map():
+    class CostMap:
+        """The TokenManager methods used by the router."""
+
+        @staticmethod
+        def get_model_limits(model_name):
+            if model_name == "unknown":
+                raise ValueError(model_name)
+            return {"small": 100, "large": 1000}[model_name], 10
+
+        @staticmethod
+        def get_model_prices(model_name):
+            return 1, 2
+
+    tiers = [ModelTier("small", max_tokens=500), ModelTier("unknown", max_tokens=500), ModelTier("large")]
+    router = ModelRouter(tiers, _count_words, CostMap())
+    # max_tokens never exceeds max_prompt_tokens, and defaults to it; unknown models keep theirs
+    assert [tier.max_tokens for tier in router.tiers] == [100, 500, 1000]
+
+
+@pytest.fixture
+def routed_agent(tmp_path):
+    def create(min_answer_chars=1, error_rate=0.0):
+        path = tmp_path / "routing-config.yaml"
+        path.write_text(ROUTING_CONFIG_TEMPLATE.format(min_answer_chars=min_answer_chars, error_rate=error_rate),
+                        encoding="utf-8")
+        agent = PythonCodeAgent("bench", str(path))
+        agent.models_called = []
+        complete = agent.backend.complete
+
+        def recording_complete(system_prompt, user_prompt, model_name, temperature):
+            agent.models_called.append(model_name)
+            return complete(system_prompt, user_prompt, model_name, temperature)
+
+        agent.backend.complete = recording_complete
+        return agent
+
+    return create
+
+
+def test_agent_routes_by_size(routed_agent):
+    agent = routed_agent()
+    assert agent.chat_completion("Review.", SIMPLE_CODE, use_cache=False)
+    assert agent.chat_completion("Review.", SIMPLE_CODE + "word " * 400, use_cache=False)
+    assert agent.models_called == ["gpt-4o-mini", "gpt-4o"]
+
+
+def test_agent_cascade(routed_agent):
+    # Every answer fails the validator: the request is repeated on the next model, and the
+    # last model's answer is returned as it is
+    agent = routed_agent(min_answer_chars=10 ** 6)
+    assert agent.chat_completion("Review.", SIMPLE_CODE, use_cache=False)
+    assert agent.models_called == ["gpt-4o-mini", "gpt-4o"]
+    assert agent.router.stats()["escalations"] == 1
+
+
+def test_agent_cascade_many(routed_agent):
+    agent = routed_agent(min_answer_chars=10 ** 6)
+    requests = [{"system_prompt": "Review.", "user_prompt": SIMPLE_CODE, "use_cache": False},
+                {"system_prompt": "Review.", "user_prompt": SIMPLE_CODE + "word " * 400, "use_cache": False},
+                {"system_prompt": "Review.", "user_prompt": SIMPLE_CODE, "model_name": "gpt-4o-mini",
+                 "use_cache": False}]
+    results = agent.chat_completion_many(requests)
+    assert all(isinstance(result, str) for result in results)
+    # Only the first request escalates: the second starts on the last model, the third names its model
+    assert sorted(agent.models_called) == ["gpt-4o", "gpt-4o", "gpt-4o-mini", "gpt-4o-mini"]
+    assert agent.router.stats() == {"routed": {"gpt-4o-mini": 1, "gpt-4o": 2}, "escalations": 1}
+
+
+def test_agent_cascade_on_errors(routed_agent):
+    agent = routed_agent(error_rate=1.0)
+    with pytest.raises(MockProviderError):
+        agent.chat_completion("Review.", SIMPLE_CODE, use_cache=False)
+    # Each model is retried by its scheduler before the request moves on to the next one
+    assert list(dict.fromkeys(agent.models_called)) == ["gpt-4o-mini", "gpt-4o"]
+    assert len(agent.models_called) == 2 * (1 + 10)
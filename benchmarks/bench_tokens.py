@@ -0,0 +1,35 @@
+"""Token counting and cost calculation of the TokenManager."""
+import random
+
+from conftest import python_module_source
+
+MODEL_NAME = "gpt-4o-mini"
+
+
+def _texts(count):
+    rng = random.Random(count)
+    return [python_module_source(index, rng) for index in range(count)]
+
+
+def test_count_tokens(benchmark, token_manager_factory):
+    token_manager = token_manager_factory()
+    text = "".join(_texts(200))
+    assert benchmark(token_manager.count_tokens, MODEL_NAME, text) > 0
+
+
+def test_count_tokens_many(benchmark, token_manager_factory):
+    token_manager = token_manager_factory()
+    texts = _texts(1000)
+    assert len(benchmark(token_manager.count_tokens_many, MODEL_NAME, texts)) == len(texts)
+
+
+def test_calculate_and_apply_cost(benchmark, token_manager_factory):
+    token_manager = token_manager_factory(max_report_entries=1000)
+    texts = _texts(100)
+
+    def calculate_all():
+        for text in texts:
+            token_manager.calculate_and_apply_cost(MODEL_NAME, "You are a reviewer.", text, text[:200])
+
+    benchmark(calculate_all)
+    assert token_manager.get_stats()["total_operations"] >= len(texts)
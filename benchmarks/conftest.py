@@ -0,0 +1,214 @@
+"""
+Offline benchmark suite, run with pytest:
+
+  python -m pytest benchmarks [--bench-repo-sizes 1000,10000,100000] [--bench-rounds 5]
+
+Files named bench_*.py are collected from this directory. With pytest-benchmark installed its
+`benchmark` fixture (calibration, comparisons, --benchmark-json) is used; otherwise a minimal
+fixture with the same call interface times --bench-rounds rounds and prints min/median/max at
+the end of the session. Agents run against the mock provider, and batch mode against a local
+stand-in of the batch API (batch_api_server.py), so no network access is needed.
+"""
+import os
+import sys
+import time
+import random
+import warnings
+import statistics
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_REPO_SIZES = "1000"
+DEFAULT_ROUNDS = 3
+
+MOCK_CONFIG_TEMPLATE = """\
+bench:
+  mock:
+    model_name: "gpt-4o-mini"
+    latency: {latency}
+    tokens_per_second: {tokens_per_second}
+    completion_tokens: 64
+    error_rate: {error_rate}
+    throttle_rate: {throttle_rate}
+    retry_after: 0
+    batch_latency: 0.05
+    seed: 0
+  max_concurrency: 16
+  rate_limit:
+    max_retries: 10
+    base_delay: 0.001
+    max_delay: 0.01
+  map_reduce:
+    enabled: {map_reduce}
+    fan_out: 8
+    max_in_flight: 16
+    chunk_size: 2000
+  batch:
+    enabled: {batch}
+    max_wait: 0.05
+"""
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("pycopilot benchmarks")
+    group.addoption("--bench-repo-sizes", default=DEFAULT_REPO_SIZES,
+                    help="comma-separated file counts of the synthetic repositories (e.g. 1000,10000,100000)")
+    group.addoption("--bench-rounds", type=int, default=DEFAULT_ROUNDS,
+                    help="rounds per benchmark when pytest-benchmark is not installed")
+
+
+def pytest_collect_file(parent, file_path):
+    if file_path.suffix == ".py" and file_path.name.startswith("bench_"):
+        return pytest.Module.from_parent(parent, path=file_path)
+    return None
+
+
+def pytest_generate_tests(metafunc):
+    if "repo_size" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("--bench-repo-sizes").split(",") if size.strip()]
+        metafunc.parametrize("repo_size", sizes, ids=[f"{size}files" for size in sizes])
+
+
+def python_module_source(index, rng):
+    """Source of a synthetic Python module with imports, constants, functions and a class."""
+    lines = ["import os", "import json", "from collections import defaultdict", "",
+             f"CONSTANT_{index} = {rng.randint(0, 1000)}", ""]
+    for function in range(rng.randint(2, 6)):
+        lines += [f"def function_{index}_{function}(items, threshold=CONSTANT_{index}):",
+                  f'    """Filters the items of module {index}."""',
+                  "    result = defaultdict(list)",
+                  "    for item in items:",
+                  "        if item > threshold:",
+                  "            result[item % 7].append(os.path.basename(str(item)))",
+                  "    return json.dumps(result)", "", ""]
+    lines += [f"class Service{index}:", "    def __init__(self, name):", "        self.name = name", ""]
+    for method in range(rng.randint(1, 4)):
+        lines += [f"    def method_{method}(self, value):",
+                  f"        return function_{index}_0([value, {method}]) + self.name", ""]
+    return "\n".join(lines) + "\n"
+
+
+def generate_repo(path, files):
+    """Writes files synthetic modules (about 1 KiB each) into nested packages."""
+    rng = random.Random(files)
+    for index in range(files):
+        directory = os.path.join(path, f"pkg{index % 50}", f"sub{index % 11}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{index}.py"), "w", encoding="utf-8") as f:
+            f.write(python_module_source(index, rng))
+
+
+@pytest.fixture(scope="session")
+def synthetic_repos(tmp_path_factory):
+    """Returns a function size -> path of a synthetic repository, generated once per session."""
+    repos = {}
+
+    def get(size):
+        if size not in repos:
+            path = tmp_path_factory.mktemp(f"repo{size}")
+            generate_repo(str(path), size)
+            repos[size] = str(path)
+        return repos[size]
+
+    return get
+
+
+@pytest.fixture
+def synthetic_repo(synthetic_repos, repo_size):
+    return synthetic_repos(repo_size)
+
+
+def offline_encoding():
+    """Byte-level tiktoken encoding (one token per byte, no merges) built without downloading
+    anything, standing in for the model encodings when they are not cached locally."""
+    from tiktoken.core import Encoding
+    return Encoding(name="offline-bytes", pat_str=r"\S+|\s+",
+                    mergeable_ranks={bytes([byte]): byte for byte in range(256)}, special_tokens={})
+
+
+@pytest.fixture(scope="session")
+def token_manager_factory():
+    """Returns a function creating TokenManagers. When the tiktoken encoding is not cached locally
+    (it would be downloaded), the encoding resolver returns offline_encoding() instead: counts
+    differ from the real ones, the code paths are the same."""
+    from utils.token_manager import token_manager
+    try:
+        token_manager.TokenManager().count_tokens("gpt-4o-mini", "probe")
+    except Exception as e:
+        warnings.warn(f"tiktoken encoding not available offline, using a byte-level encoding: {e}")
+        encoding = offline_encoding()
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(token_manager, "_encoding_for_model", lambda model_name: encoding)
+            yield token_manager.TokenManager
+    else:
+        yield token_manager.TokenManager
+
+
+@pytest.fixture
+def mock_config(tmp_path):
+    """Returns a function writing a YAML configuration with a `bench` section using the mock
+    provider, and returning its path."""
+
+    def write(latency=0.0, tokens_per_second=0, error_rate=0.0, throttle_rate=0.0, map_reduce=False, batch=False):
+        path = tmp_path / "bench-config.yaml"
+        path.write_text(MOCK_CONFIG_TEMPLATE.format(
+            latency=latency, tokens_per_second=tokens_per_second, error_rate=error_rate,
+            throttle_rate=throttle_rate, map_reduce=str(map_reduce).lower(), batch=str(batch).lower()),
+            encoding="utf-8")
+        return str(path)
+
+    return write
+
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    _RESULTS = []
+
+    class _Benchmark:
+        """Subset of the pytest-benchmark fixture: benchmark(func, *args, **kwargs) and
+        benchmark.pedantic(func, args, kwargs, setup, rounds)."""
+
+        def __init__(self, name, rounds):
+            self.name = name
+            self.rounds = rounds
+
+        def _run(self, func, args, kwargs, setup, rounds):
+            timings = []
+            result = None
+            for _ in range(rounds):
+                if setup is not None:
+                    prepared = setup()
+                    if prepared is not None:
+                        args, kwargs = prepared
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                timings.append(time.perf_counter() - start)
+            _RESULTS.append((self.name, timings))
+            return result
+
+        def __call__(self, func, *args, **kwargs):
+            return self._run(func, args, kwargs, None, self.rounds)
+
+        def pedantic(self, func, args=(), kwargs=None, setup=None, rounds=1, iterations=1, warmup_rounds=0):
+            for _ in range(warmup_rounds):
+                func(*args, **(kwargs or {}))
+            return self._run(func, args, kwargs or {}, setup, rounds)
+
+    @pytest.fixture
+    def benchmark(request):
+        return _Benchmark(request.node.nodeid.split("::", 1)[-1], request.config.getoption("--bench-rounds"))
+
+    def pytest_terminal_summary(terminalreporter):
+        if not _RESULTS:
+            return
+        terminalreporter.section("benchmarks (seconds)")
+        width = max(len(name) for name, _ in _RESULTS)
+        terminalreporter.write_line(f"{'name':<{width}}  {'min':>9}  {'median':>9}  {'max':>9}  rounds")
+        for name, timings in _RESULTS:
+            terminalreporter.write_line(f"{name:<{width}}  {min(timings):9.4f}  {statistics.median(timings):9.4f}  "
+                                        f"{max(timings):9.4f}  {len(timings):>6}")
@@ -0,0 +1,75 @@
+"""
+Import-time benchmark for the CLI entry point, based on `python -X importtime`.
+
+Runs `import app` in fresh interpreters, reports the cumulative import time and the
+heaviest modules, and fails (exit code 1) when the time exceeds --budget-ms or when one of
+the heavy provider/tokenizer packages is imported eagerly.
+
+Usage:
+  python benchmarks/import_time.py [--module app] [--runs 5] [--budget-ms 400] [--top 10]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that must be loaded only when the configured provider or feature needs them.
+LAZY_PACKAGES = (
+    "openai", "anthropic", "boto3", "botocore", "httpx",
+    "langchain", "langchain_core", "langchain_aws", "langchain_text_splitters",
+    "tiktoken", "tokencost", "transformers", "torch",
+)
+
+
+def measure_import(module):
+    """Imports module in a fresh interpreter and returns {module_name: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to measure")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if the median import time exceeds it")
+    parser.add_argument("--top", type=int, default=10, help="number of heaviest modules to print")
+    args = parser.parse_args()
+
+    totals = []
+    timings = {}
+    for _ in range(args.runs):
+        timings = measure_import(args.module)
+        totals.append(timings[args.module][1] / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"import {args.module}: median {median_ms:.1f} ms, min {min(totals):.1f} ms over {args.runs} runs")
+    print("heaviest modules (self time, last run):")
+    for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failures = []
+    eager = sorted(package for package in LAZY_PACKAGES if package in timings)
+    if eager:
+        failures.append(f"packages imported eagerly: {', '.join(eager)}")
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.1f} ms exceeds the budget of {args.budget_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.common import logger
+
+# Seconds a pending request waits for others before its batch job is submitted.
+DEFAULT_MAX_WAIT = 30.0
+# Batch jobs that can be in progress (submitted and polled) at the same time.
+DEFAULT_MAX_JOBS = 4
+
+
+class BatchCollector:
+    """Collects requests from concurrent callers and runs them together as provider batch jobs.
+    submit() queues a request and returns a Future; the pending requests are sent as one job
+    when max_batch_size of them are waiting, when flush() is called, or max_wait seconds after
+    the first one arrived. Jobs run on background threads, so each caller only blocks on its
+    own Future. run_batch receives the list of requests and returns, in the same order, a
+    result or an exception for each of them; an exception raised by run_batch fails the whole
+    job."""
+
+    def __init__(self, run_batch, max_batch_size=None, max_wait=DEFAULT_MAX_WAIT, max_jobs=DEFAULT_MAX_JOBS,
+                 name="batch"):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix=f"pycopilot-{name}")
+
+    @classmethod
+    def from_config(cls, run_batch, batch_config: dict, max_batch_size=None, name="batch"):
+        """Builds the collector from the `batch` block of the YAML configuration; the block's
+        max_batch_size can only lower the provider limit."""
+        configured_size = batch_config.get("max_batch_size")
+        if configured_size:
+            max_batch_size = min(int(configured_size), max_batch_size or int(configured_size))
+        return cls(run_batch, max_batch_size=max_batch_size,
+                   max_wait=float(batch_config.get("max_wait", DEFAULT_MAX_WAIT)),
+                   max_jobs=int(batch_config.get("max_jobs", DEFAULT_MAX_JOBS)), name=name)
+
+    def submit(self, request) -> Future:
+        """Queues request for the next batch job and returns the Future of its result."""
+        future = Future()
+        with self._lock:
+            self._pending.append((request, future))
+            if self.max_batch_size and len(self._pending) >= self.max_batch_size:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def flush(self):
+        """Submits the pending requests now, without waiting for max_wait."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._executor.submit(self._run, pending)
+
+    def _run(self, pending):
+        logger.info(f"[BatchCollector] Submitting a '{self.name}' batch job with {len(pending)} requests")
+        try:
+            results = self.run_batch([request for request, _ in pending])
+        except Exception as e:
+            logger.error(f"[BatchCollector] '{self.name}' batch job failed: {e}")
+            results = [e] * len(pending)
+        for (_, future), result in zip(pending, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+_COLLECTORS = {}
+_COLLECTORS_LOCK = threading.Lock()
+
+
+def get_batch_collector(key, run_batch, batch_config=None, max_batch_size=None):
+    """Returns the process-wide collector for key, so that the requests of every agent calling the
+    same deployment end up in the same batch jobs. key must identify everything run_batch depends
+    on (provider, endpoint and credentials, model, batch settings): the requests of every agent
+    with that key are submitted through the run_batch of the first one."""
+    with _COLLECTORS_LOCK:
+        collector = _COLLECTORS.get(key)
+        if collector is None:
+            name = "-".join(map(str, key[:3])) if isinstance(key, tuple) else str(key)
+            collector = BatchCollector.from_config(run_batch, batch_config or {}, max_batch_size, name=name)
+            _COLLECTORS[key] = collector
+        return collector
@@ -1,8 +1,12 @@
 import os
+import copy
 import json
 import logging
+import threading
 import yaml
 
+from utils.tracing import span
+
 # Set up a module-level logger that can be used by all helper functions.
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -48,8 +52,9 @@ def write_text_to_file(file_path: str, text: str) -> str:
         dir_path = os.path.dirname(file_path)
         if dir_path:
             create_directory(dir_path)
-        with open(file_path, "w", encoding="utf-8") as f:
+        with span("io.write_text") as current, open(file_path, "w", encoding="utf-8") as f:
             f.write(text)
+            current.set(num_bytes=len(text))
         logger.info(f"File written successfully: {file_path}")
     except Exception as e:
         logger.error(f"Error writing file '{file_path}': {e}")
@@ -57,6 +62,57 @@ def write_text_to_file(file_path: str, text: str) -> str:
     return file_path
 
 
+def append_text_to_file(file_path: str, text: str) -> str:
+    """
+    Appends the given text to the specified file, creating it if needed.
+
+    Parameters:
+      file_path (str): Destination file path.
+      text (str): Text content to be appended.
+
+    Returns:
+      file_path (str)
+
+    Exceptions are logged.
+    """
+    try:
+        with open(file_path, "a", encoding="utf-8") as f:
+            f.write(text)
+    except Exception as e:
+        logger.error(f"Error appending to file '{file_path}': {e}")
+        raise
+    return file_path
+
+
+def write_text_stream_to_file(file_path: str, text_stream) -> str:
+    """
+    Writes the chunks produced by text_stream to the specified file as they arrive,
+    flushing after each chunk so that partial output is visible while streaming.
+
+    Parameters:
+      file_path (str): Destination file path.
+      text_stream (iterable of str): Text chunks to be written.
+
+    Returns:
+      file_path (str)
+
+    Exceptions are logged.
+    """
+    try:
+        dir_path = os.path.dirname(file_path)
+        if dir_path:
+            create_directory(dir_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            for chunk in text_stream:
+                f.write(chunk)
+                f.flush()
+        logger.info(f"File streamed successfully: {file_path}")
+    except Exception as e:
+        logger.error(f"Error streaming file '{file_path}': {e}")
+        raise
+    return file_path
+
+
 def read_text_from_file(file_path: str) -> str:
     """
     Reads and returns the content of a file.
@@ -109,6 +165,37 @@ def load_yaml_config(config_path: str) -> dict:
         raise
 
 
+_YAML_CACHE = {}
+_YAML_CACHE_LOCK = threading.Lock()
+
+
+def load_yaml_config_cached(config_path: str) -> dict:
+    """
+    Same as load_yaml_config, but the parsed file is kept in memory and parsed again
+    only when its modification time changes. Each call returns an independent copy.
+
+    Parameters:
+      config_path (str): Path to the YAML file.
+
+    Returns:
+      config (dict)
+    """
+    try:
+        mtime_ns = os.stat(config_path).st_mtime_ns
+    except OSError:
+        # Let load_yaml_config report the missing file
+        return load_yaml_config(config_path)
+
+    key = os.path.abspath(config_path)
+    with _YAML_CACHE_LOCK:
+        cached = _YAML_CACHE.get(key)
+    if cached is None or cached[0] != mtime_ns:
+        cached = (mtime_ns, load_yaml_config(config_path))
+        with _YAML_CACHE_LOCK:
+            _YAML_CACHE[key] = cached
+    return copy.deepcopy(cached[1])
+
+
 def write_json_file(file_path: str, data: dict) -> str:
     """
     Writes a dictionary to a JSON file.
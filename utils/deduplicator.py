@@ -0,0 +1,193 @@
+import re
+import difflib
+import hashlib
+import threading
+
+from utils.common import logger
+from utils.repo_content_aggregator import split_file_header
+
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.9
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_MASK = (1 << 64) - 1
+
+
+def normalize_content(content):
+    """Normalizes a file body for hashing: line endings, trailing whitespace and trailing blank
+    lines are normalized, so CRLF/LF copies and editor whitespace differences share the same
+    hash. Leading indentation is kept, since in Python (and YAML, Makefiles...) it is part of
+    the program structure."""
+    return "\n".join(line.rstrip() for line in content.splitlines()).rstrip("\n")
+
+
+class ContentDeduplicator:
+    """Finds identical (and optionally near-identical) files among the per-file contents produced
+    by RepositoryContentAggregator, so that each unique body is sent to the LLM once.
+
+    The first file seen with a body is its canonical copy; later files with the same normalized
+    content are replaced by a reference to it, and near duplicates (MinHash estimate of the
+    Jaccard similarity of their token shingles >= threshold, candidates found with LSH banding)
+    by a reference plus a unified diff. The same instance can be shared by the jobs of a batch:
+    files of a repository then reference the copies already seen in the others (paths are
+    prefixed with the namespace of their repository). Thread-safe."""
+
+    def __init__(self, near_duplicates=False, threshold=DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+                 num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, shingle_size=DEFAULT_SHINGLE_SIZE):
+        if near_duplicates and num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        # sha256 of the normalized content -> canonical reference
+        self._canonical = {}
+        # Near duplicates: LSH buckets and (reference, signature, content) of the canonical copies
+        self._buckets = {}
+        self._signatures = []
+        # canonical reference -> references of the files that share it
+        self.groups = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, dedup_config):
+        """Builds the deduplicator from the `deduplicate` setting of config.json: true, or an
+        object with near_duplicates, threshold, num_perm, bands and shingle_size."""
+        if not isinstance(dedup_config, dict):
+            return cls()
+        return cls(
+            near_duplicates=dedup_config.get("near_duplicates", False),
+            threshold=dedup_config.get("threshold", DEFAULT_NEAR_DUPLICATE_THRESHOLD),
+            num_perm=dedup_config.get("num_perm", DEFAULT_NUM_PERM),
+            bands=dedup_config.get("bands", DEFAULT_BANDS),
+            shingle_size=dedup_config.get("shingle_size", DEFAULT_SHINGLE_SIZE),
+        )
+
+    def _signature(self, normalized):
+        """One-permutation MinHash: every shingle hash goes to one of num_perm bins, which keep
+        their minimum, so the signature costs a single pass over the shingles. Empty bins borrow
+        the value of the next non-empty one (densification), tagged with the distance."""
+        tokens = _TOKEN_RE.findall(normalized)
+        k = self.shingle_size
+        bins = [None] * self.num_perm
+        for i in range(max(1, len(tokens) - k + 1)):
+            shingle = hash(tuple(tokens[i:i + k])) & _MASK
+            index, value = shingle % self.num_perm, shingle // self.num_perm
+            if bins[index] is None or value < bins[index]:
+                bins[index] = value
+        filled = [index for index, value in enumerate(bins) if value is not None]
+        signature = []
+        for index, value in enumerate(bins):
+            if value is None:
+                following = next((f for f in filled if f > index), filled[0])
+                value = ((following - index) % self.num_perm, bins[following])
+            signature.append(value)
+        return tuple(signature)
+
+    def _band_keys(self, signature):
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _find_near_duplicate(self, signature):
+        """Returns (reference, content, similarity) of the most similar canonical copy above the
+        threshold, or None."""
+        candidates = set()
+        band_keys = self._band_keys(signature)
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        best = None
+        for index in candidates:
+            reference, other, content = self._signatures[index]
+            similarity = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (reference, content, similarity)
+        return best
+
+    def _register_signature(self, reference, signature, content):
+        index = len(self._signatures)
+        self._signatures.append((reference, signature, content))
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(index)
+
+    def dedupe(self, file_contents, namespace=""):
+        """Returns file_contents with duplicates replaced by references to their canonical copy.
+        namespace identifies the repository when the instance is shared across repositories."""
+        deduplicated = []
+        duplicates = 0
+        prefix = f"{namespace}/" if namespace else ""
+
+        def display(canonical):
+            # References inside the same repository are shown relative to it
+            return canonical[len(prefix):] if prefix and canonical.startswith(prefix) else canonical
+
+        for record in file_contents:
+            relative_path, content = split_file_header(record)
+            if relative_path is None:
+                deduplicated.append(record)
+                continue
+            reference = f"{namespace}/{relative_path}" if namespace else relative_path
+            normalized = normalize_content(content)
+            if not normalized:
+                deduplicated.append(record)
+                continue
+            content_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+            signature = self._signature(normalized) if self.near_duplicates else None
+
+            with self._lock:
+                canonical = self._canonical.get(content_hash)
+                if canonical is not None:
+                    reference_record = f"/* {relative_path} */\n(identical to {display(canonical)}, analyzed there)\n"
+                else:
+                    self._canonical[content_hash] = reference
+                    reference_record = None
+                    if signature is not None:
+                        near = self._find_near_duplicate(signature)
+                        if near is not None:
+                            canonical = near[0]
+                            reference_record = self._near_duplicate_record(
+                                relative_path, content, display(near[0]), near[1], near[2])
+                        if reference_record is None:
+                            self._register_signature(reference, signature, content)
+                if reference_record is not None:
+                    self.groups.setdefault(canonical, []).append(reference)
+
+            if reference_record is not None:
+                duplicates += 1
+                deduplicated.append(reference_record)
+            else:
+                deduplicated.append(record)
+
+        if duplicates:
+            logger.info(f"Deduplication: {duplicates} of {len(deduplicated)} files replaced by references")
+        return deduplicated
+
+    @staticmethod
+    def _near_duplicate_record(relative_path, content, reference, canonical_content, similarity):
+        """A reference to the canonical copy with the diff, or None when the diff is not shorter
+        than the content."""
+        diff = "".join(difflib.unified_diff(canonical_content.splitlines(keepends=True),
+                                            content.splitlines(keepends=True),
+                                            fromfile=reference, tofile=relative_path, n=1))
+        if len(diff) >= len(content):
+            return None
+        return (f"/* {relative_path} */\n(near duplicate of {reference}, similarity {similarity:.2f}; "
+                f"differences:)\n{diff}")
+
+    def format_groups(self, namespace=None):
+        """Returns a text section that lists, for each canonical file, the files sharing its
+        analysis (only the groups involving namespace, if given), or an empty string."""
+        with self._lock:
+            groups = sorted(self.groups.items())
+        if namespace is not None:
+            prefix = f"{namespace}/"
+            groups = [(canonical, references) for canonical, references in groups
+                      if canonical.startswith(prefix) or any(ref.startswith(prefix) for ref in references)]
+        if not groups:
+            return ""
+        lines = ["Duplicate files (the analysis of the first path applies to the others):"]
+        for canonical, references in groups:
+            lines.append(f"- {canonical}: {', '.join(references)}")
+        return "\n".join(lines) + "\n"
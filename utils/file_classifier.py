@@ -0,0 +1,80 @@
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+# Bytes sniffed from the beginning of a file to decide whether it is worth reading.
+SNIFF_SIZE = 8192
+# Minimum fraction of text bytes in the sniffed sample.
+MIN_TEXT_RATIO = 0.7
+# Average line length above which a file is considered minified.
+MAX_AVG_LINE_LENGTH = 400
+
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "uv.lock", "pdm.lock", "Cargo.lock", "composer.lock",
+    "Gemfile.lock", "go.sum", "packages.lock.json", "flake.lock",
+}
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".map", "_pb2.py", "_pb2_grpc.py", ".pb.go", ".pb.cc", ".pb.h",
+    ".g.dart", ".designer.cs", ".generated.cs",
+)
+# Lower-case markers that tools write at the top of generated files.
+GENERATED_MARKERS = (
+    b"@generated", b"do not edit", b"code generated by", b"autogenerated", b"auto-generated",
+    b"automatically generated", b"generated by the protocol buffer compiler",
+)
+# Leading lines searched for the markers; only comment lines count, so handwritten files that
+# merely mention a marker (in code, docstrings or further down) are kept.
+GENERATED_HEADER_LINES = 5
+COMMENT_PREFIXES = (b"#", b"//", b"/*", b"*", b"<!--", b"--", b";", b"%", b"'", b"rem ")
+
+_TEXT_BYTES = bytes(range(32, 127)) + b"\n\r\t\f\b" + bytes(range(128, 256))
+
+
+class FileClassifier:
+    """Cheap pre-read classification of repository files. Lockfiles, generated and oversized
+    files are detected from the name and size alone; binary, generated and minified files from
+    a sample of the first bytes. Both checks return the reason a file is skipped, or None."""
+
+    def __init__(self, max_file_size=DEFAULT_MAX_FILE_SIZE, sniff_size=SNIFF_SIZE,
+                 min_text_ratio=MIN_TEXT_RATIO, max_avg_line_length=MAX_AVG_LINE_LENGTH):
+        self.max_file_size = max_file_size
+        self.sniff_size = sniff_size
+        self.min_text_ratio = min_text_ratio
+        self.max_avg_line_length = max_avg_line_length
+
+    def classify_by_name(self, name, size):
+        """Returns the skip reason that can be decided without opening the file, or None."""
+        if name in LOCKFILE_NAMES:
+            return "lockfile"
+        if name.endswith(GENERATED_SUFFIXES):
+            return "generated file name"
+        if self.max_file_size and size > self.max_file_size:
+            return f"oversized ({size} bytes > {self.max_file_size})"
+        return None
+
+    def classify_sample(self, sample):
+        """Returns the skip reason detected in the first bytes of the file, or None."""
+        if not sample:
+            return None
+        if b"\0" in sample:
+            return "binary (NUL bytes)"
+        text_ratio = 1 - len(sample.translate(None, _TEXT_BYTES)) / len(sample)
+        if text_ratio < self.min_text_ratio:
+            return f"binary (text ratio {text_ratio:.2f})"
+        marker = self._generated_marker(sample)
+        if marker is not None:
+            return f"generated ({marker.decode()} marker)"
+        lines = sample.count(b"\n") + 1
+        if len(sample) >= self.sniff_size and len(sample) / lines > self.max_avg_line_length:
+            return "minified (long lines)"
+        return None
+
+    @staticmethod
+    def _generated_marker(sample):
+        """Returns the generated-file marker found in the leading comment lines, or None."""
+        for line in sample.lower().splitlines()[:GENERATED_HEADER_LINES]:
+            line = line.strip()
+            if not line.startswith(COMMENT_PREFIXES):
+                continue
+            for marker in GENERATED_MARKERS:
+                if marker in line:
+                    return marker
+        return None
@@ -0,0 +1,167 @@
+import re
+import ast
+import threading
+
+from utils.common import logger
+from utils.repo_content_aggregator import FILE_HEADER_RE
+
+# Answers shorter than this (after stripping whitespace) fail the default validator.
+DEFAULT_MIN_ANSWER_CHARS = 20
+
+# Decision points counted when a Python section does not parse (e.g. a chunk cut mid-statement)
+_DECISION_RE = re.compile(r"\b(?:if|elif|for|while|except|case|and|or)\b")
+# ast.parse raises MemoryError or RecursionError, not SyntaxError, on some long or deeply nested invalid sources
+_PARSE_ERRORS = (SyntaxError, ValueError, MemoryError, RecursionError)
+# match statements (ast.Match, ast.match_case) only exist on Python 3.10+
+_MATCH_CASE = (ast.match_case,) if hasattr(ast, "match_case") else ()
+_MATCH = (ast.Match,) if hasattr(ast, "Match") else ()
+_DECISION_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.With,
+                   ast.AsyncWith, ast.Assert, ast.comprehension) + _MATCH_CASE
+_NESTING_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith,
+                  ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef) + _MATCH
+
+
+def _nesting_depth(node, depth=0):
+    depth += isinstance(node, _NESTING_NODES)
+    return max([depth] + [_nesting_depth(child, depth) for child in ast.iter_child_nodes(node)])
+
+
+def python_complexity(source):
+    """Returns (complexity, nesting) of Python source: the cyclomatic complexity summed over
+    the module (1 per function plus 1 per decision point and boolean operand) and the deepest
+    nesting of blocks. Sources that do not parse are scored by counting decision keywords."""
+    try:
+        tree = ast.parse(source)
+    except _PARSE_ERRORS:
+        return len(_DECISION_RE.findall(source)), 0
+    complexity = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or isinstance(node, _DECISION_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+    return complexity, _nesting_depth(tree)
+
+
+def chunk_complexity(text):
+    """Returns (complexity, nesting) of a chunk of per-file contents ("/* relative_path */"
+    headers): the Python sections are measured with python_complexity, everything else
+    (configuration files, documentation, partial results to merge) counts as trivial."""
+    sections = FILE_HEADER_RE.split(text)
+    complexity = nesting = 0
+    # split() yields [text before the first header, path, content, path, content, ...]
+    for path, content in zip(sections[1::2], sections[2::2]):
+        if path.endswith(".py"):
+            section_complexity, section_nesting = python_complexity(content)
+            complexity += section_complexity
+            nesting = max(nesting, section_nesting)
+    return complexity, nesting
+
+
+def default_validator(min_chars=DEFAULT_MIN_ANSWER_CHARS):
+    """Returns a validator accepting answers with at least min_chars non-blank characters."""
+    return lambda answer: isinstance(answer, str) and len(answer.strip()) >= min_chars
+
+
+class ModelTier:
+    """A model of the router with the largest prompt (in tokens), total complexity and nesting
+    it is trusted with; None means no limit. max_tokens never exceeds the model's
+    max_prompt_tokens. rate_limit is the model's own `rate_limit` block, if any."""
+
+    __slots__ = ("model_name", "max_tokens", "max_complexity", "max_nesting", "rate_limit")
+
+    def __init__(self, model_name, max_tokens=None, max_complexity=None, max_nesting=None, rate_limit=None):
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.max_complexity = max_complexity
+        self.max_nesting = max_nesting
+        self.rate_limit = rate_limit
+
+    def accepts(self, tokens, complexity, nesting):
+        return ((self.max_tokens is None or tokens <= self.max_tokens)
+                and (self.max_complexity is None or complexity <= self.max_complexity)
+                and (self.max_nesting is None or nesting <= self.max_nesting))
+
+
+class ModelRouter:
+    """Routes each prompt to the first (cheapest) tier whose limits cover it, so small or trivial
+    chunks go to a fast cheap model and large or complex ones to the bigger models. Size is the
+    prompt token count, complexity the AST metrics of the Python code it contains (see
+    chunk_complexity). With cascade, an answer rejected by the validator (or a failed call) is
+    retried on the next tier; the last tier takes whatever the others did not.
+
+    Tier limits and prices come from costs.cost_map through the token manager: max_tokens is
+    capped at the model's max_prompt_tokens, and tiers listed out of price order are reported."""
+
+    def __init__(self, tiers, count_tokens, token_manager=None, cascade=True, validator=None):
+        if not tiers:
+            raise ValueError("The model router needs at least one model")
+        self.tiers = tiers
+        self.count_tokens = count_tokens
+        self.cascade = cascade
+        self.validator = validator or default_validator()
+        self._lock = threading.Lock()
+        self.routed = {tier.model_name: 0 for tier in tiers}
+        self.escalations = 0
+        if token_manager is not None:
+            self._apply_cost_map(token_manager)
+
+    @classmethod
+    def from_config(cls, routing_config, count_tokens, token_manager=None):
+        """Builds the router from the `routing` block of the YAML configuration."""
+        tiers = [ModelTier(model["model_name"], model.get("max_tokens"), model.get("max_complexity"),
+                           model.get("max_nesting"), model.get("rate_limit"))
+                 for model in routing_config.get("models") or []]
+        validator = default_validator(routing_config.get("min_answer_chars", DEFAULT_MIN_ANSWER_CHARS))
+        return cls(tiers, count_tokens, token_manager, cascade=routing_config.get("cascade", True),
+                   validator=validator)
+
+    def _apply_cost_map(self, token_manager):
+        previous = None
+        for tier in self.tiers:
+            try:
+                max_prompt_tokens, _ = token_manager.get_model_limits(tier.model_name)
+                prompt_price, completion_price = token_manager.get_model_prices(tier.model_name)
+            except ValueError:
+                logger.warning(f"ModelRouter: no limits or prices for {tier.model_name} in cost_map")
+                continue
+            tier.max_tokens = min(tier.max_tokens or max_prompt_tokens, max_prompt_tokens)
+            if previous is not None and prompt_price + completion_price < previous[1]:
+                logger.warning(f"ModelRouter: {tier.model_name} is cheaper than {previous[0]}, which comes "
+                               f"before it; tiers should go from the cheapest to the most expensive model")
+            previous = (tier.model_name, prompt_price + completion_price)
+
+    def route(self, system_prompt, user_prompt):
+        """Returns the index of the tier for the prompt."""
+        tokens = self.count_tokens(self.tiers[0].model_name, (system_prompt or "") + user_prompt)
+        complexity, nesting = chunk_complexity(user_prompt)
+        last = len(self.tiers) - 1
+        index = next((index for index, tier in enumerate(self.tiers[:last])
+                      if tier.accepts(tokens, complexity, nesting)), last)
+        with self._lock:
+            self.routed[self.tiers[index].model_name] += 1
+        return index
+
+    def escalate(self, index, answer):
+        """Returns the tier to retry on if answer (a text or an exception) fails the validator
+        and a bigger tier is left, otherwise None."""
+        if not self.cascade or index >= len(self.tiers) - 1:
+            return None
+        if not isinstance(answer, Exception) and self.validator(answer):
+            return None
+        with self._lock:
+            self.escalations += 1
+            self.routed[self.tiers[index + 1].model_name] += 1
+        return index + 1
+
+    def model_name(self, index):
+        return self.tiers[index].model_name
+
+    def rate_limit(self, model_name):
+        """Returns the `rate_limit` block of the tier serving model_name, or None."""
+        return next((tier.rate_limit for tier in self.tiers if tier.model_name == model_name), None)
+
+    def stats(self):
+        """Returns the calls sent to each model (escalations included) and the escalation count."""
+        with self._lock:
+            return {"routed": dict(self.routed), "escalations": self.escalations}
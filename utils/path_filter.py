@@ -0,0 +1,205 @@
+import os
+import re
+
+from utils.common import logger
+
+_GLOB_CHARS = re.compile(r"[*?\[\\]")
+
+
+class _Rule:
+    """A single gitignore-style pattern. kind is "name" (exact basename), "suffix" (basename
+    ending, e.g. "*.log") or "regex" (any other glob, matched against the relative path)."""
+
+    __slots__ = ("kind", "value", "negated", "dir_only")
+
+    def __init__(self, kind, value, negated, dir_only):
+        self.kind = kind
+        self.value = value
+        self.negated = negated
+        self.dir_only = dir_only
+
+    def matches(self, relative_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.kind == "name":
+            return name == self.value
+        if self.kind == "suffix":
+            return name.endswith(self.value)
+        return self.value.match(relative_path) is not None
+
+
+def _translate_glob(pattern):
+    """Translates a gitignore glob to a regex fragment: "*" and "?" never match "/", "**" matches
+    across directories."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            content = pattern[i + 1:end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            out.append(f"[{content}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def parse_pattern(line):
+    """Parses a gitignore line into a _Rule, or returns None for blank lines and comments."""
+    line = line.rstrip("\r\n")
+    if not line.strip() or line.startswith("#"):
+        return None
+    pattern = line.rstrip(" ")
+    # Trailing spaces are ignored unless escaped with a backslash
+    if pattern.endswith("\\") and len(line) > len(pattern):
+        pattern += " "
+
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith(("\\!", "\\#")):
+        pattern = pattern[1:]
+
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+
+    # A slash at the beginning or in the middle anchors the pattern to its .gitignore directory
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if not anchored and not _GLOB_CHARS.search(pattern):
+        return _Rule("name", pattern, negated, dir_only)
+    if not anchored and pattern.startswith("*") and not _GLOB_CHARS.search(pattern[1:]):
+        return _Rule("suffix", pattern[1:], negated, dir_only)
+    regex = ("" if anchored else "(?:.*/)?") + _translate_glob(pattern)
+    return _Rule("regex", re.compile(f"(?:{regex})\\Z", re.DOTALL), negated, dir_only)
+
+
+class GitignoreRules:
+    """The compiled patterns of one .gitignore file (or of the configured exclusions), scoped to
+    the directory base (relative to the repository root, "" for the root).
+
+    Without negations every pattern excludes, so names and suffixes are looked up in a set and a
+    tuple for str.endswith, and the remaining globs are joined into a single regex. With
+    negations the rules are evaluated in order and the last matching one wins, as in git."""
+
+    def __init__(self, patterns, base=""):
+        self.base = base
+        self.rules = [rule for rule in map(parse_pattern, patterns) if rule is not None]
+        self.has_negations = any(rule.negated for rule in self.rules)
+        if not self.has_negations:
+            self._names = {rule.value for rule in self.rules if rule.kind == "name" and not rule.dir_only}
+            self._dir_names = {rule.value for rule in self.rules if rule.kind == "name" and rule.dir_only}
+            self._suffixes = tuple(rule.value for rule in self.rules if rule.kind == "suffix" and not rule.dir_only)
+            self._dir_suffixes = tuple(rule.value for rule in self.rules if rule.kind == "suffix" and rule.dir_only)
+            self._regex = self._combine([rule for rule in self.rules if rule.kind == "regex" and not rule.dir_only])
+            self._dir_regex = self._combine([rule for rule in self.rules if rule.kind == "regex" and rule.dir_only])
+
+    @staticmethod
+    def _combine(rules):
+        if not rules:
+            return None
+        return re.compile("|".join(f"(?:{rule.value.pattern})" for rule in rules), re.DOTALL)
+
+    @classmethod
+    def from_file(cls, path, base=""):
+        """Loads the rules of a .gitignore file; an unreadable file yields no rules."""
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                return cls(f.readlines(), base)
+        except OSError as e:
+            logger.error(f"Error reading '{path}': {e}")
+            return cls([], base)
+
+    def match(self, relative_path, name, is_dir):
+        """Returns True if the path is excluded, False if a negation re-includes it, None if no
+        rule matches. relative_path is relative to base and uses "/" as separator."""
+        if self.has_negations:
+            for rule in reversed(self.rules):
+                if rule.matches(relative_path, name, is_dir):
+                    return not rule.negated
+            return None
+
+        if name in self._names or name.endswith(self._suffixes):
+            return True
+        if self._regex is not None and self._regex.match(relative_path):
+            return True
+        if is_dir:
+            if name in self._dir_names or name.endswith(self._dir_suffixes):
+                return True
+            if self._dir_regex is not None and self._dir_regex.match(relative_path):
+                return True
+        return None
+
+
+class PathFilter:
+    """Decides which files and directories of a repository are skipped, combining the configured
+    exclusions with the .gitignore files found while walking. Excluded directories are pruned,
+    so nothing below them is listed or opened."""
+
+    def __init__(self, patterns=(), use_gitignore=True):
+        self.root_rules = GitignoreRules(patterns)
+        self.use_gitignore = use_gitignore
+
+    @classmethod
+    def from_exclusions(cls, excluded_dirs=(), excluded_files=(), excluded_extensions=(), use_gitignore=True):
+        """Compiles the exclusions of config.json:
+        - excluded_dirs: directory names (or globs) skipped at any depth;
+        - excluded_files: file names, gitignore-style globs and negations ("!keep.json"); an entry
+          starting with a dot such as ".json" matches both the name and the extension;
+        - excluded_extensions: extensions such as ".pyc"."""
+        patterns = [f"{name.rstrip('/')}/" for name in excluded_dirs]
+        for entry in excluded_files:
+            patterns.append(entry)
+            if entry.startswith(".") and not _GLOB_CHARS.search(entry) and "/" not in entry:
+                patterns.append(f"*{entry}")
+        patterns.extend(f"*{extension}" for extension in excluded_extensions)
+        return cls(patterns, use_gitignore)
+
+    def initial_rules(self):
+        """Rules that apply at the repository root."""
+        return (self.root_rules,)
+
+    def rules_for_directory(self, dir_path, relative_dir, parent_rules, has_gitignore):
+        """Returns the rules for the entries of a directory: the parent's ones plus its .gitignore."""
+        if self.use_gitignore and has_gitignore:
+            return parent_rules + (GitignoreRules.from_file(os.path.join(dir_path, ".gitignore"), relative_dir),)
+        return parent_rules
+
+    def is_excluded(self, relative_path, name, is_dir, rules):
+        """True if the entry at relative_path ("/"-separated, relative to the repository root) is excluded.
+        The deepest .gitignore with a matching rule decides."""
+        if is_dir and self.use_gitignore and name == ".git":
+            return True
+        for ruleset in reversed(rules):
+            path = relative_path[len(ruleset.base) + 1:] if ruleset.base else relative_path
+            result = ruleset.match(path, name, is_dir)
+            if result is not None:
+                return result
+        return False
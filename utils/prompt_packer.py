@@ -0,0 +1,78 @@
+from utils.common import logger
+from utils.repo_content_aggregator import split_file_header
+
+# Fraction of the prompt budget kept free to absorb tokenizer differences between providers.
+DEFAULT_SAFETY_MARGIN = 0.05
+
+
+class PromptPacker:
+    """Bin-packs the per-file contents produced by RepositoryContentAggregator into as few
+    prompts as possible under the token budget of the target model.
+
+    The budget is the model's max_prompt_tokens (from costs.cost_map) minus the tokens of the
+    system prompt and of the fixed part of the user prompt, minus the tokens reserved for the
+    completion and a safety margin. A file is split only when it alone exceeds the budget."""
+
+    def __init__(self, token_manager, model_name, system_prompt="", prompt_overhead="",
+                 max_completion_tokens=None, safety_margin=DEFAULT_SAFETY_MARGIN):
+        self.token_manager = token_manager
+        self.model_name = model_name
+
+        max_prompt_tokens, max_output_tokens = token_manager.get_model_limits(model_name)
+        completion_reserve = min(max_completion_tokens or max_output_tokens, max_output_tokens)
+        fixed_tokens = sum(token_manager.count_tokens_many(model_name, [system_prompt or "", prompt_overhead or ""]))
+        self.budget = int((max_prompt_tokens - completion_reserve - fixed_tokens) * (1 - safety_margin))
+        if self.budget <= 0:
+            raise ValueError(f"No token budget left for the content with model {model_name}: "
+                             f"the system prompt and completion reserve exceed max_prompt_tokens")
+
+    def pack(self, file_contents):
+        """Packs file_contents (strings starting with the "/* relative_path */" header) with
+        first-fit decreasing. Returns a list of prompts, each a list of file contents that
+        fits the budget; files keep their original relative order inside each prompt."""
+        items = []
+        counts = self.token_manager.count_tokens_many(self.model_name, list(file_contents))
+        for index, (content, tokens) in enumerate(zip(file_contents, counts)):
+            if tokens <= self.budget:
+                items.append((tokens, index, content))
+            else:
+                for part, part_tokens in self._split(content):
+                    items.append((part_tokens, index, part))
+
+        # One extra token per file for the newline used to join them
+        bins = []
+        for tokens, index, content in sorted(items, key=lambda item: item[0], reverse=True):
+            for packed in bins:
+                if packed[0] + tokens + 1 <= self.budget:
+                    packed[0] += tokens + 1
+                    packed[1].append((index, content))
+                    break
+            else:
+                bins.append([tokens + 1, [(index, content)]])
+
+        logger.info(f"PromptPacker: {len(items)} files packed into {len(bins)} prompts "
+                    f"(budget {self.budget} tokens each)")
+        return [[content for _, content in sorted(packed[1], key=lambda item: item[0])]
+                for packed in sorted(bins, key=lambda packed: min(index for index, _ in packed[1]))]
+
+    def _split(self, content):
+        """Splits a file larger than the budget into parts that fit, repeating the header
+        (with the part number) on each of them. Returns a list of (part, tokens)."""
+        relative_path, body = split_file_header(content)
+
+        # Room for the "/* path (part i/n) */" header of each part
+        header_tokens = self.token_manager.count_tokens(self.model_name, f"/* {relative_path} (part 000/000) */\n")
+        pieces = self._split_text(body, self.budget - header_tokens)
+        parts = [f"/* {relative_path} (part {i}/{len(pieces)}) */\n{piece}" if relative_path else piece
+                 for i, piece in enumerate(pieces, 1)]
+        return list(zip(parts, self.token_manager.count_tokens_many(self.model_name, parts)))
+
+    def _split_text(self, text, budget):
+        """Recursively halves text, preferably at a line boundary, until every piece fits budget."""
+        if len(text) <= 1 or self.token_manager.count_tokens(self.model_name, text) <= budget:
+            return [text]
+        middle = len(text) // 2
+        cut = text.rfind("\n", 0, middle) + 1 or text.find("\n", middle) + 1 or middle
+        if cut >= len(text):
+            cut = middle
+        return self._split_text(text[:cut], budget) + self._split_text(text[cut:], budget)
@@ -0,0 +1,216 @@
+import ast
+import bisect
+
+from utils.common import logger
+from utils.repo_content_aggregator import split_file_header
+
+
+class _Unit:
+    """A contiguous block of source lines (a function, a class or a run of other statements)
+    with the names it references, used to pick the imports it needs, and the offsets of the
+    lines where a statement starts, where it can be cut if it is larger than a chunk."""
+
+    __slots__ = ("lines", "text", "names", "breaks", "context")
+
+    def __init__(self, lines, first_line, nodes, context=""):
+        self.lines = lines
+        self.text = "".join(lines)
+        self.names = _used_names(nodes)
+        self.breaks = sorted({child.lineno - 1 - first_line for node in nodes for child in ast.walk(node)
+                              if isinstance(child, ast.stmt) and child.lineno - 1 > first_line})
+        # Enclosing class signature ("class Foo(Base):") for methods split out of their class
+        self.context = context
+
+
+def _start_line(node):
+    return min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+
+
+def _used_names(nodes):
+    names = set()
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                names.add(child.id)
+    return names
+
+
+def _import_names(node):
+    """Names bound by an import statement; "*" for a star import."""
+    return {alias.asname or alias.name.split(".")[0] for alias in node.names}
+
+
+def _needed_imports(imports, names):
+    """Source of the imports (as (bound_names, text)) that bind one of names."""
+    return "".join(text for bound, text in imports if "*" in bound or bound & names)
+
+
+class PythonChunker:
+    """Splits the per-file contents produced by RepositoryContentAggregator into chunks of about
+    chunk_size characters, cutting Python sources at module, class and function boundaries.
+
+    Each chunk of a Python file repeats the "/* relative_path */" header and the module-level
+    imports whose names it uses; methods split out of a large class also carry the class
+    signature. Files that fit in a chunk are kept whole, and consecutive small chunks are merged,
+    so boundaries depend only on the code structure and unchanged files yield the same chunks
+    across runs. Other files and sources that do not parse go to fallback_split (a function
+    text -> list of chunks, e.g. the langchain splitter of the agents)."""
+
+    def __init__(self, chunk_size, fallback_split):
+        self.chunk_size = chunk_size
+        self.fallback_split = fallback_split
+
+    def split(self, file_contents):
+        """Returns the chunks of file_contents, in order. Runs of non-Python files are joined
+        with "\\n" and passed to fallback_split, as the agents did for the whole content."""
+        chunks = []
+        others = []
+        for content in file_contents:
+            relative_path, body = split_file_header(content)
+            python_chunks = None
+            if relative_path and relative_path.endswith(".py"):
+                python_chunks = self.split_python(relative_path, body)
+            if python_chunks is None:
+                others.append(content)
+                continue
+            if others:
+                chunks.extend(self.fallback_split("\n".join(others)))
+                others = []
+            chunks.extend(python_chunks)
+        if others:
+            chunks.extend(self.fallback_split("\n".join(others)))
+        return self._merge(chunks)
+
+    def split_python(self, relative_path, source):
+        """Returns the chunks of one Python file, or None if it does not parse."""
+        header = f"/* {relative_path} */\n"
+        if len(header) + len(source) <= self.chunk_size:
+            return [header + source]
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError, MemoryError, RecursionError) as e:
+            # MemoryError and RecursionError: some long or deeply nested invalid sources
+            logger.info(f"PythonChunker: {relative_path} does not parse, using the fallback splitter: {e}")
+            return None
+
+        lines = source.splitlines(keepends=True)
+        imports = [(_import_names(node), "".join(lines[node.lineno - 1:node.end_lineno]))
+                   for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        units = self._units(tree.body, lines, 0, len(lines))
+        if not units:
+            return None
+
+        chunks = []
+        for group in self._group(units, header, imports):
+            chunks.extend(self._render(group, header, imports))
+        return chunks
+
+    def _render(self, group, header, imports):
+        """Returns the chunks of a group of units: the header, the imports they use, the class
+        signature and their source."""
+        names = set().union(*(unit.names for unit in group))
+        prefix = header + _needed_imports(imports, names) + group[0].context
+        body = "".join(unit.text for unit in group)
+        if len(prefix) + len(body) <= self.chunk_size:
+            return [prefix + body]
+        # A single function larger than a chunk: split it between statements, keeping the context
+        return [prefix + piece for piece in self._split_unit(group[0], self.chunk_size - len(prefix))]
+
+    @staticmethod
+    def _split_unit(unit, budget):
+        """Splits the lines of unit into pieces of at most budget characters, cutting before the
+        last statement that starts in each piece (or at a line boundary if there is none)."""
+        budget = max(budget, 1)
+        pieces = []
+        start, size = 0, 0
+        for index, line in enumerate(unit.lines):
+            if size + len(line) > budget and index > start:
+                position = bisect.bisect_right(unit.breaks, index) - 1
+                cut = unit.breaks[position] if position >= 0 and unit.breaks[position] > start else index
+                pieces.append("".join(unit.lines[start:cut]))
+                start = cut
+                size = sum(map(len, unit.lines[start:index]))
+            size += len(line)
+        pieces.append("".join(unit.lines[start:]))
+        # Lines longer than the budget are cut anywhere
+        return [piece[i:i + budget] for piece in pieces for i in range(0, len(piece), budget)]
+
+    def _units(self, body, lines, first_line, last_line, context=""):
+        """Splits the statements of a module or class body (lines first_line+1..last_line) into
+        units. Comments and blank lines before a statement belong to it; imports are dropped,
+        they are attached to the chunks that need them."""
+        units = []
+        pending_start, pending_end, pending_nodes = None, None, []
+        previous_end = first_line
+
+        def flush():
+            if pending_nodes:
+                units.append(_Unit(lines[pending_start:pending_end], pending_start, list(pending_nodes), context))
+                pending_nodes.clear()
+
+        for index, node in enumerate(body):
+            start = previous_end
+            end = node.end_lineno if index < len(body) - 1 else last_line
+            previous_end = end
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and not context:
+                flush()
+                continue
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                flush()
+                if (isinstance(node, ast.ClassDef) and not context
+                        and sum(map(len, lines[start:end])) > self.chunk_size
+                        and node.body[0].lineno > node.lineno):
+                    units.extend(self._class_units(node, lines, start, end))
+                else:
+                    units.append(_Unit(lines[start:end], start, [node], context))
+            else:
+                # Consecutive module-level statements (constants, main guard, ...) stay together
+                if not pending_nodes:
+                    pending_start = start
+                pending_end = end
+                pending_nodes.append(node)
+        flush()
+        return units
+
+    def _class_units(self, node, lines, first_line, last_line):
+        """Splits a class larger than a chunk into units of its body, each carrying the class
+        signature (decorators, bases and the line with the colon) as context."""
+        # The docstring is a unit of the body, so it is not repeated on every chunk
+        signature_start = _start_line(node) - 1
+        signature_end = node.body[0].lineno - 1
+        context = "".join(lines[signature_start:signature_end])
+        signature_names = _used_names(node.bases + node.keywords + node.decorator_list)
+        units = self._units(node.body, lines, signature_end, last_line, context)
+        for unit in units:
+            unit.names |= signature_names
+        # Comments before the class stay at module level (blank lines alone would be a chunk of whitespace)
+        comments = lines[first_line:signature_start]
+        return ([_Unit(comments, first_line, [])] if "".join(comments).strip() else []) + units
+
+    def _group(self, units, header, imports):
+        """Groups consecutive units with the same context into runs that fit a chunk, counting
+        the imports each run needs."""
+        groups = []
+        names = set()
+        for unit in units:
+            if groups and groups[-1][0].context == unit.context:
+                candidate_names = names | unit.names
+                size = (len(header) + len(unit.context) + len(_needed_imports(imports, candidate_names))
+                        + sum(len(grouped.text) for grouped in groups[-1]) + len(unit.text))
+                if size <= self.chunk_size:
+                    groups[-1].append(unit)
+                    names = candidate_names
+                    continue
+            groups.append([unit])
+            names = set(unit.names)
+        return groups
+
+    def _merge(self, chunks):
+        """Joins consecutive chunks while they fit in chunk_size (with the "\\n" separator)."""
+        merged = []
+        for chunk in chunks:
+            if merged and len(merged[-1]) + 1 + len(chunk) <= self.chunk_size:
+                merged[-1] += "\n" + chunk
+            else:
+                merged.append(chunk)
+        return merged
@@ -1,12 +1,49 @@
+import io
 import os
+import re
 import json
+import mmap
+import hashlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.common import write_json_file, logger
+from utils.path_filter import PathFilter
+from utils.file_classifier import FileClassifier, DEFAULT_MAX_FILE_SIZE
+from utils.tracing import span
+
+# Same default as ThreadPoolExecutor: reading files is I/O bound.
+DEFAULT_READ_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Files read ahead of the consumer for each worker: bounds the memory held by pending results.
+READ_AHEAD_PER_WORKER = 4
+# Blank lines (only ASCII whitespace) matched directly on the mapped bytes: the newline that
+# precedes each of them, so the pattern starts with a literal the regex engine scans for quickly,
+# and the ones at the start of a window.
+BLANK_LINES_RE = re.compile(rb"\n[ \t\r\f\v]*(?=\n)")
+LEADING_BLANK_LINES_RE = re.compile(rb"(?:[ \t\r\f\v]*\n)*")
+# Bytes of a mapped file filtered at once by the zero-copy reader.
+STREAM_WINDOW_SIZE = 1024 * 1024
+# Relative path comment preceding each file of the aggregated content (see _format_file_content).
+FILE_HEADER_RE = re.compile(r"/\* (.+?) \*/\n")
+
+
+def split_file_header(record):
+    """Returns (relative_path, content) of a record built by _format_file_content, or
+    (None, record) when it does not start with a relative path comment."""
+    match = FILE_HEADER_RE.match(record)
+    if match is None:
+        return None, record
+    return match.group(1), record[match.end():]
 
 
 class RepositoryContentAggregator:
     """Aggregates the content of files in a repository, excluding specified directories, files, and extensions.
     Each useful file is preceded by a comment with the relative path."""
 
-    def __init__(self, repo_path, excluded_dirs=None, excluded_files=None, prompt_description=None):
+    def __init__(self, repo_path, excluded_dirs=None, excluded_files=None, prompt_description=None,
+                 manifest_path=None, max_workers=DEFAULT_READ_WORKERS, use_gitignore=True,
+                 max_file_size=DEFAULT_MAX_FILE_SIZE, deduplicator=None, namespace=""):
         self.repo_path = repo_path
         self.excluded_dirs = excluded_dirs if excluded_dirs is not None else []
         self.excluded_files = excluded_files if excluded_files is not None else []
@@ -16,42 +53,312 @@ class RepositoryContentAggregator:
             "The code is structured as follows:\n"
             "- The content of each file is preceded by a comment indicating the relative path of the file.\n"
         )
+        # Incremental mode: fingerprints of the files seen in the previous run.
+        self.manifest_path = manifest_path
+        self.changes = {"added": [], "modified": [], "deleted": []}
+        self._pending_manifest = None
+        self.max_workers = max_workers
+        # Exclusions compiled once; .gitignore files are honored while walking.
+        self.path_filter = PathFilter.from_exclusions(self.excluded_dirs, self.excluded_files,
+                                                      self.excluded_extensions, use_gitignore=use_gitignore)
+        # Binary, generated and oversized files are skipped before being read;
+        # (relative_path, reason) of each skipped file is collected in self.skipped.
+        self.classifier = FileClassifier(max_file_size=max_file_size)
+        self.skipped = []
+        # Optional ContentDeduplicator (possibly shared by the repositories of a batch, each
+        # with its own namespace): duplicate files are replaced by references.
+        self.deduplicator = deduplicator
+        self.namespace = namespace
+
+    def _iter_useful_files(self, ordered=False):
+        """Walks recursively through the repository with os.scandir and yields the path of each
+        useful file. With ordered=True entries are visited by name, in the same top-down order
+        as os.walk, so the output is deterministic across runs and filesystems.
+        Excluded directories are pruned before being listed."""
+        path_filter = self.path_filter
+        stack = [(self.repo_path, "", path_filter.initial_rules())]
+        while stack:
+            root, relative_root, parent_rules = stack.pop()
+            try:
+                with os.scandir(root) as it:
+                    entries = list(it)
+            except OSError:
+                # Skip directories that cannot be listed, like os.walk does
+                continue
+            if ordered:
+                entries.sort(key=lambda entry: entry.name)
+            rules = path_filter.rules_for_directory(
+                root, relative_root, parent_rules, any(entry.name == ".gitignore" for entry in entries))
+
+            subdirs = []
+            for entry in entries:
+                relative_path = f"{relative_root}/{entry.name}" if relative_root else entry.name
+                try:
+                    if entry.is_dir():
+                        # Exclude specified directories and do not follow symlinks
+                        if not entry.is_symlink() and not path_filter.is_excluded(relative_path, entry.name, True, rules):
+                            subdirs.append((entry.path, relative_path, rules))
+                    elif entry.is_file() and not path_filter.is_excluded(relative_path, entry.name, False, rules):
+                        yield entry.path
+                except OSError:
+                    continue
+            stack.extend(reversed(subdirs))
+
+    def _iter_pool_results(self, func, file_paths, ordered=False):
+        """Runs func on every path in a thread pool and yields the non-None results.
+        At most max_workers * READ_AHEAD_PER_WORKER results are pending at any time, so memory
+        stays bounded however large the repository is. With ordered=True results follow the
+        order of file_paths, otherwise they are yielded as soon as they are ready."""
+        max_pending = max(1, self.max_workers) * READ_AHEAD_PER_WORKER
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            if ordered:
+                pending = deque()
+                for file_path in file_paths:
+                    pending.append(executor.submit(func, file_path))
+                    if len(pending) >= max_pending:
+                        result = pending.popleft().result()
+                        if result is not None:
+                            yield result
+                while pending:
+                    result = pending.popleft().result()
+                    if result is not None:
+                        yield result
+            else:
+                pending = set()
+                for file_path in file_paths:
+                    pending.add(executor.submit(func, file_path))
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            if future.result() is not None:
+                                yield future.result()
+                for future in pending:
+                    if future.result() is not None:
+                        yield future.result()
+
+    def _skip(self, relative_path, reason):
+        self.skipped.append((relative_path, reason))
+        return None
 
-    def _is_useful_file(self, filename):
-        # Exclude files that belong to specified directories
-        if any(part in self.excluded_dirs for part in filename.split(os.sep)):
-            return False
-            # Exclude specific files
-        if os.path.basename(filename) in self.excluded_files:
-            return False
-            # Exclude files with certain extensions
-        if any(filename.endswith(ext) for ext in self.excluded_extensions):
-            return False
-        return True
+    def _read_file(self, file_path):
+        """Returns (relative_path, content) with empty lines removed, or None if the file cannot be read
+        or is classified as not worth reading (see FileClassifier)."""
+        relative_path = os.path.relpath(file_path, self.repo_path)
+        try:
+            reason = self.classifier.classify_by_name(os.path.basename(file_path), os.path.getsize(file_path))
+            if reason:
+                return self._skip(relative_path, reason)
+            with open(file_path, 'rb') as raw:
+                reason = self.classifier.classify_sample(raw.read(self.classifier.sniff_size))
+                if reason:
+                    return self._skip(relative_path, reason)
+                raw.seek(0)
+                with io.TextIOWrapper(raw, encoding='utf-8', errors='ignore') as f:
+                    content = ''.join(line for line in f if line.strip())
+        except Exception:
+            # Skip files that cause errors when opening
+            return self._skip(relative_path, "unreadable")
+        return relative_path, content
+
+    def iter_files_content(self, ordered=False):
+        """Streams (relative_path, content) records of the useful files, read in parallel by
+        max_workers threads. With ordered=True records come in deterministic walk order."""
+        self.skipped = []
+        return self._iter_pool_results(self._read_file, self._iter_useful_files(ordered), ordered)
+
+    def _map_file(self, file_path):
+        """Returns (relative_path, mapping) for the zero-copy reader, where mapping is a read-only
+        mmap of the file (None for an empty file), or None if the file is skipped."""
+        relative_path = os.path.relpath(file_path, self.repo_path)
+        try:
+            size = os.path.getsize(file_path)
+            reason = self.classifier.classify_by_name(os.path.basename(file_path), size)
+            if reason:
+                return self._skip(relative_path, reason)
+            if size == 0:
+                return relative_path, None
+            with open(file_path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            # Skip files that cause errors when opening
+            return self._skip(relative_path, "unreadable")
+        reason = self.classifier.classify_sample(mapping[:self.classifier.sniff_size])
+        if reason:
+            mapping.close()
+            return self._skip(relative_path, reason)
+        return relative_path, mapping
+
+    def write_files_content(self, output_file):
+        """Zero-copy variant of gather_files_content: streams the same records (path comment
+        followed by the content without empty lines) into output_file, a binary file object such
+        as an open file, a tempfile or an io.BytesIO buffer. Files are memory-mapped and blank
+        lines are removed by a single regex pass over windows of STREAM_WINDOW_SIZE bytes, so no
+        per-line strings are created and memory does not grow with the file or repository size.
+        Unlike the text reader, bytes are copied as they are (line endings are not translated and
+        invalid UTF-8 is not dropped) and only ASCII whitespace makes a line blank.
+        Returns the number of files written."""
+        files_written = 0
+        for relative_path, mapping in self.iter_mapped_files():
+            output_file.write(f"/* {relative_path} */\n".encode('utf-8'))
+            if mapping is not None:
+                with mapping, memoryview(mapping) as view:
+                    size = len(mapping)
+                    # A last line without newline made only of whitespace is blank too
+                    last_line = mapping.rfind(b"\n") + 1
+                    if not mapping[last_line:].strip():
+                        size = last_line
+                    start = 0
+                    while start < size:
+                        end = size
+                        if start + STREAM_WINDOW_SIZE < size:
+                            # Windows end on a line boundary, so a blank line never straddles two of them
+                            end = mapping.rfind(b"\n", start, start + STREAM_WINDOW_SIZE) + 1
+                            if end == 0:
+                                end = mapping.find(b"\n", start + STREAM_WINDOW_SIZE) + 1 or size
+                        start = LEADING_BLANK_LINES_RE.match(mapping, start, end).end()
+                        if start < end:
+                            output_file.write(BLANK_LINES_RE.sub(b"", view[start:end]))
+                        start = end
+            files_written += 1
+        self._log_skipped()
+        return files_written
+
+    def iter_mapped_files(self):
+        """Streams (relative_path, mapping) of the useful files in walk order; mappings are opened
+        by max_workers threads and must be closed by the consumer."""
+        self.skipped = []
+        return self._iter_pool_results(self._map_file, self._iter_useful_files(ordered=True), ordered=True)
+
+    def aggregate_to_file(self, output_path):
+        """Writes the prompt description followed by the aggregated content to output_path with
+        the zero-copy reader; same output as write_combined_content_to_file(gather_files_content()),
+        without deduplication."""
+        with span("aggregator.aggregate_to_file") as current, open(output_path, 'wb') as output_file:
+            output_file.write((self.prompt_description + "\n").encode('utf-8'))
+            files_written = self.write_files_content(output_file)
+            current.set(num_bytes=output_file.tell())
+            return files_written
+
+    @staticmethod
+    def _format_file_content(relative_path, content):
+        """Returns the file content preceded by the relative path comment."""
+        return f"/* {relative_path} */\n" + content
 
     def gather_files_content(self):
         """Walks recursively through the repository and gathers the content of useful files,
         adding a comment with the relative path for each file. Returns a list of strings to write to the output file."""
+        combined_content = [self._format_file_content(relative_path, content)
+                            for relative_path, content in self.iter_files_content(ordered=True)]
+        self._log_skipped()
+        return self._deduplicate(combined_content)
+
+    def _deduplicate(self, combined_content):
+        if self.deduplicator is None:
+            return combined_content
+        return self.deduplicator.dedupe(combined_content, namespace=self.namespace)
+
+    def _log_skipped(self):
+        if self.skipped:
+            self.skipped.sort()
+            logger.info(f"Skipped {len(self.skipped)} files: " +
+                        ", ".join(f"{path} ({reason})" for path, reason in self.skipped))
+
+    def load_manifest(self):
+        """Returns the manifest saved by the previous incremental run, as {relative_path: fingerprint}."""
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            logger.error(f"Invalid manifest '{self.manifest_path}', running a full aggregation: {e}")
+            return {}
+        if manifest.get("repo_path") != os.path.abspath(self.repo_path):
+            return {}
+        return manifest.get("files", {})
+
+    def gather_changed_files_content(self):
+        """Incremental variant of gather_files_content: only files added or modified since the
+        previous run are read and returned. A file whose size and mtime_ns match the manifest is
+        considered unchanged without opening it; otherwise its content hash decides.
+        The added/modified/deleted relative paths are stored in self.changes, and the new
+        manifest is kept in memory until save_manifest() is called."""
+        if not self.manifest_path:
+            raise ValueError("Incremental aggregation requires a manifest_path")
+
+        previous = self.load_manifest()
+        self.skipped = []
+        manifest = {}
+        changes = {"added": [], "modified": [], "deleted": []}
         combined_content = []
-        for root, dirs, files in os.walk(self.repo_path):
-            # Exclude specified directories
-            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
-            for file in files:
-                file_path = os.path.join(root, file)
-                if self._is_useful_file(file_path):
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            file_lines = f.readlines()
-                    except Exception as e:
-                        # Skip files that cause errors when opening
-                        continue
-
-                    relative_path = os.path.relpath(file_path, self.repo_path)
-                    # Remove empty lines
-                    non_empty_lines = [line for line in file_lines if line.strip()]
-                    file_content = f"/* {relative_path} */\n" + ''.join(non_empty_lines)
-                    combined_content.append(file_content)
-        return combined_content
+
+        def read_if_changed(file_path):
+            relative_path = os.path.relpath(file_path, self.repo_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return None
+
+            fingerprint = previous.get(relative_path)
+            if (fingerprint is not None and fingerprint["size"] == stat.st_size
+                    and fingerprint["mtime_ns"] == stat.st_mtime_ns):
+                return relative_path, fingerprint, None, None
+
+            reason = self.classifier.classify_by_name(os.path.basename(file_path), stat.st_size)
+            if reason:
+                self._skip(relative_path, reason)
+                return relative_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": None}, None, None
+
+            try:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+            except Exception:
+                # Skip files that cause errors when opening; a file analyzed by a previous run
+                # keeps its fingerprint, so that it is not reported as deleted
+                self._skip(relative_path, "unreadable")
+                return (relative_path, fingerprint, None, None) if fingerprint is not None else None
+
+            content_hash = hashlib.sha256(data).hexdigest()
+            new_fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+            if fingerprint is not None and fingerprint["sha256"] == content_hash:
+                # Touched but not modified
+                return relative_path, new_fingerprint, None, None
+
+            reason = self.classifier.classify_sample(data[:self.classifier.sniff_size])
+            if reason:
+                self._skip(relative_path, reason)
+                return relative_path, new_fingerprint, None, None
+
+            content = ''.join(line for line in data.decode('utf-8', errors='ignore').splitlines(keepends=True)
+                              if line.strip())
+            return relative_path, new_fingerprint, "added" if fingerprint is None else "modified", content
+
+        for relative_path, fingerprint, change, content in self._iter_pool_results(
+                read_if_changed, self._iter_useful_files(ordered=True), ordered=True):
+            manifest[relative_path] = fingerprint
+            if change is not None:
+                changes[change].append(relative_path)
+                combined_content.append(self._format_file_content(relative_path, content))
+
+        self._log_skipped()
+        changes["deleted"] = sorted(set(previous) - set(manifest))
+        self.changes = changes
+        self._pending_manifest = manifest
+        logger.info(f"Incremental aggregation: {len(changes['added'])} added, "
+                    f"{len(changes['modified'])} modified, {len(changes['deleted'])} deleted")
+        return self._deduplicate(combined_content)
+
+    def save_manifest(self):
+        """Persists the manifest computed by the last incremental run. Call it once the changed
+        files have been processed, so that a failed run analyzes them again."""
+        if self._pending_manifest is None:
+            return None
+        write_json_file(self.manifest_path, {
+            "repo_path": os.path.abspath(self.repo_path),
+            "files": self._pending_manifest
+        })
+        self._pending_manifest = None
+        return self.manifest_path
 
     def write_combined_content_to_file(self, output_path, combined_content):
         """Writes the prompt description followed by the aggregated content to output_path."""
@@ -59,13 +366,14 @@ class RepositoryContentAggregator:
             output_file.write(self.prompt_description + "\n")
             output_file.write(''.join(combined_content))
 
-    def aggregate(self):
-        """Collects the useful content from the repository and writes it to a file."""
-        content = self.gather_files_content()
+    def aggregate(self, incremental=False):
+        """Collects the useful content from the repository and writes it to a file.
+        With incremental=True only the files changed since the previous run are collected."""
+        with span("aggregator.aggregate", incremental=incremental) as current:
+            if incremental:
+                content = self.gather_changed_files_content()
+            else:
+                content = self.gather_files_content()
+            current.set(num_bytes=sum(map(len, content)))
 
         return content
-
-
-
-
-
@@ -0,0 +1,214 @@
+import time
+import random
+import asyncio
+import threading
+
+from email.utils import parsedate_to_datetime
+
+from utils.common import logger
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# HTTP status codes worth retrying: throttling and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Error codes returned by botocore for throttling and transient Bedrock errors.
+RETRYABLE_AWS_ERROR_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+    "ModelNotReadyException", "InternalServerException", "RequestTimeout",
+}
+# Exception class names of connection errors raised by the SDKs (openai, anthropic, botocore).
+RETRYABLE_EXCEPTION_NAMES = {
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError", "OverloadedError",
+    "EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity units per minute.
+    reserve() books the units immediately and returns how long the caller has to wait
+    before using them, so callers are served in arrival order and wait outside the lock."""
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Books amount units and returns the seconds to wait before they are available.
+        Requests larger than the capacity are clamped to it, so they wait for a full bucket."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.available -= amount
+            return 0.0 if self.available >= 0 else -self.available / self.rate
+
+
+class RequestScheduler:
+    """Schedules LLM calls under requests-per-minute and tokens-per-minute limits and retries
+    throttled or transient failures with exponential backoff and full jitter, honoring the
+    Retry-After header when the provider sends one. Calls over the limit wait in line
+    instead of failing."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, rate_limit_config: dict):
+        """Builds the scheduler from the `rate_limit` block of the YAML configuration."""
+        return cls(
+            requests_per_minute=rate_limit_config.get("requests_per_minute"),
+            tokens_per_minute=rate_limit_config.get("tokens_per_minute"),
+            max_retries=rate_limit_config.get("max_retries", DEFAULT_MAX_RETRIES),
+            base_delay=rate_limit_config.get("base_delay", DEFAULT_BASE_DELAY),
+            max_delay=rate_limit_config.get("max_delay", DEFAULT_MAX_DELAY),
+        )
+
+    @property
+    def limits_tokens(self):
+        """True if a tokens-per-minute limit is configured (callers can skip counting tokens otherwise)."""
+        return self.token_bucket is not None
+
+    def admission_delay(self, estimated_tokens=0):
+        """Books one request and estimated_tokens and returns the seconds to wait before sending."""
+        delay = 0.0
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and estimated_tokens:
+            delay = max(delay, self.token_bucket.reserve(estimated_tokens))
+        return delay
+
+    def retry_delay(self, exc, attempt):
+        """Returns the seconds to wait before retrying after exc at the given attempt (0-based),
+        or None if the error is not retryable or the retries are exhausted."""
+        if attempt >= self.max_retries or not is_retryable(exc):
+            return None
+        retry_after = get_retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def execute(self, func, estimated_tokens=0):
+        """Calls func() once the rate limits allow it, retrying retryable errors."""
+        attempt = 0
+        while True:
+            delay = self.admission_delay(estimated_tokens)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                return func()
+            except Exception as exc:
+                delay = self.retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.warning(f"Retryable LLM error, attempt {attempt}/{self.max_retries} in {delay:.1f}s: {exc}")
+                time.sleep(delay)
+
+    async def aexecute(self, coro_factory, estimated_tokens=0):
+        """Async variant of execute: coro_factory() must return a new coroutine at each attempt."""
+        attempt = 0
+        while True:
+            delay = self.admission_delay(estimated_tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await coro_factory()
+            except Exception as exc:
+                delay = self.retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.warning(f"Retryable LLM error, attempt {attempt}/{self.max_retries} in {delay:.1f}s: {exc}")
+                await asyncio.sleep(delay)
+
+
+def _exception_chain(exc):
+    """Yields exc and the exceptions it was raised from (the agents wrap SDK errors in RuntimeError)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        if isinstance(response, dict):
+            status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        else:
+            status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """True if exc (or an exception it was raised from) is a throttling or transient provider error."""
+    for error in _exception_chain(exc):
+        if type(error).__name__ in RETRYABLE_EXCEPTION_NAMES:
+            return True
+        response = getattr(error, "response", None)
+        if isinstance(response, dict) and response.get("Error", {}).get("Code") in RETRYABLE_AWS_ERROR_CODES:
+            return True
+        if _status_code(error) in RETRYABLE_STATUS_CODES:
+            return True
+    return False
+
+
+def get_retry_after(exc):
+    """Returns the delay in seconds requested by the provider via Retry-After, if any."""
+    for error in _exception_chain(exc):
+        response = getattr(error, "response", None)
+        if isinstance(response, dict):
+            headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+        else:
+            headers = getattr(response, "headers", None)
+        if not headers:
+            continue
+
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return max(0.0, float(retry_after_ms) / 1000)
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+    return None
+
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(key, rate_limit_config=None):
+    """Returns the process-wide scheduler for key (e.g. provider, endpoint and model), so that
+    every agent calling the same deployment shares the same rate limits. The limits are those
+    of the first configuration seen for key; a later, different one is reported and ignored."""
+    rate_limit_config = rate_limit_config or {}
+    with _SCHEDULERS_LOCK:
+        entry = _SCHEDULERS.get(key)
+        if entry is None:
+            entry = _SCHEDULERS[key] = (RequestScheduler.from_config(rate_limit_config), rate_limit_config)
+        elif entry[1] != rate_limit_config:
+            logger.warning(f"[RequestScheduler] Conflicting rate_limit for {key}: keeping {entry[1]}, "
+                           f"ignoring {rate_limit_config}")
+        return entry[0]
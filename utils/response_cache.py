@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from utils.common import create_directory, logger
+
+DEFAULT_CACHE_PATH = ".pycopilot_cache/responses.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_SIZE_MB = 256
+# Least recently used entries deleted per statement when the cache is over budget.
+EVICTION_BATCH_SIZE = 64
+
+
+class ResponseCache:
+    """Persistent, content-addressed cache of LLM responses backed by SQLite.
+    Entries expire after ttl_seconds and the least recently used ones are evicted
+    when the stored responses exceed max_size_bytes."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_size_bytes=DEFAULT_MAX_SIZE_MB * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            create_directory(dir_path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed_at ON responses (accessed_at)")
+        # Running total of the stored sizes, so that put() does not scan the table.
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, cache_config: dict):
+        """Builds the cache from the `response_cache` block of the YAML configuration."""
+        return cls(
+            path=cache_config.get("path", DEFAULT_CACHE_PATH),
+            ttl_seconds=cache_config.get("ttl_seconds", DEFAULT_TTL_SECONDS),
+            max_size_bytes=int(cache_config.get("max_size_mb", DEFAULT_MAX_SIZE_MB) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def make_key(provider, model_name, system_prompt, user_prompt, temperature):
+        """Returns the SHA-256 hash identifying a request."""
+        payload = json.dumps([provider, model_name, system_prompt or "", user_prompt, temperature],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Stores response under key, then evicts the least recently used entries if needed."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self._total_size += size - (replaced[0] if replaced else 0)
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Deletes the least recently used entries EVICTION_BATCH_SIZE at a time (through the
+        # accessed_at index) until the stored size is back under the budget.
+        evicted = 0
+        while self._total_size > self.max_size_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC LIMIT ?",
+                                      (EVICTION_BATCH_SIZE,)).fetchall()
+            if not rows:
+                self._total_size = 0
+                break
+            # Within the batch, only the entries needed to get under the budget
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= size
+                evicted += 1
+                if self._total_size <= self.max_size_bytes:
+                    break
+        logger.info(f"Response cache: evicted {evicted} entries")
+
+    def clear(self):
+        """Removes every cached response and resets the counters."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._total_size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """Returns hit/miss counters, number of entries and stored size in bytes."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "size_bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
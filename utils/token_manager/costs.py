@@ -2,16 +2,23 @@
 # https://github.com/AgentOps-AI/tokencost
 # Prices last updated Jan 30, 2024 from LiteLLM's cost dictionary
 #
+# batch_prompt / batch_completion: prices of the provider batch APIs (Azure OpenAI Global
+# Batch, Bedrock batch inference), 50% of the standard prices, for the models that offer one.
+#
 cost_map = {
     "gpt-4": {
         "prompt": 0.03,
         "completion": 0.06,
+        "batch_prompt": 0.015,
+        "batch_completion": 0.03,
         "max_prompt_tokens": 8192,
         "max_output_tokens": 4096
     },
     "gpt-4o": {
         "prompt": 0.0025,
         "completion": 0.01,
+        "batch_prompt": 0.00125,
+        "batch_completion": 0.005,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
@@ -30,12 +37,16 @@ cost_map = {
     "gpt-4o-mini": {
         "prompt": 0.00015,
         "completion": 0.0006,
+        "batch_prompt": 0.000075,
+        "batch_completion": 0.0003,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "gpt-4o-mini-2024-07-18": {
         "prompt": 0.00015,
         "completion": 0.0006,
+        "batch_prompt": 0.000075,
+        "batch_completion": 0.0003,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
@@ -51,6 +62,22 @@ cost_map = {
         "max_prompt_tokens": 128000,
         "max_output_tokens": 65536
     },
+    "o3-mini": {
+        "prompt": 0.0011,
+        "completion": 0.0044,
+        "batch_prompt": 0.00055,
+        "batch_completion": 0.0022,
+        "max_prompt_tokens": 200000,
+        "max_output_tokens": 100000
+    },
+    "o3-mini-2025-01-31": {
+        "prompt": 0.0011,
+        "completion": 0.0044,
+        "batch_prompt": 0.00055,
+        "batch_completion": 0.0022,
+        "max_prompt_tokens": 200000,
+        "max_output_tokens": 100000
+    },
     "o1-preview": {
         "prompt": 0.015,
         "completion": 0.06,
@@ -72,12 +99,16 @@ cost_map = {
     "gpt-4o-2024-05-13": {
         "prompt": 0.005,
         "completion": 0.015,
+        "batch_prompt": 0.0025,
+        "batch_completion": 0.0075,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 4096
     },
     "gpt-4o-2024-08-06": {
         "prompt": 0.0025,
         "completion": 0.01,
+        "batch_prompt": 0.00125,
+        "batch_completion": 0.005,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
@@ -120,12 +151,16 @@ cost_map = {
     "gpt-4-turbo": {
         "prompt": 0.01,
         "completion": 0.03,
+        "batch_prompt": 0.005,
+        "batch_completion": 0.015,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 4096
     },
     "gpt-4-turbo-2024-04-09": {
         "prompt": 0.01,
         "completion": 0.03,
+        "batch_prompt": 0.005,
+        "batch_completion": 0.015,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 4096
     },
@@ -180,6 +215,8 @@ cost_map = {
     "gpt-3.5-turbo-0125": {
         "prompt": 0.0005,
         "completion": 0.0015,
+        "batch_prompt": 0.00025,
+        "batch_completion": 0.00075,
         "max_prompt_tokens": 16385,
         "max_output_tokens": 4096
     },
@@ -381,6 +418,14 @@ cost_map = {
         "max_prompt_tokens": float('nan'),
         "max_output_tokens": float('nan')
     },
+    "eu.anthropic.claude-3-5-sonnet-20240620-v1:0": {
+        "prompt": 0.003,
+        "completion": 0.015,
+        "batch_prompt": 0.0015,
+        "batch_completion": 0.0075,
+        "max_prompt_tokens": 200000,
+        "max_output_tokens": 4096
+    },
     "azure/o1-mini": {
         "prompt": 0.00121,
         "completion": 0.00484,
@@ -408,42 +453,56 @@ cost_map = {
     "azure/gpt-4o": {
         "prompt": 0.0025,
         "completion": 0.01,
+        "batch_prompt": 0.00125,
+        "batch_completion": 0.005,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "azure/gpt-4o-2024-08-06": {
         "prompt": 0.0025,
         "completion": 0.01,
+        "batch_prompt": 0.00125,
+        "batch_completion": 0.005,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "azure/gpt-4o-2024-05-13": {
         "prompt": 0.005,
         "completion": 0.015,
+        "batch_prompt": 0.0025,
+        "batch_completion": 0.0075,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 4096
     },
     "azure/global-standard/gpt-4o-2024-08-06": {
         "prompt": 0.0025,
         "completion": 0.01,
+        "batch_prompt": 0.00125,
+        "batch_completion": 0.005,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "azure/global-standard/gpt-4o-mini": {
         "prompt": 0.00015,
         "completion": 0.0006,
+        "batch_prompt": 0.000075,
+        "batch_completion": 0.0003,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "azure/gpt-4o-mini": {
         "prompt": 0.000165,
         "completion": 0.00066,
+        "batch_prompt": 0.0000825,
+        "batch_completion": 0.00033,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 16384
     },
     "azure/gpt-4-turbo-2024-04-09": {
         "prompt": 0.01,
         "completion": 0.03,
+        "batch_prompt": 0.005,
+        "batch_completion": 0.015,
         "max_prompt_tokens": 128000,
         "max_output_tokens": 4096
     },
@@ -522,6 +581,8 @@ cost_map = {
     "azure/gpt-35-turbo-0125": {
         "prompt": 0.0005,
         "completion": 0.0015,
+        "batch_prompt": 0.00025,
+        "batch_completion": 0.00075,
         "max_prompt_tokens": 16384,
         "max_output_tokens": 4096
     },
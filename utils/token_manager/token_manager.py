@@ -1,12 +1,220 @@
 import re
-import tiktoken
+import json
+import time
+import hashlib
+import functools
+import threading
+import contextlib
+import contextvars
+
+from collections import deque
+from decimal import Decimal
 
 from utils.token_manager.costs import cost_map
 from datetime import datetime
 
-from tokencost import calculate_prompt_cost, calculate_completion_cost
-
 from utils.common import logger
+from utils.tracing import span
+
+# tiktoken e tokencost vengono importati al primo utilizzo: il loro caricamento
+# (in particolare la tabella prezzi di tokencost) rallenta l'avvio dell'applicazione.
+
+# Thread usati da tiktoken per la tokenizzazione batch (count_tokens_many).
+DEFAULT_TOKENIZER_THREADS = 8
+# Testi sotto i quali count_tokens_many li tokenizza uno alla volta: encode_ordinary_batch crea
+# un thread pool a ogni chiamata, che costa più della tokenizzazione di pochi testi.
+MIN_BATCH_TOKENIZE_TEXTS = 16
+
+# Prezzi dei token letti/scritti nella cache dei prompt, in rapporto al prezzo dei token di input,
+# usati quando tokencost non li definisce per il modello: Anthropic addebita il 10% per la
+# lettura e il 125% per la scrittura, OpenAI il 50% per la lettura e nulla in più per la scrittura.
+ANTHROPIC_CACHE_PRICE_RATIOS = (0.1, 1.25)
+DEFAULT_CACHE_PRICE_RATIOS = (0.5, 1.0)
+
+# Contatori accumulati dal TokenManager, nell'ordine in cui sono conservati negli shard.
+COUNTER_NAMES = ("total_prompt_tokens", "total_response_tokens", "total_cost", "total_cache_hits",
+                 "total_operations", "total_cache_read_tokens", "total_cache_write_tokens")
+# Operazioni conservate nel report per default (le più vecchie vengono scartate, i totali no).
+DEFAULT_MAX_REPORT_ENTRIES = 10000
+# Etichetta delle operazioni senza agente o repository nelle ripartizioni di snapshot().
+UNLABELED = "-"
+
+# Agente e repository a cui vengono attribuite le operazioni del contesto corrente.
+_usage_labels = contextvars.ContextVar("usage_labels", default=(None, None))
+
+
+@contextlib.contextmanager
+def usage_labels(agent: str = None, repo: str = None):
+    """
+    Attribuisce all'agente e/o al repository indicati le operazioni registrate nel blocco
+    (nello stesso thread o task asyncio); i valori non indicati restano quelli esterni.
+    """
+    outer_agent, outer_repo = _usage_labels.get()
+    token = _usage_labels.set((agent or outer_agent, repo or outer_repo))
+    try:
+        yield
+    finally:
+        _usage_labels.reset(token)
+
+
+@functools.lru_cache(maxsize=256)
+def _official_model_name(custom_model_name: str) -> str:
+    """
+    Mappa il nome del modello personalizzato a un nome ufficiale riconoscibile da tiktoken
+    (o definisce eventuali fallback se necessario). Il risultato è memorizzato per modello.
+    """
+    model_mapping = {
+        "gpt-4o-super": "azure/gpt-4o-2024-08-06",
+        "gpt-4o-mini-super": "azure/gpt-4o-mini",
+        # Aggiungi altre eventuali mappature se necessario.
+    }
+    # Usa una regex per controllare se il nome del modello contiene 'claude-3.5'
+    if re.search(r'claude-3-5', custom_model_name):
+        return "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+    if re.search(r'claude-3-7', custom_model_name): #ATTENZIONE: non ancora presente 3.7
+        return "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+    return model_mapping.get(custom_model_name, custom_model_name)
+
+
+@functools.lru_cache(maxsize=256)
+def _cache_token_prices(official_model_name: str) -> tuple:
+    """
+    Restituisce (prezzo_lettura, prezzo_scrittura) per token della cache dei prompt, come Decimal:
+    i valori di tokencost se presenti, altrimenti il prezzo di input moltiplicato per
+    i rapporti del provider.
+    """
+    from tokencost import TOKEN_COSTS
+    costs = TOKEN_COSTS.get(official_model_name) or {}
+    input_price = Decimal(str(costs.get("input_cost_per_token", 0)))
+    read_ratio, write_ratio = (ANTHROPIC_CACHE_PRICE_RATIOS if "claude" in official_model_name
+                               else DEFAULT_CACHE_PRICE_RATIOS)
+    read_price = costs.get("cache_read_input_token_cost")
+    write_price = costs.get("cache_creation_input_token_cost")
+    return (Decimal(str(read_price)) if read_price is not None else input_price * Decimal(str(read_ratio)),
+            Decimal(str(write_price)) if write_price is not None else input_price * Decimal(str(write_ratio)))
+
+
+@functools.lru_cache(maxsize=256)
+def _batch_token_prices(official_model_name: str) -> tuple:
+    """
+    Restituisce (prezzo_input, prezzo_output) per token dell'API batch del provider, come
+    Decimal: le colonne batch_prompt/batch_completion di cost_map (prezzi per 1K token) se
+    presenti, altrimenti i valori di tokencost; (None, None) se il modello non ha prezzi batch.
+    """
+    costs = cost_map.get(official_model_name) or {}
+    if "batch_prompt" in costs and "batch_completion" in costs:
+        return (Decimal(str(costs["batch_prompt"])) / 1000, Decimal(str(costs["batch_completion"])) / 1000)
+    from tokencost import TOKEN_COSTS
+    costs = TOKEN_COSTS.get(official_model_name) or {}
+    input_price = costs.get("input_cost_per_token_batches")
+    output_price = costs.get("output_cost_per_token_batches")
+    if input_price is None or output_price is None:
+        return None, None
+    return Decimal(str(input_price)), Decimal(str(output_price))
+
+
+@functools.lru_cache(maxsize=256)
+def _encoding_for_model(model_name: str):
+    """
+    Restituisce l'encoding tiktoken del modello (cl100k_base come fallback).
+    L'encoding viene risolto una sola volta per modello.
+    """
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class ReportEntry:
+    """
+    Record compatto di un'operazione del report: dei testi della chiamata conserva solo
+    l'impronta (sha256 troncato) e la lunghezza in caratteri, così la memoria occupata
+    non dipende dalla dimensione dei prompt. I testi completi, se richiesti, finiscono
+    nel ring buffer o nel file JSONL del TokenManager.
+    """
+    __slots__ = ("timestamp", "model", "prompt_tokens", "completion_tokens", "total_cost",
+                 "prompt_hash", "prompt_chars", "completion_hash", "completion_chars",
+                 "cache_read_tokens", "cache_write_tokens", "time_to_first_token", "tokens_per_second",
+                 "cached", "batch", "agent", "repo")
+
+    def __init__(self, model, prompt_tokens=0, completion_tokens=0, total_cost=0.0,
+                 prompt_hash=None, prompt_chars=0, completion_hash=None, completion_chars=0,
+                 cache_read_tokens=0, cache_write_tokens=0, time_to_first_token=None,
+                 tokens_per_second=None, cached=False, batch=False, agent=None, repo=None):
+        self.timestamp = time.time()
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_cost = total_cost
+        self.prompt_hash = prompt_hash
+        self.prompt_chars = prompt_chars
+        self.completion_hash = completion_hash
+        self.completion_chars = completion_chars
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.time_to_first_token = time_to_first_token
+        self.tokens_per_second = tokens_per_second
+        self.cached = cached
+        self.batch = batch
+        self.agent = agent
+        self.repo = repo
+
+    @property
+    def formatted_timestamp(self) -> str:
+        return datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+    def to_dict(self) -> dict:
+        """
+        Restituisce il record come dizionario (per export e serializzazione).
+        """
+        entry = {name: getattr(self, name) for name in self.__slots__}
+        entry["timestamp"] = self.formatted_timestamp
+        return entry
+
+
+def _text_digest(text: str) -> str:
+    """
+    Impronta breve di un testo, per riconoscere prompt e completion identici nel report.
+    """
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+class _Shard:
+    """
+    Contatori di un singolo thread, per (modello, agente, repository). Il lock è conteso
+    solo da snapshot(), non dagli altri thread che registrano operazioni.
+    """
+    __slots__ = ("lock", "counters")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, key, values):
+        with self.lock:
+            counters = self.counters.get(key)
+            if counters is None:
+                self.counters[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    counters[i] += value
+
+    def copy(self) -> dict:
+        with self.lock:
+            return {key: list(counters) for key, counters in self.counters.items()}
+
+
+def _merge_counters(target: dict, key, counters: list):
+    merged = target.get(key)
+    if merged is None:
+        target[key] = list(counters)
+    else:
+        for i, value in enumerate(counters):
+            merged[i] += value
+
 
 class TokenManager:
     """
@@ -16,42 +224,110 @@ class TokenManager:
     - Calcolare i costi stimati,
     - Accumulare i totali (prompt_tokens, response_tokens, cost) e registrare
     ogni operazione per generare un report dettagliato.
+
+    Il TokenManager può essere condiviso tra thread: ogni thread accumula i totali nel proprio
+    shard, che viene sommato agli altri solo in lettura (get_stats, snapshot), così le chiamate
+    concorrenti non perdono aggiornamenti né si contendono un lock comune. I totali sono
+    ripartiti per modello, agente e repository (vedi usage_labels).
+
+    Ogni operazione è registrata come ReportEntry (impronte e lunghezze, non i testi).
+    max_report_entries limita i record conservati alle ultime N operazioni (i totali
+    restano completi; None li conserva tutti); i testi completi possono essere conservati
+    nelle ultime full_text_buffer_size operazioni (full_texts) e/o accodati al file JSONL
+    full_text_log_path, così la memoria resta costante anche su migliaia di chiamate.
     """
-    def __init__(self):
-        self.total_prompt_tokens = 0
-        self.total_response_tokens = 0
-        self.total_cost = 0
+    def __init__(self, max_report_entries: int = DEFAULT_MAX_REPORT_ENTRIES, full_text_buffer_size: int = 0,
+                 full_text_log_path: str = None):
+        # Shard dei contatori, uno per thread; la lista serve a sommarli in lettura.
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # Serializza l'aggiunta delle entry al report e ai testi completi.
+        self._report_lock = threading.Lock()
         # Conserva i dettagli delle operazioni per il report.
-        self.report_entries = []
+        self.max_report_entries = max_report_entries
+        self.report_entries = deque(maxlen=max_report_entries)
+        # Testi completi (prompt_hash, system_prompt, user_prompt, completion) delle ultime operazioni.
+        self.full_texts = deque(maxlen=full_text_buffer_size) if full_text_buffer_size else None
+        self.full_text_log_path = full_text_log_path
+        # File JSONL dei testi completi, aperto alla prima operazione e chiuso da close().
+        self._full_text_log = None
+
+    @classmethod
+    def from_config(cls, report_config: dict):
+        """
+        Crea il TokenManager dal blocco `token_report` di config.json.
+        """
+        return cls(
+            max_report_entries=report_config.get("max_report_entries", DEFAULT_MAX_REPORT_ENTRIES),
+            full_text_buffer_size=report_config.get("full_text_buffer_size", 0),
+            full_text_log_path=report_config.get("full_text_log_path")
+        )
+
+    @property
+    def total_prompt_tokens(self):
+        return self.get_stats()["total_prompt_tokens"]
+
+    @property
+    def total_response_tokens(self):
+        return self.get_stats()["total_response_tokens"]
+
+    @property
+    def total_cost(self):
+        return self.get_stats()["total_cost"]
+
+    @property
+    def total_cache_hits(self):
+        return self.get_stats()["total_cache_hits"]
+
+    @property
+    def total_operations(self):
+        return self.get_stats()["total_operations"]
+
+    @property
+    def total_cache_read_tokens(self):
+        # Token del prompt letti dalla cache dei prompt del provider.
+        return self.get_stats()["total_cache_read_tokens"]
+
+    @property
+    def total_cache_write_tokens(self):
+        # Token del prompt scritti nella cache dei prompt del provider.
+        return self.get_stats()["total_cache_write_tokens"]
+
+    def _shard(self) -> _Shard:
+        """
+        Restituisce lo shard del thread corrente, creandolo alla prima operazione.
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _add(self, entry: ReportEntry):
+        """
+        Somma i valori della entry ai contatori del thread corrente.
+        """
+        self._shard().add((entry.model, entry.agent, entry.repo), (
+            entry.prompt_tokens, entry.completion_tokens, entry.total_cost or 0, int(entry.cached), 1,
+            entry.cache_read_tokens, entry.cache_write_tokens
+        ))
 
     def _map_model_name_to_official(self, custom_model_name: str) -> str:
         """
         Mappa il nome del modello personalizzato a un nome ufficiale riconoscibile da tiktoken
         (o definisce eventuali fallback se necessario).
         """
-        model_mapping = {
-            "gpt-4o-super": "azure/gpt-4o-2024-08-06",
-            "gpt-4o-mini-super": "azure/gpt-4o-mini",
-            # Aggiungi altre eventuali mappature se necessario.
-        }
-        # Usa una regex per controllare se il nome del modello contiene 'claude-3.5'
-        if re.search(r'claude-3-5', custom_model_name):
-            return "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
-
-        if re.search(r'claude-3-7', custom_model_name): #ATTENZIONE: non ancora presente 3.7
-            return "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
-
-        return model_mapping.get(custom_model_name, custom_model_name)
+        return _official_model_name(custom_model_name)
 
     def _get_encoding(self, model_name: str):
         """
         Tenta di ottenere l'encoding corretto per il modello;
         se non disponibile, usa l'encoding di fallback (cl100k_base).
         """
-        try:
-            return tiktoken.encoding_for_model(model_name)
-        except KeyError:
-            return tiktoken.get_encoding("cl100k_base")
+        return _encoding_for_model(model_name)
 
     def count_tokens(self, model_name: str, text: str) -> int:
         """
@@ -60,7 +336,42 @@ class TokenManager:
 
         _model_name = self._map_model_name_to_official(model_name)
         encoding = self._get_encoding(_model_name)
-        return len(encoding.encode(text))
+        return len(encoding.encode_ordinary(text))
+
+    def count_tokens_many(self, model_name: str, texts: list, num_threads: int = DEFAULT_TOKENIZER_THREADS) -> list:
+        """
+        Conta i token di più testi in un'unica chiamata batch di tiktoken, distribuita su
+        num_threads thread (almeno MIN_BATCH_TOKENIZE_TEXTS testi, altrimenti uno alla volta).
+        Restituisce i conteggi nello stesso ordine.
+        """
+        if not texts:
+            return []
+        encoding = self._get_encoding(self._map_model_name_to_official(model_name))
+        if len(texts) < MIN_BATCH_TOKENIZE_TEXTS:
+            return [len(encoding.encode_ordinary(text)) for text in texts]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts), num_threads=num_threads)]
+
+    def get_model_limits(self, model_name: str) -> tuple:
+        """
+        Restituisce (max_prompt_tokens, max_output_tokens) del modello secondo cost_map.
+        """
+        official_model_name = self._map_model_name_to_official(model_name)
+        try:
+            selected_costs = cost_map[official_model_name]
+        except KeyError:
+            raise ValueError(f"Non esistono limiti definiti per il modello: {official_model_name}")
+        return selected_costs["max_prompt_tokens"], selected_costs["max_output_tokens"]
+
+    def get_model_prices(self, model_name: str) -> tuple:
+        """
+        Restituisce (prezzo_prompt, prezzo_completion) per 1K token del modello secondo cost_map.
+        """
+        official_model_name = self._map_model_name_to_official(model_name)
+        try:
+            selected_costs = cost_map[official_model_name]
+        except KeyError:
+            raise ValueError(f"Non esistono prezzi definiti per il modello: {official_model_name}")
+        return selected_costs["prompt"], selected_costs["completion"]
 
     #DA RIMUOVERE - USO LA LIB TOKENCOST
     def calculate_and_apply_cost_v0(self, model_name: str, system_prompt: str, user_prompt: str, completion: str) -> tuple:
@@ -89,24 +400,12 @@ class TokenManager:
             (completion_tokens * selected_costs["completion"] / 1000)
         )
 
-        # Aggiorna i totali.
-        self.total_prompt_tokens += prompt_tokens
-        self.total_response_tokens += completion_tokens
-        self.total_cost += total_cost
-
-        # Crea una entry per il report.
-        entry = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "model": official_model_name,
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "total_cost": total_cost,
-            # Puoi includere anche altri dettagli se necessario:
-            "system_prompt": system_prompt,
-            "user_prompt": user_prompt,
-            "completion": completion
-        }
-        self.report_entries.append(entry)
+        # Aggiorna i totali e crea una entry per il report. I contatori sommano i costi
+        # Decimal di tokencost (calculate_and_apply_cost): il costo viene convertito.
+        agent, repo = _usage_labels.get()
+        self._record(ReportEntry(official_model_name, prompt_tokens, completion_tokens, Decimal(str(total_cost)),
+                                 agent=agent, repo=repo),
+                     system_prompt, user_prompt, completion)
 
         # Stampa un riepilogo nel terminale.
         # print(f"-----------------{official_model_name}---------------------------------")
@@ -115,67 +414,182 @@ class TokenManager:
 
         return total_cost, prompt_tokens, completion_tokens
 
-    def calculate_and_apply_cost(self, model_name: str, system_prompt: str, user_prompt: str, completion: str) -> tuple:
+    def calculate_and_apply_cost(self, model_name: str, system_prompt: str, user_prompt: str, completion: str,
+                                 time_to_first_token: float = None, generation_time: float = None,
+                                 cache_read_tokens: int = 0, cache_write_tokens: int = 0,
+                                 batch: bool = False, agent: str = None, repo: str = None) -> tuple:
+        """
+        Calcola il costo della chiamata, aggiorna i totali e registra l'operazione nel report.
+        Per le chiamate in streaming time_to_first_token e generation_time (in secondi)
+        vengono registrati insieme ai token/secondo della generazione.
+        cache_read_tokens e cache_write_tokens sono i token del prompt che il provider ha
+        letto dalla (o scritto nella) cache dei prompt: vengono addebitati ai rispettivi
+        prezzi, il resto del prompt al prezzo di input.
+        Con batch=True la chiamata è stata eseguita dall'API batch del provider: prompt e
+        completion vengono addebitati ai prezzi batch del modello (vedi _batch_token_prices),
+        o ai prezzi standard se il modello non ne ha.
+        agent e repo attribuiscono l'operazione nelle ripartizioni dei totali; se omessi
+        valgono quelli impostati con usage_labels.
+        """
 
         try:
             official_model_name = self._map_model_name_to_official(model_name)
             #print("official_model_name=", official_model_name)
 
+            # Conta una sola volta i token del prompt (system + user) e della completion:
+            # i costi vengono derivati dagli stessi conteggi.
             prompt_text = system_prompt + user_prompt
-            prompt_cost = calculate_prompt_cost(prompt_text, official_model_name)
-
-            completion_cost = calculate_completion_cost(completion, official_model_name)
-
-            # Conta i token del prompt (system + user) e della completion.
-            prompt_text = system_prompt + user_prompt
-            prompt_tokens = self.count_tokens(official_model_name, prompt_text)
-            completion_tokens = self.count_tokens(official_model_name, completion)
+            with span("token_manager.calculate_cost") as current:
+                encoding = self._get_encoding(official_model_name)
+                prompt_tokens = len(encoding.encode_ordinary(prompt_text))
+                completion_tokens = len(encoding.encode_ordinary(completion))
+
+                uncached_tokens = max(0, prompt_tokens - cache_read_tokens - cache_write_tokens)
+                input_price, output_price = _batch_token_prices(official_model_name) if batch else (None, None)
+                if input_price is not None:
+                    prompt_cost = input_price * uncached_tokens
+                    completion_cost = output_price * completion_tokens
+                else:
+                    from tokencost import calculate_cost_by_tokens
+                    prompt_cost = calculate_cost_by_tokens(uncached_tokens, official_model_name, "input")
+                    completion_cost = calculate_cost_by_tokens(completion_tokens, official_model_name, "output")
+                if cache_read_tokens or cache_write_tokens:
+                    read_price, write_price = _cache_token_prices(official_model_name)
+                    prompt_cost += read_price * cache_read_tokens + write_price * cache_write_tokens
+                current.set(num_bytes=len(prompt_text) + len(completion), tokens=prompt_tokens + completion_tokens)
 
             total_cost = prompt_cost + completion_cost
 
-            # Aggiorna i totali.
-            self.total_prompt_tokens += prompt_tokens
-            self.total_response_tokens += completion_tokens
-            self.total_cost += total_cost
-
-            # Crea una entry per il report.
-            entry = {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "model": official_model_name,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_cost": total_cost,
-                # Puoi includere anche altri dettagli se necessario:
-                "system_prompt": system_prompt,
-                "user_prompt": user_prompt,
-                "completion": completion
-            }
+            # Aggiorna i totali e crea una entry per il report.
+            label_agent, label_repo = _usage_labels.get()
+            entry = ReportEntry(
+                official_model_name, prompt_tokens, completion_tokens, total_cost,
+                cache_read_tokens=cache_read_tokens,
+                cache_write_tokens=cache_write_tokens,
+                time_to_first_token=time_to_first_token,
+                tokens_per_second=(completion_tokens / generation_time
+                                   if generation_time is not None and generation_time > 0 else None),
+                batch=batch,
+                agent=agent or label_agent,
+                repo=repo or label_repo
+            )
+            self._record(entry, system_prompt, user_prompt, completion)
         except Exception as e:
             logger.error(f"Errore nel calcolo dei costi del token: {e}")
-            entry = {}
             total_cost = prompt_tokens = completion_tokens = -1
 
-        self.report_entries.append(entry)
-
         return total_cost, prompt_tokens, completion_tokens
 
+    def _record(self, entry: ReportEntry, system_prompt: str, user_prompt: str, completion: str):
+        """
+        Completa la entry con impronte e lunghezze dei testi, la somma ai totali e la
+        aggiunge al report; i testi completi vanno solo nel ring buffer e/o nel file JSONL,
+        se configurati.
+        """
+        prompt_text = (system_prompt or "") + (user_prompt or "")
+        entry.prompt_hash = _text_digest(prompt_text)
+        entry.prompt_chars = len(prompt_text)
+        entry.completion_hash = _text_digest(completion or "")
+        entry.completion_chars = len(completion or "")
+        self._add(entry)
+
+        line = None
+        if self.full_text_log_path:
+            record = {"timestamp": entry.formatted_timestamp, "model": entry.model,
+                      "prompt_hash": entry.prompt_hash, "system_prompt": system_prompt,
+                      "user_prompt": user_prompt, "completion": completion}
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self._report_lock:
+            self.report_entries.append(entry)
+            if self.full_texts is not None:
+                self.full_texts.append((entry.prompt_hash, system_prompt, user_prompt, completion))
+            if line is not None:
+                try:
+                    if self._full_text_log is None:
+                        # Bufferizzato per riga: ogni record è sul file appena scritto.
+                        self._full_text_log = open(self.full_text_log_path, "a", encoding="utf-8", buffering=1)
+                    self._full_text_log.write(line)
+                except Exception as e:
+                    logger.error(f"Errore nella scrittura dei testi su '{self.full_text_log_path}': {e}")
+
+    def close(self):
+        """Chiude il file JSONL dei testi completi, se aperto."""
+        with self._report_lock:
+            if self._full_text_log is not None:
+                self._full_text_log.close()
+                self._full_text_log = None
+
+    def record_cache_hit(self, model_name: str, agent: str = None, repo: str = None) -> tuple:
+        """
+        Registra una risposta servita dalla cache: nessun token viene inviato al
+        provider, quindi l'operazione compare nel report a costo zero.
+        """
+        label_agent, label_repo = _usage_labels.get()
+        entry = ReportEntry(self._map_model_name_to_official(model_name), cached=True,
+                            agent=agent or label_agent, repo=repo or label_repo)
+        self._add(entry)
+        with self._report_lock:
+            self.report_entries.append(entry)
+
+        return 0.0, 0, 0
+
+    def _merged_counters(self) -> dict:
+        """
+        Somma gli shard di tutti i thread: (modello, agente, repository) -> contatori.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for key, counters in shard.copy().items():
+                _merge_counters(merged, key, counters)
+        return merged
 
     def get_stats(self) -> dict:
         """
         Restituisce un dizionario con i totali accumulati di token e costi.
         """
-        return {
-            "total_prompt_tokens": self.total_prompt_tokens,
-            "total_response_tokens": self.total_response_tokens,
-            "total_cost": self.total_cost
-        }
+        totals = [0] * len(COUNTER_NAMES)
+        for counters in self._merged_counters().values():
+            for i, value in enumerate(counters):
+                totals[i] += value
+        return dict(zip(COUNTER_NAMES, totals))
+
+    def snapshot(self) -> dict:
+        """
+        Fotografia dei contatori, pensata per essere interrogata periodicamente (es. da una
+        dashboard) durante l'esecuzione: i totali e la loro ripartizione per modello, agente
+        e repository, ciascuno con le stesse chiavi di get_stats. Copia solo i contatori
+        degli shard, senza bloccare le operazioni in corso negli altri thread.
+        """
+        merged = self._merged_counters()
+        totals = [0] * len(COUNTER_NAMES)
+        breakdowns = {"by_model": {}, "by_agent": {}, "by_repo": {}}
+        for (model, agent, repo), counters in merged.items():
+            for i, value in enumerate(counters):
+                totals[i] += value
+            _merge_counters(breakdowns["by_model"], model, counters)
+            _merge_counters(breakdowns["by_agent"], agent or UNLABELED, counters)
+            _merge_counters(breakdowns["by_repo"], repo or UNLABELED, counters)
+
+        snapshot = {"timestamp": time.time(), "totals": dict(zip(COUNTER_NAMES, totals))}
+        for name, breakdown in breakdowns.items():
+            snapshot[name] = {label: dict(zip(COUNTER_NAMES, counters))
+                              for label, counters in sorted(breakdown.items())}
+        return snapshot
 
     def reset_stats(self):
         """Azzera i contatori interni e la history del report."""
-        self.total_prompt_tokens = 0
-        self.total_response_tokens = 0
-        self.total_cost = 0
-        self.report_entries = []
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            with shard.lock:
+                shard.counters.clear()
+        with self._report_lock:
+            self.report_entries.clear()
+            if self.full_texts is not None:
+                self.full_texts.clear()
 
     def save_report_to_file(self, file_path: str):
         """
@@ -189,24 +603,56 @@ class TokenManager:
                 f.write(f"**Data e ora:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
 
                 f.write("## Dettaglio operazioni\n")
-                for i, entry in enumerate(self.report_entries, 1):
-                    f.write(f"### Operazione {i} - {entry['timestamp']}\n")
-                    f.write(f"- **Modello:** {entry['model']}\n")
-                    f.write(f"- **Prompt tokens:** {entry['prompt_tokens']}\n")
-                    f.write(f"- **Completion tokens:** {entry['completion_tokens']}\n")
-                    f.write(f"- **Costo:** {entry['total_cost']:.4f}\n")
-                    # Se vuoi includere i testi delle richieste puoi decommentare le seguenti righe:
-                    # f.write(f"- **System prompt:** {entry['system_prompt']}\n")
-                    # f.write(f"- **User prompt:** {entry['user_prompt']}\n")
-                    # f.write(f"- **Completion:** {entry['completion']}\n")
+                snapshot = self.snapshot()
+                stats = snapshot["totals"]
+                with self._report_lock:
+                    entries = list(self.report_entries)
+                # Con max_report_entries le operazioni più vecchie non sono più nel report.
+                first_index = stats["total_operations"] - len(entries) + 1
+                for i, entry in enumerate(entries, first_index):
+                    f.write(f"### Operazione {i} - {entry.formatted_timestamp}\n")
+                    f.write(f"- **Modello:** {entry.model}\n")
+                    if entry.agent:
+                        f.write(f"- **Agente:** {entry.agent}\n")
+                    if entry.repo:
+                        f.write(f"- **Repository:** {entry.repo}\n")
+                    f.write(f"- **Prompt tokens:** {entry.prompt_tokens}\n")
+                    f.write(f"- **Completion tokens:** {entry.completion_tokens}\n")
+                    f.write(f"- **Costo:** {entry.total_cost:.4f}\n")
+                    if entry.prompt_hash is not None:
+                        f.write(f"- **Prompt:** {entry.prompt_chars} caratteri (sha256 {entry.prompt_hash})\n")
+                        f.write(f"- **Completion:** {entry.completion_chars} caratteri (sha256 {entry.completion_hash})\n")
+                    if entry.cache_read_tokens or entry.cache_write_tokens:
+                        f.write(f"- **Prompt cache:** {entry.cache_read_tokens} token letti, "
+                                f"{entry.cache_write_tokens} token scritti\n")
+                    if entry.time_to_first_token is not None:
+                        f.write(f"- **Time to first token:** {entry.time_to_first_token:.2f}s\n")
+                    if entry.tokens_per_second is not None:
+                        f.write(f"- **Tokens/sec:** {entry.tokens_per_second:.1f}\n")
+                    if entry.cached:
+                        f.write("- **Cache:** risposta servita dalla cache\n")
+                    if entry.batch:
+                        f.write("- **Batch:** eseguita dall'API batch del provider (prezzi batch)\n")
+                    # I testi completi sono nel ring buffer full_texts o nel file full_text_log_path.
                     f.write("\n")
 
                     # Riepilogo totale.
                 f.write("## Riepilogo finale\n")
-                stats = self.get_stats()
                 f.write(f"- **Total prompt tokens:** {stats['total_prompt_tokens']}\n")
                 f.write(f"- **Total response tokens:** {stats['total_response_tokens']}\n")
                 f.write(f"- **Total cost:** {stats['total_cost']:.4f}\n")
+                f.write(f"- **Total cache hits:** {stats['total_cache_hits']}\n")
+                f.write(f"- **Total prompt cache read tokens:** {stats['total_cache_read_tokens']}\n")
+                f.write(f"- **Total prompt cache write tokens:** {stats['total_cache_write_tokens']}\n")
+
+                # Ripartizione dei totali per modello, agente e repository.
+                for title, name in (("modello", "by_model"), ("agente", "by_agent"), ("repository", "by_repo")):
+                    f.write(f"\n## Totali per {title}\n")
+                    for label, totals in snapshot[name].items():
+                        f.write(f"- **{label}:** {totals['total_operations']} operazioni, "
+                                f"{totals['total_prompt_tokens']} prompt tokens, "
+                                f"{totals['total_response_tokens']} response tokens, "
+                                f"costo {totals['total_cost']:.4f}\n")
 
             logger.info(f"Report salvato in '{file_path}'")
         except Exception as e:
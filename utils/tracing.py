@@ -0,0 +1,232 @@
+import json
+import math
+import time
+import logging
+import threading
+import contextlib
+import contextvars
+
+from collections import deque
+
+try:
+    from opentelemetry import trace as otel_trace, metrics as otel_metrics
+except ImportError:  # optional: spans are only aggregated locally
+    otel_trace = otel_metrics = None
+
+# Latency samples kept per span name for the percentiles (the most recent ones).
+DEFAULT_MAX_SAMPLES = 10000
+PERCENTILES = (50, 95, 99)
+EXPORT_FORMATS = ("json", "prometheus")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# The logger configured by utils.common, looked up by name: utils.common times its writes with
+# span(), so this module does not import it.
+logger = logging.getLogger("utils.common")
+
+
+class Span:
+    """A timed operation. bytes and tokens are the amount of data it processed, used for the
+    throughput; attributes are only forwarded to OpenTelemetry."""
+
+    __slots__ = ("name", "bytes", "tokens", "attributes", "_otel_span")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.bytes = 0
+        self.tokens = 0
+        self.attributes = attributes
+        self._otel_span = None
+
+    def set(self, num_bytes=None, tokens=None, **attributes):
+        """Sets the processed bytes and tokens (and other attributes) of the span."""
+        if num_bytes is not None:
+            self.bytes = num_bytes
+        if tokens is not None:
+            self.tokens = tokens
+        self.attributes.update(attributes)
+        if self._otel_span is not None:
+            for key, value in attributes.items():
+                self._otel_span.set_attribute(key, value)
+
+
+class _SpanStats:
+    """Running totals of the spans with the same name, plus their latest durations."""
+
+    __slots__ = ("count", "errors", "seconds", "bytes", "tokens", "samples")
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.tokens = 0
+        self.samples = deque(maxlen=max_samples)
+
+
+def _percentile(sorted_samples, percentile):
+    """Nearest-rank percentile of a sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(percentile / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class Tracer:
+    """Collects the durations, bytes and tokens of named spans (aggregation walk, LLM calls, cost
+    calculation, output writes) and exports their p50/p95/p99 latencies and throughput as JSON or
+    Prometheus text. When OpenTelemetry is installed, every span is also an OpenTelemetry span and
+    its duration, bytes and tokens are recorded on the "pycopilot" meter, so they reach whatever
+    exporter the application configured. Thread-safe; the spans of concurrent calls are
+    aggregated together."""
+
+    def __init__(self, enabled=True, max_samples=DEFAULT_MAX_SAMPLES, use_opentelemetry=True):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._otel_tracer = None
+        self._otel_instruments = None
+        if use_opentelemetry and otel_trace is not None:
+            self._otel_tracer = otel_trace.get_tracer("pycopilot")
+            meter = otel_metrics.get_meter("pycopilot")
+            self._otel_instruments = (
+                meter.create_histogram("pycopilot.span.duration", unit="s", description="Duration of the spans"),
+                meter.create_counter("pycopilot.span.bytes", unit="By", description="Bytes processed by the spans"),
+                meter.create_counter("pycopilot.span.tokens", unit="{token}", description="Tokens processed by the spans"),
+            )
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Times the block as the span name; yields the Span, on which the block can set the bytes
+        and tokens it processed. Exceptions are counted as errors and re-raised."""
+        if not self.enabled:
+            yield Span(name, attributes)
+            return
+        current = Span(name, attributes)
+        token = _current_span.set(current)
+        otel_context = (self._otel_tracer.start_as_current_span(name, attributes=attributes)
+                        if self._otel_tracer is not None else contextlib.nullcontext())
+        error = False
+        start = time.perf_counter()
+        try:
+            with otel_context as otel_span:
+                current._otel_span = otel_span
+                yield current
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current_span.reset(token)
+            self.record(name, seconds, current.bytes, current.tokens, error)
+
+    def record(self, name, seconds, num_bytes=0, tokens=0, error=False):
+        """Records a span measured by the caller (e.g. a streamed call, whose generator cannot hold
+        a span across its yields)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = _SpanStats(self.max_samples)
+            stats.count += 1
+            stats.errors += error
+            stats.seconds += seconds
+            stats.bytes += num_bytes
+            stats.tokens += tokens
+            stats.samples.append(seconds)
+        if self._otel_instruments is not None:
+            duration, byte_counter, token_counter = self._otel_instruments
+            labels = {"span": name}
+            duration.record(seconds, attributes=labels)
+            if num_bytes:
+                byte_counter.add(num_bytes, attributes=labels)
+            if tokens:
+                token_counter.add(tokens, attributes=labels)
+
+    def stats(self):
+        """Returns, for each span name, the count, errors, total seconds, p50/p95/p99 latencies
+        (over the latest max_samples spans), bytes, tokens and their rate per second."""
+        with self._lock:
+            snapshot = [(name, stats.count, stats.errors, stats.seconds, stats.bytes, stats.tokens,
+                         sorted(stats.samples)) for name, stats in self._stats.items()]
+        result = {}
+        for name, count, errors, seconds, total_bytes, tokens, samples in sorted(snapshot):
+            entry = {"count": count, "errors": errors, "seconds": seconds}
+            for percentile in PERCENTILES:
+                entry[f"p{percentile}"] = _percentile(samples, percentile)
+            entry.update({
+                "bytes": total_bytes,
+                "tokens": tokens,
+                "bytes_per_second": total_bytes / seconds if seconds > 0 else None,
+                "tokens_per_second": tokens / seconds if seconds > 0 else None,
+            })
+            result[name] = entry
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def to_prometheus(self):
+        """Returns the stats in the Prometheus text exposition format."""
+        stats = self.stats()
+        lines = ["# HELP pycopilot_span_duration_seconds Duration of the pycopilot spans.",
+                 "# TYPE pycopilot_span_duration_seconds summary"]
+        for name, entry in stats.items():
+            label = _prometheus_label(name)
+            for percentile in PERCENTILES:
+                if entry[f"p{percentile}"] is not None:
+                    lines.append(f'pycopilot_span_duration_seconds{{span="{label}",quantile="{percentile / 100}"}} '
+                                 f'{entry[f"p{percentile}"]:.6f}')
+            lines.append(f'pycopilot_span_duration_seconds_sum{{span="{label}"}} {entry["seconds"]:.6f}')
+            lines.append(f'pycopilot_span_duration_seconds_count{{span="{label}"}} {entry["count"]}')
+        for metric, key, help_text in (("errors", "errors", "Spans that raised an exception."),
+                                       ("bytes", "bytes", "Bytes processed by the spans."),
+                                       ("tokens", "tokens", "Tokens processed by the spans.")):
+            lines.append(f"# HELP pycopilot_span_{metric}_total {help_text}")
+            lines.append(f"# TYPE pycopilot_span_{metric}_total counter")
+            for name, entry in stats.items():
+                lines.append(f'pycopilot_span_{metric}_total{{span="{_prometheus_label(name)}"}} {entry[key]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, output_path, fmt=None):
+        """Writes the stats to output_path as JSON or Prometheus text. Without fmt it is taken
+        from the extension (.prom and .txt are Prometheus text, anything else JSON)."""
+        if fmt is None:
+            fmt = "prometheus" if output_path.endswith((".prom", ".txt")) else "json"
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown tracing export format '{fmt}' (expected one of {EXPORT_FORMATS})")
+        text = self.to_prometheus() if fmt == "prometheus" else json.dumps(self.stats(), indent=2) + "\n"
+        try:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            logger.info(f"Tracing stats written to '{output_path}'")
+        except OSError as e:
+            logger.error(f"Error writing the tracing stats to '{output_path}': {e}")
+
+
+def _prometheus_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_TRACER = Tracer()
+
+
+def get_tracer():
+    """Returns the process-wide tracer used by the instrumented code."""
+    return _TRACER
+
+
+def span(name, **attributes):
+    """Times the block as a span of the process-wide tracer."""
+    return _TRACER.span(name, **attributes)
+
+
+def annotate(num_bytes=None, tokens=None, **attributes):
+    """Sets the bytes and tokens (and other attributes) of the innermost active span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(num_bytes=num_bytes, tokens=tokens, **attributes)
+